@@ -0,0 +1,194 @@
+"""
+Agendador do fechamento automático de eventos.
+
+Cada evento ABERTO fica agendado para a sua data_limite em um heap (no máximo
+dois eventos abertos por vez, então um heap basta como "timer wheel"). Uma
+thread em background dorme até o próximo vencimento e fecha o evento no banco
+nesse momento, sem que os GETs precisem rodar UPDATE a cada request.
+
+- agendar_fechamento / cancelar_agendamento: chamados pelos endpoints de admin
+  de eventos depois de criar, alterar ou deletar um evento
+- iniciar_agendador: no startup; sobe a thread, que começa carregando a agenda
+  do banco (os vencidos saem já fechados, catch-up) dentro do laço de retentativa
+
+A agenda é recarregada do banco a cada INTERVALO_RESSINCRONIZACAO segundos, o
+que cobre eventos criados/alterados por outra instância. Enquanto o fechamento
+não roda, quem decide é a data_limite: o registro de eventos ativos expira na
+data_limite e as escritas de pedidos também a conferem.
+
+Na mesma ressincronização o status gravado das votações vencidas é acertado
+(as leituras já usam o status efetivo, ver status_votacoes).
+
+Em ambiente serverless (Vercel) a thread fica congelada entre requests, então
+os caminhos de escrita de pedidos e de votos chamam fechar_vencidos_na_escrita:
+os mesmos UPDATEs condicionais (eventos e votações), no máximo uma vez a cada
+INTERVALO_FECHAMENTO_ESCRITA segundos por instância.
+"""
+import heapq
+import threading
+import time
+from datetime import datetime
+
+from database import execute_query, get_db_connection, SAO_PAULO_TZ
+from eventos_ativos import invalidar_eventos_ativos
+from painel_evento import invalidar_painel
+from status_votacoes import fechar_votacoes_expiradas
+
+INTERVALO_RESSINCRONIZACAO = 300
+# Espera antes de tentar de novo depois de um erro (banco indisponível etc.)
+INTERVALO_RETENTATIVA = 30
+# Intervalo mínimo entre fechamentos disparados pelos caminhos de escrita
+INTERVALO_FECHAMENTO_ESCRITA = 60
+
+_condicao = threading.Condition()
+_agenda = {
+    "heap": [],           # [(data_limite, evento_id)] (entradas antigas são ignoradas)
+    "limites": {},        # {evento_id: data_limite} vigente
+    "thread": None,
+    "fechado_na_escrita_em": None,  # time.monotonic() do último fechar_vencidos_na_escrita
+}
+
+
+def _agora():
+    """Data/hora atual em São Paulo, naive (mesma convenção de eventos.data_limite)."""
+    return datetime.now(SAO_PAULO_TZ).replace(tzinfo=None)
+
+
+def fechar_eventos_vencidos() -> list:
+    """Fecha no banco os eventos ABERTOS cuja data_limite já passou. Retorna os IDs."""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            UPDATE eventos
+            SET status = 'FECHADO'
+            WHERE status = 'ABERTO' AND data_limite <= :current_time
+            RETURNING id
+            """,
+            {"current_time": _agora()}
+        )
+        fechados = [row[0] for row in cursor.fetchall()]
+        conn.commit()
+        cursor.close()
+
+    if fechados:
+        invalidar_eventos_ativos()
+        for evento_id in fechados:
+            invalidar_painel(evento_id)
+        print(f"[AGENDADOR] Evento(s) fechado(s) na data limite: {fechados}")
+
+    return fechados
+
+
+def fechar_vencidos_na_escrita():
+    """Fecha eventos e votações vencidos sem depender da thread (chamar nas escritas).
+
+    Roda no máximo uma vez a cada INTERVALO_FECHAMENTO_ESCRITA segundos; erros
+    são ignorados (as escritas e as leituras conferem a data_limite de qualquer forma).
+    """
+    agora = time.monotonic()
+    with _condicao:
+        ultimo = _agenda["fechado_na_escrita_em"]
+        if ultimo is not None and agora - ultimo < INTERVALO_FECHAMENTO_ESCRITA:
+            return
+        _agenda["fechado_na_escrita_em"] = agora
+    try:
+        fechar_eventos_vencidos()
+        fechar_votacoes_expiradas()
+    except Exception as e:
+        print(f"[AGENDADOR] Erro ao fechar eventos/votações na escrita (ignorado): {e}")
+
+
+def agendar_fechamento(evento_id: int, data_limite, status: str = 'ABERTO'):
+    """(Re)agenda o fechamento do evento. Evento que não está ABERTO sai da agenda."""
+    if status != 'ABERTO' or data_limite is None:
+        cancelar_agendamento(evento_id)
+        return
+    with _condicao:
+        _agenda["limites"][evento_id] = data_limite
+        heapq.heappush(_agenda["heap"], (data_limite, evento_id))
+        _condicao.notify()
+
+
+def cancelar_agendamento(evento_id: int):
+    with _condicao:
+        _agenda["limites"].pop(evento_id, None)
+        _condicao.notify()
+
+
+def recarregar_agenda():
+    """Recarrega a agenda a partir dos eventos ABERTOS no banco."""
+    rows = execute_query("SELECT id, data_limite FROM eventos WHERE status = 'ABERTO'")
+    limites = {row["ID"]: row["DATA_LIMITE"] for row in rows if row["DATA_LIMITE"] is not None}
+    with _condicao:
+        _agenda["limites"] = limites
+        _agenda["heap"] = [(data_limite, evento_id) for evento_id, data_limite in limites.items()]
+        heapq.heapify(_agenda["heap"])
+        _condicao.notify()
+
+
+def _proximo_vencimento():
+    """Próxima data_limite vigente (descarta entradas canceladas/reagendadas). Com o lock."""
+    heap = _agenda["heap"]
+    while heap:
+        data_limite, evento_id = heap[0]
+        if _agenda["limites"].get(evento_id) == data_limite:
+            return data_limite
+        heapq.heappop(heap)
+    return None
+
+
+def _executar():
+    # None: a primeira volta carrega a agenda (catch-up) com a mesma retentativa dos erros
+    ressincronizado_em = None
+    while True:
+        try:
+            with _condicao:
+                while True:
+                    agora = _agora()
+                    proximo = _proximo_vencimento()
+                    if proximo is not None and proximo <= agora:
+                        break
+                    if ressincronizado_em is None:
+                        break
+                    espera = INTERVALO_RESSINCRONIZACAO - (agora - ressincronizado_em).total_seconds()
+                    if espera <= 0:
+                        break
+                    if proximo is not None:
+                        espera = min(espera, (proximo - agora).total_seconds())
+                    _condicao.wait(espera)
+
+                vencidos = [
+                    evento_id for evento_id, data_limite in _agenda["limites"].items()
+                    if data_limite <= _agora()
+                ]
+                for evento_id in vencidos:
+                    del _agenda["limites"][evento_id]
+
+            if vencidos:
+                fechar_eventos_vencidos()
+            else:
+                recarregar_agenda()
+                fechar_votacoes_expiradas()
+                ressincronizado_em = _agora()
+        except Exception as e:
+            # Recarrega a agenda do banco na próxima volta (vencidos não fechados voltam)
+            print(f"[AGENDADOR] Erro ao fechar eventos (ignorado): {e}")
+            ressincronizado_em = None
+            with _condicao:
+                _condicao.wait(INTERVALO_RETENTATIVA)
+
+
+def iniciar_agendador():
+    """Sobe a thread do agendador (idempotente).
+
+    Não toca no banco: com o banco fora do ar no startup, a thread sobe mesmo
+    assim e faz o catch-up quando ele voltar.
+    """
+    with _condicao:
+        if _agenda["thread"] is not None and _agenda["thread"].is_alive():
+            return
+        _agenda["thread"] = threading.Thread(
+            target=_executar, name="agendador-eventos", daemon=True
+        )
+        _agenda["thread"].start()
@@ -0,0 +1,387 @@
+"""
+Alocação dos pedaços de um evento em pizzas (números, setor vencedor e fatias),
+calculada uma vez por versão e persistida em pizza_alocacoes.
+
+A versão combina:
+- ALGORITMO_VERSAO (muda quando a lógica de alocação muda)
+- eventos.versao_pedidos (incrementado na mesma transação de toda escrita que
+  altera pedidos/itens do evento, ou dados que entram no cálculo: setor do
+  usuário, nome/tipo do sabor)
+- pizza_configs.updated_at (overrides do admin e modo otimizado)
+- o catálogo dos sabores do evento (CATALOGO_EVENTO_SQL: hash de id/nome/tipo),
+  porque a alocação guarda o nome do sabor em cada pizza e ele chega aos
+  relatórios, ao layout e ao agrupamento. Renomear pelo admin já incrementa
+  versao_pedidos; o hash cobre também escritas de outras origens
+
+Relatórios de pagamento passam a ser uma consulta por chave na alocação salva,
+em vez de recalcular o evento inteiro para cada usuário.
+
+Cada instância mantém também um MotorAlocacao por evento, alimentado pelos
+deltas das escritas de pedidos (marcados com a versao_pedidos gerada na
+transação), para que uma mudança não exija reconstruir o evento inteiro.
+"""
+import threading
+
+from database import execute_query, get_db_connection, parse_json_value
+from motor_alocacao import MotorAlocacao
+
+ALGORITMO_VERSAO = "3"
+
+# Protege só os dicionários abaixo; o motor de cada evento tem o próprio lock,
+# para que o cálculo de um evento (o otimizador pode levar vários nós) não
+# segure as leituras e escritas dos outros
+_lock = threading.Lock()
+# {evento_id: alocacao} (última versão lida/calculada por esta instância)
+_alocacoes = {}
+# {evento_id: {"versao_pedidos": int, "catalogo": str, "motor": MotorAlocacao, "lock": Lock}}
+_motores = {}
+
+# Hash dos sabores com pedaços no evento (tabela eventos com alias "e")
+CATALOGO_EVENTO_SQL = """(
+    SELECT md5(string_agg(
+        sp.id || ':' || sp.nome || ':' || COALESCE(sp.tipo, 'SALGADA'), ',' ORDER BY sp.id
+    ))
+    FROM evento_sabores_totais t
+    JOIN sabores_pizza sp ON sp.id = t.sabor_id
+    WHERE t.evento_id = e.id AND t.total_pedacos > 0
+)"""
+
+
+# ============================================
+# Versão dos pedidos do evento
+# ============================================
+
+def incrementar_versao_pedidos(cursor, evento_id: int) -> int:
+    """Incrementa eventos.versao_pedidos (usar na transação da escrita) e retorna a nova versão."""
+    cursor.execute(
+        """
+        UPDATE eventos SET versao_pedidos = versao_pedidos + 1
+        WHERE id = :evento_id
+        RETURNING versao_pedidos
+        """,
+        {"evento_id": evento_id}
+    )
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def incrementar_versao_pedidos_usuario(cursor, usuario_id: int):
+    """Invalida a alocação dos eventos em que o usuário tem pedido (ex.: mudou de setor)."""
+    cursor.execute(
+        """
+        UPDATE eventos SET versao_pedidos = versao_pedidos + 1
+        WHERE id IN (SELECT evento_id FROM pedidos WHERE usuario_id = :usuario_id)
+        """,
+        {"usuario_id": usuario_id}
+    )
+
+
+def incrementar_versao_pedidos_sabor(cursor, sabor_id: int):
+    """Invalida a alocação dos eventos com itens do sabor (ex.: mudou nome ou tipo)."""
+    cursor.execute(
+        """
+        UPDATE eventos SET versao_pedidos = versao_pedidos + 1
+        WHERE id IN (
+            SELECT p.evento_id
+            FROM pedidos p
+            JOIN itens_pedido ip ON ip.pedido_id = p.id
+            WHERE ip.sabor_id = :sabor_id
+        )
+        """,
+        {"sabor_id": sabor_id}
+    )
+
+
+# ============================================
+# Motores incrementais por evento
+# ============================================
+
+def aplicar_delta_pedido(evento_id: int, versao_pedidos: int, pedido_id: int,
+                         usuario_id=None, setor_codigo=None, data_pedido=None, itens=None):
+    """Aplica a escrita de um pedido (já commitada) ao motor em memória do evento.
+
+    `itens` None = pedido cancelado. O delta só é aplicado se vier exatamente na
+    versão seguinte à do motor; caso contrário (escrita feita por outra instância
+    ou fora de ordem) o motor é descartado e reconstruído na próxima leitura.
+    """
+    if versao_pedidos is None:
+        return
+
+    with _lock:
+        estado = _motores.get(evento_id)
+    if estado is None:
+        return
+
+    with estado["lock"]:
+        if estado["versao_pedidos"] != versao_pedidos - 1:
+            with _lock:
+                if _motores.get(evento_id) is estado:
+                    del _motores[evento_id]
+            return
+
+        if itens is None:
+            estado["motor"].remover_pedido(pedido_id)
+        else:
+            estado["motor"].aplicar_pedido(pedido_id, usuario_id, setor_codigo, data_pedido, itens)
+        estado["versao_pedidos"] = versao_pedidos
+
+
+# ============================================
+# Alocação persistida
+# ============================================
+
+def _carregar_itens_evento(evento_id: int):
+    query = """
+        SELECT ip.id as item_id, ip.sabor_id, sp.nome as sabor_nome, sp.tipo as sabor_tipo,
+               ip.quantidade, p.id as pedido_id, p.usuario_id, p.data_pedido,
+               u.setor_codigo as usuario_setor_codigo
+        FROM itens_pedido ip
+        JOIN pedidos p ON ip.pedido_id = p.id
+        JOIN sabores_pizza sp ON ip.sabor_id = sp.id
+        JOIN usuarios u ON p.usuario_id = u.id
+        WHERE p.evento_id = :evento_id
+        ORDER BY p.data_pedido, p.id, ip.id
+    """
+    return execute_query(query, {"evento_id": evento_id})
+
+
+def montar_versao(versao_pedidos, config_atualizada_em, catalogo) -> str:
+    """Versão da alocação a partir de eventos.versao_pedidos, pizza_configs.updated_at
+    e do hash do catálogo do evento (coluna CATALOGO_EVENTO_SQL)."""
+    config_atualizada = config_atualizada_em.isoformat() if config_atualizada_em else "-"
+    return f"{ALGORITMO_VERSAO}:{versao_pedidos or 0}:{config_atualizada}:{catalogo or '-'}"
+
+
+def versao_alocacao(evento_id: int):
+    """Versão corrente da alocação + overrides + versão persistida (1 query).
+
+    Retorna (versão, linha), ou (None, None) se o evento não existe; a linha pode ser
+    repassada a obter_alocacao_evento para não ler a versão de novo.
+    """
+    query = f"""
+        SELECT e.versao_pedidos, pc.updated_at, pc.pairing_overrides,
+               pc.sector_overrides, pc.number_overrides, pc.otimizar_alocacao,
+               pa.versao as versao_persistida, {CATALOGO_EVENTO_SQL} as catalogo
+        FROM eventos e
+        LEFT JOIN pizza_configs pc ON pc.evento_id = e.id
+        LEFT JOIN pizza_alocacoes pa ON pa.evento_id = e.id
+        WHERE e.id = :evento_id
+    """
+    row = execute_query(query, {"evento_id": evento_id}, fetch_one=True)
+    if not row:
+        return None, None
+
+    return montar_versao(row["VERSAO_PEDIDOS"], row["UPDATED_AT"], row["CATALOGO"]), row
+
+
+def _overrides_da_linha(evento_id: int, row):
+    """(pairing, sector, number, otimizar) na ordem dos argumentos de MotorAlocacao.calcular.
+
+    Uma coluna ilegível é ignorada (as outras continuam valendo) e vira uma entrada
+    de overrides_invalidos, para o admin ver no layout. Retorna (overrides, ilegiveis).
+    """
+    ilegiveis = []
+
+    def ler(coluna, tipo, converter=dict):
+        try:
+            return converter(parse_json_value(row[coluna]))
+        except Exception as e:
+            print(f"[ALOCACAO] {coluna.lower()} ilegível no evento {evento_id} (ignorado): {e}")
+            ilegiveis.append({
+                "tipo": tipo,
+                "pizza_id": "",
+                "motivo": "Configuração salva ilegível; overrides deste tipo ignorados"
+            })
+            return {}
+
+    pairing_overrides = ler("PAIRING_OVERRIDES", "pairing")
+    sector_overrides = ler("SECTOR_OVERRIDES", "sector")
+    number_overrides = ler(
+        "NUMBER_OVERRIDES", "number", lambda valor: {k: int(v) for k, v in valor.items()}
+    )
+    overrides = (pairing_overrides, sector_overrides, number_overrides, bool(row["OTIMIZAR_ALOCACAO"]))
+    return overrides, ilegiveis
+
+
+def _salvar_alocacao(evento_id: int, alocacao: dict):
+    query = """
+        INSERT INTO pizza_alocacoes (evento_id, versao, alocacao, calculado_em)
+        VALUES (:evento_id, :versao, :alocacao, CURRENT_TIMESTAMP)
+        ON CONFLICT (evento_id) DO UPDATE
+        SET versao = EXCLUDED.versao, alocacao = EXCLUDED.alocacao, calculado_em = EXCLUDED.calculado_em
+    """
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(query, {"evento_id": evento_id, "versao": alocacao["versao"], "alocacao": alocacao})
+        conn.commit()
+        cursor.close()
+
+
+def _normalizar(alocacao: dict) -> dict:
+    """Chaves JSON voltam como string: converte numeros_por_usuario para int."""
+    alocacao["numeros_por_usuario"] = {
+        int(usuario_id): {int(item_id): numeros for item_id, numeros in por_item.items()}
+        for usuario_id, por_item in alocacao["numeros_por_usuario"].items()
+    }
+    return alocacao
+
+
+def _calcular_no_motor(evento_id: int, versao_pedidos: int, catalogo, overrides, reconstruir: bool):
+    """Calcula a alocação com o motor em memória do evento na versão dos pedidos.
+
+    Sem motor nessa versão (pedidos e catálogo): reconstrói a partir do banco (se
+    `reconstruir`) e o registra para receber os deltas das próximas escritas, ou
+    retorna None.
+    """
+    with _lock:
+        estado = _motores.get(evento_id)
+    if estado is not None:
+        # Lock do evento: o motor guarda as partições calculadas e recebe deltas
+        with estado["lock"]:
+            if estado["versao_pedidos"] == versao_pedidos and estado["catalogo"] == catalogo:
+                return estado["motor"].calcular(*overrides)
+
+    if not reconstruir:
+        return None
+
+    # Motor novo ainda não é visível para ninguém: calcula sem lock e só então publica
+    motor = MotorAlocacao.a_partir_de_linhas(_carregar_itens_evento(evento_id))
+    alocacao = motor.calcular(*overrides)
+    with _lock:
+        _motores[evento_id] = {
+            "versao_pedidos": versao_pedidos,
+            "catalogo": catalogo,
+            "motor": motor,
+            "lock": threading.Lock()
+        }
+    return alocacao
+
+
+def obter_alocacao_evento(evento_id: int, leitura=None):
+    """Retorna a alocação do evento na versão atual (memória → tabela → recálculo).
+
+    Retorna None se o evento não existe. `leitura`: (versão, linha) já obtida com versao_alocacao.
+    """
+    versao, row = leitura if leitura is not None else versao_alocacao(evento_id)
+    if versao is None:
+        return None
+
+    with _lock:
+        em_memoria = _alocacoes.get(evento_id)
+    if em_memoria is not None and em_memoria["versao"] == versao:
+        return em_memoria
+
+    overrides, ilegiveis = _overrides_da_linha(evento_id, row)
+    versao_pedidos = row["VERSAO_PEDIDOS"] or 0
+
+    # Motor em memória já na versão atual: só refaz pareamento/numeração
+    alocacao = _calcular_no_motor(evento_id, versao_pedidos, row["CATALOGO"], overrides, reconstruir=False)
+
+    if alocacao is None and row["VERSAO_PERSISTIDA"] == versao:
+        salva = execute_query(
+            "SELECT alocacao FROM pizza_alocacoes WHERE evento_id = :evento_id AND versao = :versao",
+            {"evento_id": evento_id, "versao": versao},
+            fetch_one=True
+        )
+        if salva:
+            alocacao = _normalizar(parse_json_value(salva["ALOCACAO"]))
+            alocacao["versao"] = versao
+            with _lock:
+                _alocacoes[evento_id] = alocacao
+            return alocacao
+
+    if alocacao is None:
+        # Reconstrução completa; o motor passa a receber os deltas das próximas escritas
+        alocacao = _calcular_no_motor(evento_id, versao_pedidos, row["CATALOGO"], overrides, reconstruir=True)
+
+    alocacao["overrides_invalidos"] = ilegiveis + alocacao["overrides_invalidos"]
+    alocacao["versao"] = versao
+    try:
+        _salvar_alocacao(evento_id, alocacao)
+    except Exception as e:
+        # A alocação continua válida em memória; a próxima leitura tenta salvar de novo
+        print(f"[ALOCACAO] Erro ao salvar alocação do evento {evento_id} (ignorado): {e}")
+
+    with _lock:
+        _alocacoes[evento_id] = alocacao
+
+    return alocacao
+
+
+def numeros_pizza_usuario(alocacao, usuario_id: int):
+    """{item_pedido_id: [números de pizza]} de um usuário na alocação."""
+    if not alocacao:
+        return {}
+    return alocacao["numeros_por_usuario"].get(usuario_id, {})
+
+
+# ============================================
+# Simulação de overrides
+# ============================================
+
+def simular_alocacao(evento_id: int, pairing_overrides, sector_overrides, number_overrides,
+                     otimizar=None):
+    """Calcula a alocação com overrides candidatos, sem gravar nada.
+
+    Usa o motor em memória do evento (as partições por sabor ficam em cache),
+    então cada simulação só refaz pareamento, vencedor e numeração.
+    `otimizar` None usa o modo salvo em pizza_configs.
+    Retorna (alocação atual, alocação simulada), ou (None, None) se o evento não existe.
+    """
+    # Uma leitura só: a atual e a simulada partem da mesma versão dos pedidos,
+    # mesmo que uma escrita chegue no meio
+    versao, row = versao_alocacao(evento_id)
+    if versao is None:
+        return None, None
+
+    atual = obter_alocacao_evento(evento_id, (versao, row))
+    if otimizar is None:
+        otimizar = bool(row["OTIMIZAR_ALOCACAO"])
+    simulada = _calcular_no_motor(
+        evento_id, row["VERSAO_PEDIDOS"] or 0, row["CATALOGO"],
+        (pairing_overrides, sector_overrides, number_overrides, otimizar),
+        reconstruir=True
+    )
+    return atual, simulada
+
+
+def diferenca_alocacoes(atual: dict, simulada: dict) -> dict:
+    """Diferença entre duas alocações: pizzas criadas/removidas/alteradas e usuários afetados."""
+    pizzas_atuais = {p["id"]: p for p in atual["pizzas"]}
+    pizzas_simuladas = {p["id"]: p for p in simulada["pizzas"]}
+
+    adicionadas = [p for pizza_id, p in pizzas_simuladas.items() if pizza_id not in pizzas_atuais]
+    removidas = [p for pizza_id, p in pizzas_atuais.items() if pizza_id not in pizzas_simuladas]
+
+    alteradas = []
+    for pizza_id, depois in pizzas_simuladas.items():
+        antes = pizzas_atuais.get(pizza_id)
+        if antes is None:
+            continue
+        mudancas = {
+            campo: {"antes": antes.get(campo), "depois": depois.get(campo)}
+            for campo in ("winner", "number")
+            if antes.get(campo) != depois.get(campo)
+        }
+        if mudancas:
+            alteradas.append({"id": pizza_id, "flavor_name": depois["flavor_name"], **mudancas})
+
+    usuarios_afetados = []
+    numeros_atuais = atual["numeros_por_usuario"]
+    numeros_simulados = simulada["numeros_por_usuario"]
+    for usuario_id in sorted(set(numeros_atuais) | set(numeros_simulados)):
+        antes = numeros_atuais.get(usuario_id, {})
+        depois = numeros_simulados.get(usuario_id, {})
+        if antes != depois:
+            usuarios_afetados.append({
+                "usuario_id": usuario_id,
+                "numeros_antes": sorted({n for numeros in antes.values() for n in numeros}),
+                "numeros_depois": sorted({n for numeros in depois.values() for n in numeros})
+            })
+
+    return {
+        "pizzas_adicionadas": adicionadas,
+        "pizzas_removidas": removidas,
+        "pizzas_alteradas": alteradas,
+        "usuarios_afetados": usuarios_afetados
+    }
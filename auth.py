@@ -84,7 +84,7 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         raise credentials_exception
     
     query = """
-        SELECT id, nome_completo, setor, is_admin, ativo, data_cadastro
+        SELECT id, nome_completo, setor, setor_codigo, is_admin, ativo, data_cadastro
         FROM usuarios
         WHERE id = :user_id AND ativo = 1
     """
@@ -98,6 +98,7 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         "id": result["ID"],
         "nome_completo": result["NOME_COMPLETO"],
         "setor": result["SETOR"],
+        "setor_codigo": result["SETOR_CODIGO"],
         "is_admin": bool(result["IS_ADMIN"]),
         "ativo": bool(result["ATIVO"]),
         "data_cadastro": result["DATA_CADASTRO"]
@@ -0,0 +1,282 @@
+"""
+Barramento de mensagens em memória (publicar/assinar por tópico).
+
+As rotas de escrita publicam depois do commit (ex.: "pedidos:{evento_id}") e os
+streams SSE assinam. A entrega usa loop.call_soon_threadsafe, então publicar
+funciona tanto do event loop quanto de threads do threadpool (rotas síncronas,
+jobs em background).
+
+Vale só para a instância atual: quem precisa enxergar escritas de outras
+instâncias confere a versão no banco periodicamente (ver Difusor).
+
+Difusor: estado compartilhado pelos clientes SSE de um tópico (dashboard ao vivo,
+placar das votações), calculado uma vez por mudança e difundido como delta.
+"""
+import asyncio
+import json
+import threading
+
+from fastapi.concurrency import run_in_threadpool
+
+TAMANHO_FILA = 100
+
+INTERVALO_HEARTBEAT = 15
+# Difusor sem clientes (stream aberto mas nunca iniciado) é encerrado depois disso
+TEMPO_OCIOSO = 60
+TAMANHO_FILA_CLIENTE = 20
+
+_lock = threading.Lock()
+# {topico: {Assinatura}}
+_assinaturas = {}
+
+
+class FilaCheia(Exception):
+    """O assinante ficou para trás e perdeu mensagens (deve se ressincronizar)."""
+
+
+class Assinatura:
+    """Fila de mensagens de um tópico para um assinante (criada dentro do event loop)."""
+
+    def __init__(self, topico: str, tamanho: int = TAMANHO_FILA):
+        self.topico = topico
+        self._loop = asyncio.get_running_loop()
+        self._fila = asyncio.Queue(maxsize=tamanho)
+        self._perdeu_mensagens = False
+
+    def _entregar(self, mensagem):
+        # Executado no loop do assinante
+        try:
+            self._fila.put_nowait(mensagem)
+        except asyncio.QueueFull:
+            self._perdeu_mensagens = True
+
+    async def receber(self, timeout: float = None):
+        """Próxima mensagem (None se o timeout passar). Levanta FilaCheia se perdeu mensagens."""
+        if self._perdeu_mensagens:
+            self._perdeu_mensagens = False
+            self.descartar_pendentes()
+            raise FilaCheia(self.topico)
+        try:
+            return await asyncio.wait_for(self._fila.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def descartar_pendentes(self) -> int:
+        """Esvazia a fila (para agrupar várias mensagens em um único processamento)."""
+        descartadas = 0
+        while not self._fila.empty():
+            self._fila.get_nowait()
+            descartadas += 1
+        return descartadas
+
+
+def assinar(topico: str, tamanho: int = TAMANHO_FILA) -> Assinatura:
+    assinatura = Assinatura(topico, tamanho)
+    with _lock:
+        _assinaturas.setdefault(topico, set()).add(assinatura)
+    return assinatura
+
+
+def cancelar(assinatura: Assinatura):
+    with _lock:
+        assinaturas = _assinaturas.get(assinatura.topico)
+        if assinaturas is not None:
+            assinaturas.discard(assinatura)
+            if not assinaturas:
+                del _assinaturas[assinatura.topico]
+
+
+def publicar(topico: str, mensagem) -> int:
+    """Entrega a mensagem a todos os assinantes do tópico. Retorna quantos eram."""
+    with _lock:
+        assinaturas = list(_assinaturas.get(topico, ()))
+    for assinatura in assinaturas:
+        try:
+            assinatura._loop.call_soon_threadsafe(assinatura._entregar, mensagem)
+        except RuntimeError:
+            # Loop já encerrado (shutdown): o assinante não existe mais
+            cancelar(assinatura)
+    return len(assinaturas)
+
+
+def topico_pedidos(evento_id: int) -> str:
+    return f"pedidos:{evento_id}"
+
+
+# Votos e alterações em votações (placar ao vivo, ver votacoes_ao_vivo)
+TOPICO_VOTACOES = "votacoes"
+
+
+# ============================================
+# Difusão de estado para clientes SSE
+# ============================================
+
+# {topico: Difusor} (só acessado pelo event loop)
+_difusores = {}
+
+
+class Difusor:
+    """Estado compartilhado pelos clientes SSE de um tópico nesta instância.
+
+    Uma tarefa assina o tópico, recalcula o estado uma vez por rajada de
+    mensagens (espera `agrupamento` segundos e descarta as pendentes) e difunde
+    só a diferença para todos os clientes: N clientes custam um cálculo por
+    mudança, e não N consultas por intervalo de polling. Sem mensagens por
+    `intervalo_verificacao` segundos, confere mudou_no_banco() (escritas de
+    outra instância não passam por este barramento).
+
+    Subclasses implementam montar() e diferenca(); os outros ganchos são opcionais.
+    """
+    agrupamento = 0.25
+    intervalo_verificacao = 10
+    evento_delta = "delta"
+    rotulo = "SSE"
+
+    def __init__(self):
+        self.topico = None
+        self.versao = None
+        self.estado = None
+        self.seq = 0
+        self.clientes = set()
+        self.assinatura = None
+        self.tarefa = None
+        self.encerrado = False
+        self.criar = None
+
+    def montar(self):
+        """(versao, estado) atuais, ou None se a origem não existe. Roda no threadpool."""
+        raise NotImplementedError
+
+    def diferenca(self, anterior, atual) -> dict:
+        """Delta difundido aos clientes (self.versao já é a nova). Vazio se nada mudou."""
+        raise NotImplementedError
+
+    def snapshot(self) -> dict:
+        """Corpo do evento "snapshot" (conexão nova ou cliente lento)."""
+        return self.estado
+
+    def mensagem_refletida(self, mensagem) -> bool:
+        """True se a mensagem já está refletida no estado (não recalcula)."""
+        return False
+
+    def mudou_no_banco(self) -> bool:
+        """Conferência periódica sem mensagens. Roda no threadpool."""
+        return True
+
+    def _difundir(self, tipo: str, dados):
+        for fila in list(self.clientes):
+            try:
+                fila.put_nowait((tipo, self.seq, dados))
+            except asyncio.QueueFull:
+                # Cliente lento: descarta os deltas pendentes e manda o estado inteiro
+                while not fila.empty():
+                    fila.get_nowait()
+                fila.put_nowait(("snapshot", self.seq, self.snapshot()))
+
+    def _encerrar(self):
+        if self.encerrado:
+            return
+        self.encerrado = True
+        if _difusores.get(self.topico) is self:
+            del _difusores[self.topico]
+        cancelar(self.assinatura)
+        if self.tarefa is not None and self.tarefa is not asyncio.current_task():
+            self.tarefa.cancel()
+
+    async def _acompanhar(self):
+        """Recalcula o estado a cada mudança (ou periodicamente) e difunde o delta."""
+        ocioso_desde = asyncio.get_running_loop().time()
+        while True:
+            try:
+                mensagem = await self.assinatura.receber(timeout=self.intervalo_verificacao)
+            except FilaCheia:
+                mensagem = {}
+
+            agora = asyncio.get_running_loop().time()
+            if self.clientes:
+                ocioso_desde = agora
+            elif agora - ocioso_desde > TEMPO_OCIOSO:
+                self._encerrar()
+                return
+
+            try:
+                if mensagem is None:
+                    if not await run_in_threadpool(self.mudou_no_banco):
+                        continue
+                else:
+                    if self.mensagem_refletida(mensagem):
+                        continue
+                    # Agrupa a rajada: mensagens que chegarem durante a espera entram no mesmo cálculo
+                    await asyncio.sleep(self.agrupamento)
+                    self.assinatura.descartar_pendentes()
+
+                resultado = await run_in_threadpool(self.montar)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[{self.rotulo}] Erro ao recalcular {self.topico} (ignorado): {e}")
+                continue
+
+            if resultado is None:
+                continue
+            anterior = self.estado
+            self.versao, self.estado = resultado
+            delta = self.diferenca(anterior, self.estado)
+            if delta:
+                self.seq += 1
+                self._difundir(self.evento_delta, delta)
+
+
+def _sse(tipo: str, seq: int, dados) -> str:
+    return f"event: {tipo}\nid: {seq}\ndata: {json.dumps(dados, default=str)}\n\n"
+
+
+async def abrir_difusor(topico: str, criar):
+    """Difusor compartilhado do tópico, criado (`criar()`) no primeiro cliente.
+
+    Retorna None se montar() retornar None (ex.: evento não existe).
+    """
+    difusor = _difusores.get(topico)
+    if difusor is not None:
+        return difusor
+
+    difusor = criar()
+    # Assina antes do primeiro cálculo para não perder mensagens no meio
+    assinatura = assinar(topico)
+    try:
+        resultado = await run_in_threadpool(difusor.montar)
+    except BaseException:
+        cancelar(assinatura)
+        raise
+
+    existente = _difusores.get(topico)
+    if resultado is None or existente is not None:
+        cancelar(assinatura)
+        return existente if resultado is not None else None
+
+    difusor.topico, difusor.assinatura, difusor.criar = topico, assinatura, criar
+    difusor.versao, difusor.estado = resultado
+    difusor.tarefa = asyncio.create_task(difusor._acompanhar())
+    _difusores[topico] = difusor
+    return difusor
+
+
+async def transmitir(difusor: Difusor):
+    """Gerador SSE de um cliente: snapshot inicial, depois deltas e heartbeats."""
+    if difusor.encerrado:
+        difusor = await abrir_difusor(difusor.topico, difusor.criar) or difusor
+    fila = asyncio.Queue(maxsize=TAMANHO_FILA_CLIENTE)
+    difusor.clientes.add(fila)
+    try:
+        yield _sse("snapshot", difusor.seq, difusor.snapshot())
+        while True:
+            try:
+                tipo, seq, dados = await asyncio.wait_for(fila.get(), INTERVALO_HEARTBEAT)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            yield _sse(tipo, seq, dados)
+    finally:
+        difusor.clientes.discard(fila)
+        if not difusor.clientes:
+            difusor._encerrar()
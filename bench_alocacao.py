@@ -0,0 +1,105 @@
+"""
+Benchmark do motor de alocação de pizzas (sem banco)
+
+Mede, para eventos sintéticos de tamanhos crescentes:
+- referência: algoritmo em lote original (um dict por pedaço)
+- motor (construção): MotorAlocacao a partir das linhas do evento
+- motor (cálculo): pareamento/vencedor/numeração sobre as partições
+- delta + cálculo: editar um pedido e recalcular (caminho de uma escrita)
+
+Também confere se o motor e a referência produzem a mesma saída.
+Rodar com:
+    python bench_alocacao.py
+"""
+import random
+import time
+from datetime import datetime, timedelta
+
+from motor_alocacao import MotorAlocacao
+from setores import calcular_setor_codigo
+from test_alocacao import calcular_alocacao_referencia, _sem_relatorio, MAPEAMENTO_SETORES
+
+TAMANHOS = [1_000, 5_000, 20_000, 50_000]  # pedaços por evento
+REPETICOES = 3
+
+
+def gerar_linhas(total_pedacos, seed=0):
+    rng = random.Random(seed)
+    inicio = datetime(2026, 3, 1, 9, 0)
+    linhas = []
+    pedacos = 0
+    pedido_id = 0
+    item_id = 0
+    while pedacos < total_pedacos:
+        pedido_id += 1
+        data_pedido = inicio + timedelta(seconds=pedido_id * 7)
+        setor = rng.choice(["STI", "SGS", "STI - Infra", "SGS/Compras", "RH"])
+        for _ in range(rng.randint(1, 4)):
+            item_id += 1
+            sabor_id = rng.randint(1, 25)
+            quantidade = rng.randint(1, 12)
+            linhas.append({
+                "ITEM_ID": item_id,
+                "SABOR_ID": sabor_id,
+                "SABOR_NOME": f"Sabor {sabor_id}",
+                "SABOR_TIPO": "DOCE" if sabor_id > 20 else "SALGADA",
+                "QUANTIDADE": quantidade,
+                "PEDIDO_ID": pedido_id,
+                "USUARIO_ID": pedido_id,
+                "DATA_PEDIDO": data_pedido,
+                "USUARIO_SETOR": setor,
+                "USUARIO_SETOR_CODIGO": calcular_setor_codigo(setor, MAPEAMENTO_SETORES)
+            })
+            pedacos += quantidade
+    return linhas
+
+
+def medir(funcao):
+    melhor = None
+    resultado = None
+    for _ in range(REPETICOES):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        decorrido = time.perf_counter() - inicio
+        melhor = decorrido if melhor is None else min(melhor, decorrido)
+    return melhor * 1000, resultado
+
+
+def main():
+    overrides = ({}, {"3-inteira-0": "SGS"}, {"5-inteira-0": 1})
+    print(f"{'pedaços':>8} {'itens':>7} {'referência':>12} {'construção':>12} {'cálculo':>10} {'delta+cálc':>11}  iguais")
+
+    for total in TAMANHOS:
+        linhas = gerar_linhas(total)
+
+        t_ref, esperado = medir(lambda: calcular_alocacao_referencia(linhas, *overrides))
+        t_build, motor = medir(lambda: MotorAlocacao.a_partir_de_linhas(linhas))
+        t_calc, obtido = medir(lambda: motor.calcular(*overrides))
+
+        # Delta: edita o pedido mais antigo (pior caso: muda o início das filas dos sabores)
+        primeira = linhas[0]
+
+        def delta():
+            motor.aplicar_pedido(
+                primeira["PEDIDO_ID"], primeira["USUARIO_ID"], primeira["USUARIO_SETOR_CODIGO"],
+                primeira["DATA_PEDIDO"],
+                [{
+                    "item_id": primeira["ITEM_ID"],
+                    "sabor_id": primeira["SABOR_ID"],
+                    "sabor_nome": primeira["SABOR_NOME"],
+                    "sabor_tipo": primeira["SABOR_TIPO"],
+                    "quantidade": primeira["QUANTIDADE"]
+                }]
+            )
+            return motor.calcular(*overrides)
+
+        t_delta, _ = medir(delta)
+
+        print(
+            f"{total:>8} {len(linhas):>7} {t_ref:>10.1f}ms {t_build:>10.1f}ms {t_calc:>8.1f}ms "
+            f"{t_delta:>9.1f}ms  {'sim' if _sem_relatorio(obtido) == esperado else 'NÃO'}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Cache em memória do catálogo de sabores (tabela sabores_pizza).
+
+O catálogo muda poucas vezes por mês (criar/atualizar/deletar sabor), mas é lido
+em toda precificação de pedido e em toda listagem de sabores. O cache é carregado
+no startup, invalidado pelos endpoints de admin de sabores e tem um TTL curto como
+rede de segurança (ex.: alterações feitas por outra instância ou direto no banco).
+"""
+import threading
+import time
+
+from database import execute_query
+
+CATALOGO_TTL_SEGUNDOS = 300
+# Intervalo mínimo entre recargas disparadas por "miss" (evita recarga a cada ID inválido)
+CATALOGO_RECARGA_MISS_SEGUNDOS = 5
+
+_lock = threading.Lock()
+_catalogo = {
+    "versao": 0,          # incrementa a cada invalidação
+    "carregado_em": None, # time.monotonic() da última carga
+    "sabores": None,      # {sabor_id: dict} na ordem de nome
+}
+
+
+def carregar_catalogo():
+    """Recarrega o catálogo inteiro do banco (1 query) e retorna {sabor_id: sabor}."""
+    with _lock:
+        versao = _catalogo["versao"]
+
+    query = """
+        SELECT id, nome, preco_pedaco, ativo, data_cadastro, tipo, descricao
+        FROM sabores_pizza
+        ORDER BY nome
+    """
+    rows = execute_query(query)
+
+    sabores = {
+        row["ID"]: {
+            "id": row["ID"],
+            "nome": row["NOME"],
+            "preco_pedaco": float(row["PRECO_PEDACO"]),
+            "ativo": bool(row["ATIVO"]),
+            "data_cadastro": row["DATA_CADASTRO"],
+            "tipo": row.get("TIPO") or "SALGADA",
+            "descricao": row.get("DESCRICAO")
+        }
+        for row in rows
+    }
+
+    with _lock:
+        # Se houve invalidação durante a carga, não publica dados possivelmente antigos
+        if _catalogo["versao"] == versao:
+            _catalogo["sabores"] = sabores
+            _catalogo["carregado_em"] = time.monotonic()
+
+    return sabores
+
+
+def obter_catalogo():
+    """Retorna o catálogo em memória, recarregando se vazio ou expirado (TTL)."""
+    with _lock:
+        sabores = _catalogo["sabores"]
+        carregado_em = _catalogo["carregado_em"]
+
+    if sabores is None or time.monotonic() - carregado_em > CATALOGO_TTL_SEGUNDOS:
+        return carregar_catalogo()
+
+    return sabores
+
+
+def recarregar_catalogo_em_miss():
+    """Recarrega o catálogo após um miss, no máximo uma vez a cada poucos segundos.
+
+    Um sabor ausente pode ter sido criado por outra instância da API.
+    """
+    with _lock:
+        sabores = _catalogo["sabores"]
+        carregado_em = _catalogo["carregado_em"]
+
+    if sabores is not None and time.monotonic() - carregado_em < CATALOGO_RECARGA_MISS_SEGUNDOS:
+        return sabores
+
+    return carregar_catalogo()
+
+
+def obter_sabor_catalogo(sabor_id: int):
+    """Busca um sabor no catálogo (com recarga em caso de miss)."""
+    sabor = obter_catalogo().get(sabor_id)
+    if sabor is None:
+        sabor = recarregar_catalogo_em_miss().get(sabor_id)
+    return sabor
+
+
+def invalidar_catalogo():
+    """Descarta o catálogo em memória (chamar após alterar sabores_pizza)."""
+    with _lock:
+        _catalogo["versao"] += 1
+        _catalogo["sabores"] = None
+        _catalogo["carregado_em"] = None
+
+
+def versao_catalogo() -> int:
+    """Versão atual do catálogo (muda a cada invalidação)."""
+    with _lock:
+        return _catalogo["versao"]
@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import Dict
 
 class Settings(BaseSettings):
     # Database
@@ -19,6 +20,11 @@ class Settings(BaseSettings):
     SMTP_EMAIL: str = ""
     SMTP_PASSWORD: str = ""
     
+    # Setor → código do lado do andar (bits: 1 = STI, 2 = SGS).
+    # Cada chave é procurada (sem diferenciar maiúsculas) no texto livre de usuarios.setor.
+    # Ex. no .env: SETOR_CODIGOS={"STI": 1, "SGS": 2, "INFRA": 1}
+    SETOR_CODIGOS: Dict[str, int] = {"STI": 1, "SGS": 2}
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -0,0 +1,139 @@
+"""
+Dashboard do evento ao vivo (Server-Sent Events).
+
+Cada evento com clientes conectados tem um painel compartilhado nesta
+instância (barramento.Difusor no tópico "pedidos:{evento_id}"): o painel é
+recalculado uma vez por mudança (rajadas de escritas são agrupadas) e só a
+diferença vai para os clientes.
+
+Escritas feitas em outra instância não passam pelo barramento desta: sem
+mensagens, o painel confere eventos.versao_pedidos a cada
+INTERVALO_VERIFICACAO segundos (uma consulta por evento, não por cliente).
+"""
+from collections import Counter
+
+import barramento
+from database import execute_query
+
+INTERVALO_VERIFICACAO = 10
+# Espera antes de recalcular, para agrupar escritas em rajada
+AGRUPAMENTO_SEGUNDOS = 0.25
+
+
+def _versao_pedidos(evento_id: int):
+    row = execute_query(
+        "SELECT versao_pedidos FROM eventos WHERE id = :evento_id",
+        {"evento_id": evento_id},
+        fetch_one=True
+    )
+    return row["VERSAO_PEDIDOS"] if row else None
+
+
+def _mudou(anteriores: dict, atuais: dict):
+    """(alterados, removidos) entre dois dicts {chave: valor}."""
+    alterados = [valor for chave, valor in atuais.items() if anteriores.get(chave) != valor]
+    removidos = [chave for chave in anteriores if chave not in atuais]
+    return alterados, removidos
+
+
+def diferenca_painel(anterior: dict, atual: dict) -> dict:
+    """Delta entre dois painéis (montar_painel). Vazio se nada visível mudou."""
+    delta = {}
+
+    dash_ant, dash = anterior["dashboard"], atual["dashboard"]
+    totais = {
+        campo: dash[campo]
+        for campo in ("status", "total_participantes", "total_pedidos", "valor_total_evento")
+        if dash_ant.get(campo) != dash[campo]
+    }
+    if totais:
+        delta["totais"] = totais
+    alterados, removidos = _mudou(
+        {s["sabor_id"]: s for s in dash_ant["estatisticas_por_sabor"]},
+        {s["sabor_id"]: s for s in dash["estatisticas_por_sabor"]}
+    )
+    if alterados:
+        delta["sabores_alterados"] = alterados
+    if removidos:
+        delta["sabores_removidos"] = removidos
+
+    novas, encerradas = _mudou(
+        {o["sabor_id"]: o for o in anterior["oportunidades"]["oportunidades"]},
+        {o["sabor_id"]: o for o in atual["oportunidades"]["oportunidades"]}
+    )
+    if novas:
+        delta["oportunidades_novas"] = novas
+    if encerradas:
+        delta["oportunidades_encerradas"] = encerradas
+
+    agrup_ant, agrup = anterior["agrupamento"], atual["agrupamento"]
+    if agrup != agrup_ant:
+        # Agrupamento é pequeno (uma linha por pizza): vai inteiro, mais as pizzas novas em destaque
+        delta["agrupamento"] = agrup
+        if agrup and agrup_ant:
+            inteiras_ant = {p["sabor"]: p["quantidade"] for p in agrup_ant["pizzas_inteiras"]}
+            novas_inteiras = [
+                {"sabor": p["sabor"], "quantidade": p["quantidade"] - inteiras_ant.get(p["sabor"], 0)}
+                for p in agrup["pizzas_inteiras"]
+                if p["quantidade"] > inteiras_ant.get(p["sabor"], 0)
+            ]
+            meias_ant = Counter((p["sabor1"], p["sabor2"]) for p in agrup_ant["pizzas_meio_a_meio"])
+            meias = Counter((p["sabor1"], p["sabor2"]) for p in agrup["pizzas_meio_a_meio"])
+            novas_meias = [
+                {"sabor1": sabor1, "sabor2": sabor2, "quantidade": quantidade}
+                for (sabor1, sabor2), quantidade in (meias - meias_ant).items()
+            ]
+            if novas_inteiras:
+                delta["novas_pizzas_inteiras"] = novas_inteiras
+            if novas_meias:
+                delta["novas_pizzas_meio_a_meio"] = novas_meias
+
+    return delta
+
+
+class _Painel(barramento.Difusor):
+    """Painel do evento (montar_painel) difundido aos clientes; versao = versao_pedidos."""
+    agrupamento = AGRUPAMENTO_SEGUNDOS
+    intervalo_verificacao = INTERVALO_VERIFICACAO
+    rotulo = "DASHBOARD"
+
+    def __init__(self, evento_id, montar):
+        super().__init__()
+        self.evento_id = evento_id
+        self.montar_painel = montar
+
+    def montar(self):
+        return self.montar_painel(self.evento_id)
+
+    def diferenca(self, anterior, atual) -> dict:
+        delta = diferenca_painel(anterior, atual)
+        return {"versao_pedidos": self.versao, **delta} if delta else {}
+
+    def snapshot(self) -> dict:
+        return {"versao_pedidos": self.versao, **self.estado}
+
+    def mensagem_refletida(self, mensagem) -> bool:
+        # Já refletida (ou mudança que não afeta o dashboard, ex.: status do pedido)
+        if "versao_pedidos" not in mensagem:
+            return False
+        versao = mensagem["versao_pedidos"]
+        return versao is None or (self.versao is not None and versao <= self.versao)
+
+    def mudou_no_banco(self) -> bool:
+        versao = _versao_pedidos(self.evento_id)
+        return versao is not None and versao != self.versao
+
+
+async def abrir_painel(evento_id: int, montar):
+    """Painel compartilhado do evento, criado no primeiro cliente. None se o evento não existe.
+
+    `montar(evento_id)` -> (versao_pedidos, painel) | None, síncrono (roda no threadpool).
+    """
+    return await barramento.abrir_difusor(
+        barramento.topico_pedidos(evento_id), lambda: _Painel(evento_id, montar)
+    )
+
+
+def stream_painel(painel: _Painel):
+    """Gerador SSE de um cliente: snapshot inicial, depois deltas e heartbeats."""
+    return barramento.transmitir(painel)
@@ -1,3 +1,4 @@
+import json
 import re
 from contextlib import contextmanager
 from datetime import datetime, timezone
@@ -18,7 +19,7 @@ settings = get_settings()
 SAO_PAULO_TZ = ZoneInfo("America/Sao_Paulo")
 
 BOOLEAN_PARAM_NAMES = {"admin", "ativo", "is_admin", "anonimo", "pagamento_liberado"}
-JSON_PARAM_NAMES = {"pairing", "sector", "num_overrides"}
+JSON_PARAM_NAMES = {"pairing", "sector", "num_overrides", "alocacao", "documento"}
 BOOLEAN_COLUMNS = ("ativo", "is_admin", "pagamento_liberado", "usado", "anonimo")
 UTC_WALL_TIME_COLUMNS = {"DATA_EXPIRACAO"}
 
@@ -117,6 +118,19 @@ def _normalize_row(row, description=None):
     )
 
 
+def parse_json_value(value):
+    """Converte uma coluna JSON (dict, texto ou LOB legado) em dict; vazio vira {}."""
+    if value is None:
+        return {}
+    if hasattr(value, "read"):
+        value = value.read()
+    if isinstance(value, dict):
+        return value
+    if isinstance(value, str) and value:
+        return json.loads(value)
+    return {}
+
+
 class CompatCursor:
     def __init__(self, cursor):
         self._cursor = cursor
@@ -0,0 +1,135 @@
+"""
+Registro em memória dos eventos abertos e de quem pode participar deles.
+
+Existem no máximo dois eventos abertos ao mesmo tempo (um NORMAL e um RELAMPAGO),
+então o registro inteiro cabe em uma query. Cada entrada expira exatamente na sua
+data_limite (filtrada na leitura), o registro é invalidado pelos endpoints de admin
+de eventos e tem um TTL curto como rede de segurança.
+"""
+import threading
+import time
+from datetime import datetime
+
+from database import execute_query, SAO_PAULO_TZ
+
+EVENTOS_ATIVOS_TTL_SEGUNDOS = 60
+# Intervalo mínimo entre recargas disparadas por "miss"
+EVENTOS_ATIVOS_RECARGA_MISS_SEGUNDOS = 5
+
+_lock = threading.Lock()
+_registro = {
+    "versao": 0,          # incrementa a cada invalidação
+    "carregado_em": None, # time.monotonic() da última carga
+    "eventos": None,      # {evento_id: {"evento": dict, "acessos": frozenset}} por data_evento
+}
+
+
+def _agora():
+    """Data/hora atual em São Paulo, naive (mesma convenção das colunas lidas do banco)."""
+    return datetime.now(SAO_PAULO_TZ).replace(tzinfo=None)
+
+
+def carregar_eventos_ativos():
+    """Recarrega eventos abertos + acessos relâmpago em 1 query e retorna o registro."""
+    with _lock:
+        versao = _registro["versao"]
+
+    query = """
+        SELECT e.id, e.nome, e.data_evento, e.status, e.data_limite, e.data_criacao,
+               e.tipo, e.pagamento_liberado, ea.usuario_id as acesso_usuario_id
+        FROM eventos e
+        LEFT JOIN evento_acessos ea ON ea.evento_id = e.id AND e.tipo = 'RELAMPAGO'
+        WHERE e.status = 'ABERTO' AND e.data_limite > :current_time
+        ORDER BY e.data_evento ASC
+    """
+    rows = execute_query(query, {"current_time": _agora()})
+
+    eventos = {}
+    acessos = {}
+    for row in rows:
+        eid = row["ID"]
+        if eid not in eventos:
+            eventos[eid] = {
+                "id": eid,
+                "nome": row.get("NOME"),
+                "data_evento": row["DATA_EVENTO"],
+                "status": row["STATUS"],
+                "data_limite": row["DATA_LIMITE"],
+                "data_criacao": row.get("DATA_CRIACAO"),
+                "tipo": row.get("TIPO") or "NORMAL",
+                "pagamento_liberado": bool(row.get("PAGAMENTO_LIBERADO", 0))
+            }
+            acessos[eid] = set()
+        if row["ACESSO_USUARIO_ID"]:
+            acessos[eid].add(row["ACESSO_USUARIO_ID"])
+
+    registro = {
+        eid: {"evento": evento, "acessos": frozenset(acessos[eid])}
+        for eid, evento in eventos.items()
+    }
+
+    with _lock:
+        # Se houve invalidação durante a carga, não publica dados possivelmente antigos
+        if _registro["versao"] == versao:
+            _registro["eventos"] = registro
+            _registro["carregado_em"] = time.monotonic()
+
+    return registro
+
+
+def _obter_registro():
+    with _lock:
+        registro = _registro["eventos"]
+        carregado_em = _registro["carregado_em"]
+
+    if registro is None or time.monotonic() - carregado_em > EVENTOS_ATIVOS_TTL_SEGUNDOS:
+        return carregar_eventos_ativos()
+
+    return registro
+
+
+def listar_registro_eventos_ativos():
+    """Eventos abertos cuja data_limite ainda não passou (ordenados por data_evento)."""
+    agora = _agora()
+    return [
+        entrada["evento"]
+        for entrada in _obter_registro().values()
+        if entrada["evento"]["data_limite"] > agora
+    ]
+
+
+def buscar_evento_ativo(evento_id: int):
+    """Retorna a entrada {"evento", "acessos"} de um evento aberto, ou None.
+
+    Em caso de miss recarrega (no máximo uma vez a cada poucos segundos), pois o
+    evento pode ter sido aberto por outra instância da API.
+    """
+    registro = _obter_registro()
+    entrada = registro.get(evento_id)
+
+    if entrada is None:
+        with _lock:
+            carregado_em = _registro["carregado_em"]
+        if carregado_em is None or time.monotonic() - carregado_em >= EVENTOS_ATIVOS_RECARGA_MISS_SEGUNDOS:
+            entrada = carregar_eventos_ativos().get(evento_id)
+
+    # Expira exatamente na data_limite, mesmo antes do evento ser fechado no banco
+    if entrada is None or entrada["evento"]["data_limite"] <= _agora():
+        return None
+
+    return entrada
+
+
+def usuario_pode_participar(entrada: dict, usuario: dict) -> bool:
+    """Eventos relâmpago só aceitam usuários liberados (admins sempre podem)."""
+    if entrada["evento"]["tipo"] != 'RELAMPAGO' or usuario["is_admin"]:
+        return True
+    return usuario["id"] in entrada["acessos"]
+
+
+def invalidar_eventos_ativos():
+    """Descarta o registro em memória (chamar após alterar eventos/evento_acessos)."""
+    with _lock:
+        _registro["versao"] += 1
+        _registro["eventos"] = None
+        _registro["carregado_em"] = None
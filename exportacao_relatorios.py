@@ -0,0 +1,302 @@
+"""
+Exportação em lote dos relatórios de pagamento de um evento (PDF ou ZIP de PNGs).
+
+Os documentos de todos os participantes saem de uma única chamada a
+gerar_documentos (uma alocação para o evento inteiro). Cada página é desenhada
+em um pool de processos; cada processo decodifica qrcode.png, lado_esquerdo.png
+e lado_direito.png uma única vez, no initializer, e reaproveita as imagens em
+todas as páginas que renderizar.
+
+O arquivo é transmitido enquanto as páginas ficam prontas: só há um número
+limitado de páginas em andamento (renderizando ou esperando a vez de sair), e
+cada página é liberada assim que é escrita, então a memória não cresce com o
+tamanho do evento.
+
+Pillow é opcional: sem ele a exportação responde 503 e o resto da API funciona.
+"""
+import io
+import os
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from PIL import Image, ImageDraw, ImageFont
+except ImportError:  # Pillow não instalado: exportação indisponível
+    Image = None
+
+DIRETORIO_IMAGENS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "relatorios")
+
+# A4 a 100 dpi (renderização) e em pontos (página do PDF)
+LARGURA_PAGINA, ALTURA_PAGINA = 827, 1169
+LARGURA_PDF, ALTURA_PDF = 595, 842
+MARGEM = 40
+QUALIDADE_JPEG = 85
+
+# Fontes TrueType com acentuação, procuradas nos diretórios de fontes do sistema;
+# a fonte embutida do Pillow (último recurso) não tem os caracteres acentuados
+FONTES_CANDIDATAS = ("DejaVuSans.ttf", "LiberationSans-Regular.ttf", "Arial.ttf")
+
+MAX_PROCESSOS = 4
+# Páginas em andamento por processo (limita a memória do streaming)
+PAGINAS_POR_PROCESSO = 2
+
+# Imagens decodificadas uma vez por processo (ver _inicializar_worker)
+_IMAGENS = {}
+_FONTES = {}
+
+
+def pillow_disponivel() -> bool:
+    return Image is not None
+
+
+def _inicializar_worker(diretorio: str):
+    """Decodifica as imagens estáticas e carrega as fontes no processo."""
+    for nome in ("qrcode", "lado_esquerdo", "lado_direito"):
+        with Image.open(os.path.join(diretorio, f"{nome}.png")) as imagem:
+            _IMAGENS[nome] = imagem.convert("RGBA")
+    for nome, tamanho in (("titulo", 28), ("subtitulo", 18), ("texto", 14), ("pequeno", 12)):
+        _FONTES[nome] = _carregar_fonte(tamanho)
+
+
+def _carregar_fonte(tamanho: int):
+    for arquivo in FONTES_CANDIDATAS:
+        try:
+            return ImageFont.truetype(arquivo, tamanho)
+        except OSError:
+            continue
+    return ImageFont.load_default(size=tamanho)
+
+
+def _quebrar_linhas(draw, texto: str, fonte, largura: int):
+    """Quebra o texto em linhas que cabem na largura (em pixels)."""
+    linhas = []
+    atual = ""
+    for palavra in texto.split(" "):
+        candidata = f"{atual} {palavra}" if atual else palavra
+        if atual and draw.textlength(candidata, font=fonte) > largura:
+            linhas.append(atual)
+            atual = palavra
+        else:
+            atual = candidata
+    linhas.append(atual)
+    return linhas
+
+
+def _formatar_valor(valor) -> str:
+    return f"R$ {float(valor):.2f}".replace(".", ",")
+
+
+def _desenhar_pagina(cabecalho: dict, documento: dict):
+    """Desenha o relatório de um participante (mesmo conteúdo da tela de pagamento)."""
+    pagina = Image.new("RGB", (LARGURA_PAGINA, ALTURA_PAGINA), "white")
+    draw = ImageDraw.Draw(pagina)
+    pedido = documento["pedido"]
+    largura_util = LARGURA_PAGINA - 2 * MARGEM
+
+    esquerda = _IMAGENS["lado_esquerdo"]
+    direita = _IMAGENS["lado_direito"]
+    pagina.paste(esquerda, (MARGEM, MARGEM), esquerda)
+    pagina.paste(direita, (LARGURA_PAGINA - MARGEM - direita.width, MARGEM), direita)
+
+    centro = LARGURA_PAGINA // 2
+    draw.text((centro, MARGEM + 40), "RELATÓRIO DE PAGAMENTO", fill="black", font=_FONTES["titulo"], anchor="mm")
+    draw.text((centro, MARGEM + 80), cabecalho["nome"], fill="black", font=_FONTES["subtitulo"], anchor="mm")
+    draw.text((centro, MARGEM + 108), cabecalho["data"], fill="black", font=_FONTES["texto"], anchor="mm")
+
+    y = MARGEM + max(esquerda.height, direita.height) + 20
+    draw.text((MARGEM, y), f"{pedido['usuario_nome']} ({pedido['usuario_setor']})", fill="black", font=_FONTES["subtitulo"])
+    draw.text((LARGURA_PAGINA - MARGEM, y), pedido["status"], fill="black", font=_FONTES["texto"], anchor="ra")
+    y += 36
+
+    # Itens: número(s) da pizza, sabor, pedaços e subtotal
+    colunas = (MARGEM, MARGEM + 130, MARGEM + 520, LARGURA_PAGINA - MARGEM)
+    draw.line((MARGEM, y - 6, LARGURA_PAGINA - MARGEM, y - 6), fill="black")
+    for x, titulo, ancora in zip(colunas, ("PIZZA", "SABOR", "PEDAÇOS", "SUBTOTAL"), ("la", "la", "la", "ra")):
+        draw.text((x, y), titulo, fill="black", font=_FONTES["texto"], anchor=ancora)
+    y += 24
+    for item in pedido["itens"]:
+        numeros = ", ".join(str(n) for n in sorted(set(item.get("pizza_numeros") or []))) or "-"
+        draw.text((colunas[0], y), numeros, fill="black", font=_FONTES["texto"])
+        draw.text((colunas[1], y), item["sabor_nome"], fill="black", font=_FONTES["texto"])
+        draw.text((colunas[2], y), str(item["quantidade"]), fill="black", font=_FONTES["texto"])
+        draw.text((colunas[3], y), _formatar_valor(item["subtotal"]), fill="black", font=_FONTES["texto"], anchor="ra")
+        y += 22
+    draw.line((MARGEM, y + 2, LARGURA_PAGINA - MARGEM, y + 2), fill="black")
+    y += 12
+
+    total = float(pedido["valor_total"]) + float(pedido["valor_frete"])
+    for rotulo, valor in (("Pizzas", pedido["valor_total"]), ("Frete", pedido["valor_frete"]), ("Total", total)):
+        draw.text((colunas[2], y), rotulo, fill="black", font=_FONTES["texto"])
+        draw.text((colunas[3], y), _formatar_valor(valor), fill="black", font=_FONTES["texto"], anchor="ra")
+        y += 22
+    y += 16
+
+    # Regras da pizzada
+    for regra in documento["regras"]:
+        recuo = MARGEM + (20 if regra.startswith(" ") else 0)
+        texto = regra.strip() if regra.startswith(" ") else f"• {regra}"
+        for linha in _quebrar_linhas(draw, texto, _FONTES["pequeno"], largura_util - (recuo - MARGEM)):
+            draw.text((recuo, y), linha, fill="black", font=_FONTES["pequeno"])
+            y += 17
+        y += 3
+
+    # QR code do pagamento e responsável
+    qrcode = _IMAGENS["qrcode"]
+    y_qr = max(y + 16, ALTURA_PAGINA - MARGEM - qrcode.height - 30)
+    pagina.paste(qrcode, (centro - qrcode.width // 2, y_qr), qrcode)
+    draw.text(
+        (centro, y_qr + qrcode.height + 14),
+        f"Responsável: {documento['nome_responsavel']}",
+        fill="black", font=_FONTES["texto"], anchor="mm"
+    )
+    return pagina
+
+
+def _renderizar_pagina(tarefa):
+    """Executado nos processos do pool: (formato, cabecalho, documento) -> bytes da página.
+
+    ZIP: PNG. PDF: JPEG, embutido direto no PDF (DCTDecode) sem recompressão.
+    """
+    formato, cabecalho, documento = tarefa
+    pagina = _desenhar_pagina(cabecalho, documento)
+    saida = io.BytesIO()
+    if formato == "zip":
+        pagina.save(saida, format="PNG", compress_level=3)
+    else:
+        pagina.save(saida, format="JPEG", quality=QUALIDADE_JPEG)
+    return saida.getvalue()
+
+
+def _paginas_renderizadas(tarefas):
+    """Renderiza as tarefas em ordem, com no máximo algumas páginas em andamento.
+
+    Sem suporte a processos no ambiente (sandbox, sem /dev/shm), renderiza no
+    próprio processo.
+    """
+    processos = max(1, min(MAX_PROCESSOS, os.cpu_count() or 1))
+    try:
+        pool = ProcessPoolExecutor(
+            max_workers=processos,
+            initializer=_inicializar_worker,
+            initargs=(DIRETORIO_IMAGENS,)
+        )
+    except (OSError, NotImplementedError) as e:
+        print(f"[EXPORTACAO] Pool de processos indisponível, renderizando no processo atual: {e}")
+        if not _IMAGENS:
+            _inicializar_worker(DIRETORIO_IMAGENS)
+        for tarefa in tarefas:
+            yield _renderizar_pagina(tarefa)
+        return
+
+    janela = processos * PAGINAS_POR_PROCESSO
+    pendentes = deque()
+    try:
+        for tarefa in tarefas:
+            pendentes.append(pool.submit(_renderizar_pagina, tarefa))
+            if len(pendentes) >= janela:
+                yield pendentes.popleft().result()
+        while pendentes:
+            yield pendentes.popleft().result()
+    finally:
+        # Cliente desconectou ou erro: descarta o que ainda não começou
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+class _SaidaContinua:
+    """Arquivo só de escrita (não posicionável) cujo conteúdo é retirado aos pedaços."""
+
+    def __init__(self):
+        self._partes = []
+
+    def write(self, dados):
+        self._partes.append(bytes(dados))
+        return len(dados)
+
+    def flush(self):
+        pass
+
+    def retirar(self) -> bytes:
+        dados = b"".join(self._partes)
+        self._partes = []
+        return dados
+
+
+def _stream_zip(nomes, paginas):
+    saida = _SaidaContinua()
+    # Sem seek o zipfile grava descritores de dados após cada arquivo; PNG já é comprimido
+    with zipfile.ZipFile(saida, mode="w", compression=zipfile.ZIP_STORED) as arquivo:
+        for nome, png in zip(nomes, paginas):
+            arquivo.writestr(nome, png)
+            yield saida.retirar()
+    yield saida.retirar()
+
+
+def _stream_pdf(paginas):
+    """PDF com uma imagem JPEG por página, escrito em sequência.
+
+    Os objetos de cada página saem assim que ela fica pronta; o nó Pages, o
+    catálogo e a tabela xref (que precisam de todas as páginas) vão no final.
+    """
+    offsets = {}
+    posicao = 0
+    kids = []
+
+    def objeto(numero, corpo: bytes) -> bytes:
+        nonlocal posicao
+        offsets[numero] = posicao
+        dados = f"{numero} 0 obj\n".encode() + corpo + b"\nendobj\n"
+        posicao += len(dados)
+        return dados
+
+    cabecalho = b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n"
+    posicao = len(cabecalho)
+    yield cabecalho
+
+    # 1 = catálogo, 2 = Pages (escritos no final); páginas a partir de 3
+    proximo = 3
+    conteudo = f"q {LARGURA_PDF} 0 0 {ALTURA_PDF} 0 0 cm /Im0 Do Q".encode()
+    for jpeg in paginas:
+        n_imagem, n_conteudo, n_pagina = proximo, proximo + 1, proximo + 2
+        proximo += 3
+        kids.append(n_pagina)
+        yield objeto(n_imagem, (
+            f"<< /Type /XObject /Subtype /Image /Width {LARGURA_PAGINA} /Height {ALTURA_PAGINA} "
+            f"/ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter /DCTDecode /Length {len(jpeg)} >>\n"
+            "stream\n"
+        ).encode() + jpeg + b"\nendstream")
+        yield objeto(n_conteudo, f"<< /Length {len(conteudo)} >>\nstream\n".encode() + conteudo + b"\nendstream")
+        yield objeto(n_pagina, (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {LARGURA_PDF} {ALTURA_PDF}] "
+            f"/Resources << /XObject << /Im0 {n_imagem} 0 R >> >> /Contents {n_conteudo} 0 R >>"
+        ).encode())
+
+    referencias = " ".join(f"{n} 0 R" for n in kids)
+    yield objeto(2, f"<< /Type /Pages /Kids [{referencias}] /Count {len(kids)} >>".encode())
+    yield objeto(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+
+    inicio_xref = posicao
+    linhas = [f"xref\n0 {proximo}\n", "0000000000 65535 f \n"]
+    linhas += [f"{offsets[n]:010d} 00000 n \n" for n in range(1, proximo)]
+    linhas.append(f"trailer\n<< /Size {proximo} /Root 1 0 R >>\nstartxref\n{inicio_xref}\n%%EOF\n")
+    yield "".join(linhas).encode()
+
+
+def _nome_arquivo(documento: dict) -> str:
+    pedido = documento["pedido"]
+    nome = "".join(c if c.isalnum() else "_" for c in pedido["usuario_nome"]).strip("_")
+    return f"{pedido['id']:05d}_{nome or 'usuario'}.png"
+
+
+def exportar_relatorios(cabecalho: dict, documentos: dict, formato: str):
+    """Gera o arquivo (em pedaços de bytes) com o relatório de cada participante.
+
+    `cabecalho`: {"nome", "data"} do evento; `documentos`: {usuario_id: documento}
+    como retornado por relatorios_pagamento.gerar_documentos.
+    """
+    ordenados = sorted(documentos.values(), key=lambda d: (d["pedido"]["usuario_nome"].upper(), d["pedido"]["id"]))
+    paginas = _paginas_renderizadas((formato, cabecalho, documento) for documento in ordenados)
+    if formato == "zip":
+        yield from _stream_zip((_nome_arquivo(d) for d in ordenados), paginas)
+    else:
+        yield from _stream_pdf(paginas)
@@ -0,0 +1,62 @@
+"""
+Feed ao vivo dos pedidos de um evento para o admin (Server-Sent Events).
+
+O admin recebe um snapshot dos pedidos do evento e, depois, cada mudança
+publicada pelas rotas de escrita no barramento ("pedidos:{evento_id}"):
+- criado / editado: pedido completo (o mesmo PedidoResponse da resposta da rota)
+- cancelado: só o pedido_id
+- status: pedido_id e novo status (admin, pagamentos)
+
+As mensagens já levam os dados montados em memória pela escrita, então uma tela
+de admin aberta não consulta o banco depois do snapshot. O barramento é por
+instância: se a fila do cliente transbordar, um novo snapshot é enviado; ao
+reconectar, o cliente também recebe um snapshot novo.
+"""
+import json
+
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+
+import barramento
+
+INTERVALO_HEARTBEAT = 15
+
+
+def publicar_pedido(evento_id: int, tipo: str, pedido_id: int, versao_pedidos=None,
+                    pedido=None, status: str = None):
+    """Publica uma mudança de pedido já commitada (feed do admin e dashboard ao vivo).
+
+    `versao_pedidos` None = mudança que não altera itens/totais (ex.: status).
+    """
+    mensagem = {"tipo": tipo, "pedido_id": pedido_id, "versao_pedidos": versao_pedidos}
+    if pedido is not None:
+        mensagem["pedido"] = jsonable_encoder(pedido)
+    if status is not None:
+        mensagem["status"] = status
+    barramento.publicar(barramento.topico_pedidos(evento_id), mensagem)
+
+
+def _sse(tipo: str, dados) -> str:
+    return f"event: {tipo}\ndata: {json.dumps(dados, default=str)}\n\n"
+
+
+async def stream_feed(evento_id: int, carregar_pedidos):
+    """Gerador SSE: snapshot (carregar_pedidos(evento_id), síncrono) e depois as mudanças."""
+    # Assina antes do snapshot para não perder escritas no meio
+    assinatura = barramento.assinar(barramento.topico_pedidos(evento_id))
+    try:
+        pedidos = await run_in_threadpool(carregar_pedidos, evento_id)
+        yield _sse("snapshot", {"evento_id": evento_id, "pedidos": jsonable_encoder(pedidos)})
+        while True:
+            try:
+                mensagem = await assinatura.receber(timeout=INTERVALO_HEARTBEAT)
+            except barramento.FilaCheia:
+                pedidos = await run_in_threadpool(carregar_pedidos, evento_id)
+                yield _sse("snapshot", {"evento_id": evento_id, "pedidos": jsonable_encoder(pedidos)})
+                continue
+            if mensagem is None:
+                yield ": ping\n\n"
+                continue
+            yield _sse(mensagem["tipo"], mensagem)
+    finally:
+        barramento.cancelar(assinatura)
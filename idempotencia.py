@@ -0,0 +1,127 @@
+"""
+Suporte ao header Idempotency-Key para os endpoints de escrita mais sujeitos a retry
+(criar/editar pedido e votar).
+
+O Wi-Fi instável faz o cliente reenviar a mesma requisição; com a mesma chave, o
+reenvio recebe a resposta guardada da primeira execução sem tocar nas tabelas.
+As respostas ficam em um store em memória limitado com TTL: a janela de
+interesse é a de um retry, não dias. O TTL é fixo, então a ordem de inserção é
+também a ordem de expiração (o store é uma fila: uma chave reutilizada não muda
+de posição). O limite de chaves só descarta respostas já concluídas. Só
+respostas de sucesso são guardadas; erros (HTTPException) liberam a chave para
+uma nova tentativa.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from fastapi import HTTPException, status
+
+IDEMPOTENCIA_TTL_SEGUNDOS = 15 * 60
+IDEMPOTENCIA_MAX_CHAVES = 5000
+IDEMPOTENCIA_TAMANHO_MAX_CHAVE = 255
+
+_lock = threading.Lock()
+# (usuario_id, escopo, chave) -> {"hash", "expira_em", "resposta", "concluida"}
+_store = OrderedDict()
+
+
+def _hash_payload(payload) -> str:
+    return hashlib.sha256(
+        json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+
+
+def _limpar_expiradas(agora: float):
+    """Remove as vencidas e, acima de IDEMPOTENCIA_MAX_CHAVES, as concluídas mais antigas.
+
+    Entradas em execução nunca saem: quem as reservou ainda vai gravar a resposta,
+    e um reenvio nesse meio tempo precisa receber 409, não executar de novo.
+    """
+    excedente = len(_store) - IDEMPOTENCIA_MAX_CHAVES
+    remover = []
+    # Ordem de inserção = ordem de expiração: as que vencem primeiro ficam no início
+    for identificador, entrada in _store.items():
+        if entrada["expira_em"] > agora and excedente <= 0:
+            break
+        if not entrada["concluida"]:
+            continue
+        remover.append(identificador)
+        excedente -= 1
+    for identificador in remover:
+        del _store[identificador]
+
+
+def _reservar(identificador, hash_payload):
+    """Retorna a resposta guardada, ou None se a chave foi reservada para esta execução."""
+    agora = time.monotonic()
+
+    with _lock:
+        _limpar_expiradas(agora)
+        entrada = _store.get(identificador)
+        if entrada is not None and entrada["concluida"] and entrada["expira_em"] <= agora:
+            # Venceu mas ainda não chegou ao início da fila: trata como chave nova
+            del _store[identificador]
+            entrada = None
+
+        if entrada is not None:
+            if entrada["hash"] != hash_payload:
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+                    detail="Idempotency-Key já utilizada com outro conteúdo de requisição"
+                )
+            if not entrada["concluida"]:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="Requisição com esta Idempotency-Key ainda está em processamento"
+                )
+            return entrada
+
+        _store[identificador] = {
+            "hash": hash_payload,
+            "expira_em": agora + IDEMPOTENCIA_TTL_SEGUNDOS,
+            "resposta": None,
+            "concluida": False
+        }
+        return None
+
+
+async def executar_idempotente(chave, usuario_id: int, escopo: str, payload, executar):
+    """Executa `executar()` (corrotina) uma única vez por (usuário, escopo, chave).
+
+    - Sem chave: executa normalmente.
+    - Mesma chave e mesmo payload: devolve a resposta da primeira execução.
+    - Mesma chave com payload diferente: 422.
+    - Mesma chave ainda em execução: 409.
+    """
+    if not chave:
+        return await executar()
+
+    if len(chave) > IDEMPOTENCIA_TAMANHO_MAX_CHAVE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Idempotency-Key deve ter no máximo {IDEMPOTENCIA_TAMANHO_MAX_CHAVE} caracteres"
+        )
+
+    identificador = (usuario_id, escopo, chave)
+    entrada = _reservar(identificador, _hash_payload(payload))
+    if entrada is not None:
+        return entrada["resposta"]
+
+    try:
+        resposta = await executar()
+    except BaseException:
+        # Falhou: libera a chave para que o cliente possa tentar de novo
+        with _lock:
+            _store.pop(identificador, None)
+        raise
+
+    with _lock:
+        entrada = _store.get(identificador)
+        if entrada is not None:
+            entrada["resposta"] = resposta
+            entrada["concluida"] = True
+
+    return resposta
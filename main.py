@@ -17,6 +17,12 @@ from routes_votacoes import router as votacoes_router
 from routes_feedbacks import router as feedbacks_router
 from routes_admin import router as admin_router
 from database import get_db_connection
+from catalogo_sabores import carregar_catalogo
+from eventos_ativos import carregar_eventos_ativos
+from setores import sincronizar_setor_codigos
+from totais_evento import reconciliar_totais
+from totais_votacao import reconciliar_votos
+from agendador import iniciar_agendador
 
 
 def run_migrations():
@@ -25,6 +31,7 @@ def run_migrations():
         # Adicionar coluna pagamento_liberado à tabela eventos
         "ALTER TABLE eventos ADD COLUMN IF NOT EXISTS pagamento_liberado BOOLEAN DEFAULT FALSE",
         "ALTER TABLE pizza_configs ADD COLUMN IF NOT EXISTS number_overrides JSONB DEFAULT '{}'::jsonb",
+        "ALTER TABLE pizza_configs ADD COLUMN IF NOT EXISTS otimizar_alocacao BOOLEAN NOT NULL DEFAULT FALSE",
         # Tabela de Auditoria (Fase 3)
         """
         CREATE TABLE IF NOT EXISTS auditoria_logs (
@@ -35,7 +42,55 @@ def run_migrations():
             ip_address varchar(50),
             data_hora timestamptz default now()
         )
+        """,
+        # Alocação de pizzas persistida por versão (versao_pedidos muda a cada escrita em pedidos)
+        "ALTER TABLE eventos ADD COLUMN IF NOT EXISTS versao_pedidos BIGINT NOT NULL DEFAULT 0",
+        # Lado do andar normalizado do usuário (bits: 1 = STI, 2 = SGS), derivado de usuarios.setor
+        "ALTER TABLE usuarios ADD COLUMN IF NOT EXISTS setor_codigo SMALLINT NOT NULL DEFAULT 0",
         """
+        CREATE TABLE IF NOT EXISTS pizza_alocacoes (
+            evento_id integer primary key references eventos(id) on delete cascade,
+            versao varchar(100) not null,
+            alocacao jsonb not null,
+            calculado_em timestamptz default now()
+        )
+        """,
+        # Totais do dashboard mantidos pelas escritas de pedidos (ver totais_evento)
+        "ALTER TABLE eventos ADD COLUMN IF NOT EXISTS total_participantes INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE eventos ADD COLUMN IF NOT EXISTS total_pedidos INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE eventos ADD COLUMN IF NOT EXISTS valor_total_pedidos NUMERIC(12, 2) NOT NULL DEFAULT 0",
+        """
+        CREATE TABLE IF NOT EXISTS evento_sabores_totais (
+            evento_id integer not null references eventos(id) on delete cascade,
+            sabor_id integer not null references sabores_pizza(id) on delete cascade,
+            total_pedacos integer not null default 0,
+            primary key (evento_id, sabor_id)
+        )
+        """,
+        # Relatórios de pagamento por usuário, gerados ao liberar os pagamentos
+        """
+        CREATE TABLE IF NOT EXISTS relatorios_pagamento (
+            evento_id integer not null references eventos(id) on delete cascade,
+            usuario_id integer not null references usuarios(id) on delete cascade,
+            versao varchar(100) not null,
+            documento jsonb not null,
+            gerado_em timestamptz default now(),
+            primary key (evento_id, usuario_id)
+        )
+        """,
+        # Votos por escolha mantidos pelo endpoint de votar (ver totais_votacao)
+        "ALTER TABLE votacao_escolhas ADD COLUMN IF NOT EXISTS total_votos INTEGER NOT NULL DEFAULT 0",
+        # Um voto por usuário por votação garantido pelo schema (substitui o trigger check_voto_unico)
+        "ALTER TABLE votos ADD COLUMN IF NOT EXISTS votacao_id INTEGER REFERENCES votacoes(id) ON DELETE CASCADE",
+        """
+        UPDATE votos v SET votacao_id = e.votacao_id
+        FROM votacao_escolhas e
+        WHERE e.id = v.escolha_id AND v.votacao_id IS NULL
+        """,
+        "ALTER TABLE votos ALTER COLUMN votacao_id SET NOT NULL",
+        "CREATE UNIQUE INDEX IF NOT EXISTS uk_voto_votacao ON votos (votacao_id, usuario_id)",
+        "DROP TRIGGER IF EXISTS trg_voto_unico_votacao ON votos",
+        "DROP FUNCTION IF EXISTS check_voto_unico()"
     ]
     
     try:
@@ -55,10 +110,58 @@ def run_migrations():
             cursor.close()
     except Exception as e:
         print(f"[MIGRATION] Erro de conexão (ignorado): {e}")
+    
+    # Backfill de usuarios.setor_codigo (também acompanha mudanças em SETOR_CODIGOS)
+    try:
+        alterados = sincronizar_setor_codigos()
+        print(f"[MIGRATION] setor_codigo sincronizado ({alterados} usuários alterados)")
+    except Exception as e:
+        print(f"[MIGRATION] Erro ao sincronizar setor_codigo (ignorado): {e}")
+    
+    # Backfill/reparo dos totais do dashboard (recalculados a partir dos pedidos);
+    # só eventos abertos ou sem totais, para não travar o histórico a cada cold start
+    try:
+        divergentes = reconciliar_totais(somente_pendentes=True)
+        print(f"[MIGRATION] Totais dos eventos reconciliados ({divergentes} eventos corrigidos)")
+    except Exception as e:
+        print(f"[MIGRATION] Erro ao reconciliar totais dos eventos (ignorado): {e}")
+    
+    # Backfill/reparo da contagem de votos por escolha (recalculada a partir de votos)
+    try:
+        divergentes = reconciliar_votos()
+        print(f"[MIGRATION] Votos reconciliados ({divergentes} escolhas corrigidas)")
+    except Exception as e:
+        print(f"[MIGRATION] Erro ao reconciliar votos (ignorado): {e}")
+
+
+def aquecer_caches():
+    """Pré-carrega os caches em memória no startup (falhas não impedem a subida)"""
+    try:
+        carregar_catalogo()
+        print("[CACHE] Catálogo de sabores carregado")
+    except Exception as e:
+        print(f"[CACHE] Erro ao carregar catálogo de sabores (ignorado): {e}")
+    
+    try:
+        carregar_eventos_ativos()
+        print("[CACHE] Registro de eventos ativos carregado")
+    except Exception as e:
+        print(f"[CACHE] Erro ao carregar eventos ativos (ignorado): {e}")
+
+
+def iniciar_jobs():
+    """Sobe os jobs em background (falhas não impedem a subida)"""
+    try:
+        iniciar_agendador()
+        print("[AGENDADOR] Fechamento automático de eventos e votações agendado")
+    except Exception as e:
+        print(f"[AGENDADOR] Erro ao iniciar agendador (ignorado): {e}")
 
 
 # Executar migrações no startup
 run_migrations()
+aquecer_caches()
+iniciar_jobs()
 
 # Rate limiter global
 limiter = Limiter(key_func=get_remote_address)
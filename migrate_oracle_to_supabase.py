@@ -75,11 +75,20 @@ TABLE_COLUMNS = {
         "status", "criado_por", "data_criacao",
     ],
     "votacao_escolhas": ["id", "votacao_id", "texto", "ordem"],
-    "votos": ["id", "escolha_id", "usuario_id", "data_voto"],
+    "votos": ["id", "votacao_id", "escolha_id", "usuario_id", "data_voto"],
     "feedbacks": ["id", "usuario_id", "categoria", "mensagem", "anonimo", "data_criacao"],
     "auditoria_logs": ["id", "usuario_id", "acao", "detalhes", "ip_address", "data_hora"],
 }
 
+# Colunas que não existem no Oracle e são derivadas na leitura
+ORACLE_SELECTS = {
+    "votos": """
+        select v.id, e.votacao_id, v.escolha_id, v.usuario_id, v.data_voto
+        from votos v join votacao_escolhas e on e.id = v.escolha_id
+        order by v.id
+    """,
+}
+
 BOOLEAN_COLUMNS = {
     "usuarios": {"is_admin", "ativo"},
     "sabores_pizza": {"ativo"},
@@ -153,7 +162,10 @@ def normalize_value(table: str, column: str, value):
 def fetch_oracle_rows(cursor, table: str):
     columns = TABLE_COLUMNS[table]
     order_by = "id" if "id" in columns else ", ".join(columns)
-    cursor.execute(f"select {', '.join(columns)} from {table} order by {order_by}")
+    if table in ORACLE_SELECTS:
+        cursor.execute(ORACLE_SELECTS[table])
+    else:
+        cursor.execute(f"select {', '.join(columns)} from {table} order by {order_by}")
     fetched_columns = [desc[0].lower() for desc in cursor.description]
 
     rows = []
@@ -107,6 +107,8 @@ class PedidoResponse(BaseModel):
     usuario_id: int
     usuario_nome: str
     usuario_setor: str
+    # Lado do andar (bits de setores.SETOR_STI/SETOR_SGS) para agrupar sem ler o texto
+    usuario_setor_codigo: Optional[int] = None
     is_premium: Optional[bool] = False
     valor_total: float
     valor_frete: float
@@ -121,6 +123,7 @@ class PedidoUpdate(BaseModel):
 class EstatisticasPizza(BaseModel):
     sabor_id: int
     sabor_nome: str
+    sabor_tipo: Optional[str] = None
     total_pedacos: int
     pizzas_completas: int  # quantas pizzas de 8 pedaços
     pedacos_restantes: int  # pedaços que não fecham uma pizza
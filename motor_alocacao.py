@@ -0,0 +1,471 @@
+"""
+Motor incremental de alocação de pedaços em pizzas.
+
+Mantém como estado os itens de cada sabor (na ordem data_pedido, pedido, item) e
+as partições já calculadas de cada sabor (inteiras, meias e sobra). Uma escrita
+em um pedido recalcula só as partições dos sabores afetados; pareamento,
+vencedor e numeração são refeitos sobre as pizzas já montadas.
+
+Os pedaços são representados em segmentos (run-length): um segmento é uma
+sequência de pedaços do mesmo item dentro de uma pizza, com usuário, lado do
+setor (bits de usuarios.setor_codigo), quantidade e data do pedido. Cortar em pizzas de 8 e 4 e contar
+setores é aritmética sobre segmentos, então o custo acompanha o número de itens,
+não o de pedaços.
+
+O resultado é idêntico ao do algoritmo em lote do AdminPizzaDashboard.jsx.
+Módulo puro (sem acesso a banco): quem usa fornece os itens e os overrides.
+"""
+from bisect import insort
+
+from otimizador_alocacao import otimizar_metades
+from setores import SETOR_STI, SETOR_SGS
+
+
+class MotorAlocacao:
+    """Estado da alocação de um evento, atualizado por deltas de pedido."""
+
+    def __init__(self):
+        self._sabores = {}           # sabor_id -> {"id", "name", "type"}
+        self._itens_por_sabor = {}   # sabor_id -> [(chave, item)] ordenado por chave
+        self._totais = {}            # sabor_id -> total de pedaços
+        self._itens_por_pedido = {}  # pedido_id -> [item]
+        self._particoes = {}         # sabor_id -> (inteiras, meias, sobras)
+
+    @classmethod
+    def a_partir_de_linhas(cls, todos_itens):
+        """Monta o motor a partir das linhas de itens do evento (chaves em maiúsculas)."""
+        motor = cls()
+        pedidos = {}
+        for row in todos_itens:
+            pedido = pedidos.setdefault(row["PEDIDO_ID"], {
+                "usuario_id": row["USUARIO_ID"],
+                "setor_codigo": row["USUARIO_SETOR_CODIGO"],
+                "data_pedido": row["DATA_PEDIDO"],
+                "itens": []
+            })
+            pedido["itens"].append({
+                "item_id": row["ITEM_ID"],
+                "sabor_id": row["SABOR_ID"],
+                "sabor_nome": row["SABOR_NOME"],
+                "sabor_tipo": row["SABOR_TIPO"],
+                "quantidade": row["QUANTIDADE"]
+            })
+
+        for pedido_id, pedido in pedidos.items():
+            motor.aplicar_pedido(
+                pedido_id, pedido["usuario_id"], pedido["setor_codigo"], pedido["data_pedido"], pedido["itens"]
+            )
+        return motor
+
+    # ============================================
+    # Deltas
+    # ============================================
+
+    def aplicar_pedido(self, pedido_id, usuario_id, setor_codigo, data_pedido, itens):
+        """Insere ou substitui todos os itens de um pedido.
+
+        `setor_codigo`: usuarios.setor_codigo (bits SETOR_STI / SETOR_SGS).
+        `itens`: [{"item_id", "sabor_id", "sabor_nome", "sabor_tipo", "quantidade"}].
+        Substituir é idempotente: reaplicar o mesmo pedido não altera o resultado.
+        """
+        afetados = self._retirar_pedido(pedido_id)
+
+        sti = bool((setor_codigo or 0) & SETOR_STI)
+        sgs = bool((setor_codigo or 0) & SETOR_SGS)
+
+        novos = []
+        for item in itens:
+            if item["quantidade"] <= 0:
+                continue
+            fid = item["sabor_id"]
+            self._sabores[fid] = {
+                "id": fid,
+                "name": item["sabor_nome"],
+                "type": item["sabor_tipo"] or "SALGADA"
+            }
+            entrada = {
+                "item_id": item["item_id"],
+                "flavor_id": fid,
+                "usuario_id": usuario_id,
+                "sti": sti,
+                "sgs": sgs,
+                "timestamp": data_pedido,
+                "quantidade": item["quantidade"]
+            }
+            # A chave é única (contém o item_id), então a tupla nunca compara os dicts
+            insort(
+                self._itens_por_sabor.setdefault(fid, []),
+                ((data_pedido, pedido_id, item["item_id"]), entrada)
+            )
+            self._totais[fid] = self._totais.get(fid, 0) + entrada["quantidade"]
+            novos.append(entrada)
+            afetados.add(fid)
+
+        if novos:
+            self._itens_por_pedido[pedido_id] = novos
+
+        self._invalidar(afetados)
+
+    def remover_pedido(self, pedido_id):
+        """Remove todos os itens de um pedido (cancelamento)."""
+        self._invalidar(self._retirar_pedido(pedido_id))
+
+    def _retirar_pedido(self, pedido_id):
+        afetados = set()
+        for entrada in self._itens_por_pedido.pop(pedido_id, []):
+            fid = entrada["flavor_id"]
+            self._itens_por_sabor[fid] = [
+                par for par in self._itens_por_sabor[fid] if par[1] is not entrada
+            ]
+            self._totais[fid] -= entrada["quantidade"]
+            afetados.add(fid)
+        return afetados
+
+    def _invalidar(self, sabores):
+        for fid in sabores:
+            self._particoes.pop(fid, None)
+            if not self._itens_por_sabor.get(fid):
+                self._itens_por_sabor.pop(fid, None)
+                self._totais.pop(fid, None)
+                self._sabores.pop(fid, None)
+
+    # ============================================
+    # Partições por sabor
+    # ============================================
+
+    def _particao(self, fid):
+        particao = self._particoes.get(fid)
+        if particao is None:
+            particao = self._particionar(fid)
+            self._particoes[fid] = particao
+        return particao
+
+    def _particionar(self, fid):
+        flavor = self._sabores[fid]
+        entradas = [entrada for _, entrada in self._itens_por_sabor[fid]]
+        cursor = {"pos": 0, "usado": 0}  # entrada atual e pedaços já consumidos dela
+
+        def tomar(n):
+            """Próximos n pedaços do sabor, como segmentos."""
+            segmentos = []
+            while n > 0:
+                entrada = entradas[cursor["pos"]]
+                k = min(n, entrada["quantidade"] - cursor["usado"])
+                segmentos.append({
+                    "item_id": entrada["item_id"],
+                    "usuario_id": entrada["usuario_id"],
+                    "sti": entrada["sti"],
+                    "sgs": entrada["sgs"],
+                    "quantidade": k,
+                    "timestamp": entrada["timestamp"]
+                })
+                n -= k
+                cursor["usado"] += k
+                if cursor["usado"] == entrada["quantidade"]:
+                    cursor["pos"] += 1
+                    cursor["usado"] = 0
+            return segmentos
+
+        def pizza(pizza_id, slices_count, segmentos, **extra):
+            return {
+                "id": pizza_id,
+                "flavor_name": flavor["name"],
+                "flavor_type": flavor["type"],
+                "slices_count": slices_count,
+                "segmentos": segmentos,
+                "sti_count": sum(s["quantidade"] for s in segmentos if s["sti"]),
+                "sgs_count": sum(s["quantidade"] for s in segmentos if s["sgs"]),
+                # FRONTEND USA: pizzaSlices[pizzaSlices.length - 1].timestamp
+                "last_update": segmentos[-1]["timestamp"],
+                **extra
+            }
+
+        total = self._totais[fid]
+        inteiras = total // 8
+        resto = total % 8
+        meias = resto // 4
+        resto_final = resto % 4
+
+        complete_pizzas = [
+            pizza(f"{flavor['id']}-inteira-{i}", 8, tomar(8), is_meio_a_meio=False)
+            for i in range(inteiras)
+        ]
+        half_pizzas = [
+            pizza(f"{flavor['id']}-meia-{i}", 4, tomar(4), flavor_id=flavor["id"])
+            for i in range(meias)
+        ]
+        leftovers = []
+        if resto_final > 0:
+            leftovers.append(
+                pizza(f"{flavor['id']}-resto", resto_final, tomar(resto_final), is_meio_a_meio=False)
+            )
+
+        return complete_pizzas, half_pizzas, leftovers
+
+    def _processar_grupo(self, fids):
+        # Ordenar por popularidade (mais pedaços primeiro), com ID como desempate para garantir ordem determinística
+        # IMPORTANTE: Isso garante que frontend e backend gerem os mesmos IDs de pizza
+        fids = sorted(fids, key=lambda fid: (-self._totais[fid], fid))
+
+        complete_pizzas = []
+        half_pizzas = []
+        leftovers = []
+        for fid in fids:
+            inteiras, meias, sobras = self._particao(fid)
+            complete_pizzas.extend(inteiras)
+            half_pizzas.extend(meias)
+            leftovers.extend(sobras)
+        return complete_pizzas, half_pizzas, leftovers
+
+    # ============================================
+    # Resultado
+    # ============================================
+
+    def calcular(self, pairing_overrides, sector_overrides, number_overrides, otimizar=False):
+        """Pareia, define vencedor e numera as pizzas a partir das partições em cache.
+
+        Overrides são aplicados com índices (id → pizza, número → pizza), em tempo
+        linear. Overrides que não se aplicam (pizza que não existe mais, meia já
+        pareada, pizza sem número) são ignorados e listados em "overrides_invalidos".
+
+        Com `otimizar`, meias e sobras que não estão em overrides são pareadas pelo
+        otimizador (otimizador_alocacao) em vez do auto_pair guloso.
+
+        Retorna {"pizzas": [...], "numeros_por_usuario": {usuario_id: {item_id: [números]}},
+                 "overrides_invalidos": [{"tipo", "pizza_id", "motivo"}]},
+        mais "otimizacao" (relatório de pizzas economizadas) quando `otimizar`.
+        """
+        overrides_invalidos = []
+
+        # Separar salgados e doces
+        salgada_fids = [fid for fid, f in self._sabores.items() if f["type"] != "DOCE"]
+        doce_fids = [fid for fid, f in self._sabores.items() if f["type"] == "DOCE"]
+
+        salgada_complete, salgada_halves, salgada_leftovers = self._processar_grupo(salgada_fids)
+        doce_complete, doce_halves, doce_leftovers = self._processar_grupo(doce_fids)
+
+        meia_por_id = {h["id"]: h for h in salgada_halves + doce_halves}
+
+        # Parear meias pizzas
+        paired_set = set()
+        paired_halves = []
+        unpaired_halves = []
+
+        # Pareamentos customizados primeiro
+        for h1_id, h2_id in pairing_overrides.items():
+            h1 = meia_por_id.get(h1_id)
+            h2 = meia_por_id.get(h2_id)
+            if not h1 or not h2:
+                overrides_invalidos.append({
+                    "tipo": "pairing",
+                    "pizza_id": h2_id if h1 else h1_id,
+                    "motivo": "Meia pizza não existe mais"
+                })
+                continue
+            if h1_id in paired_set or h2_id in paired_set:
+                overrides_invalidos.append({
+                    "tipo": "pairing",
+                    "pizza_id": h1_id if h1_id in paired_set else h2_id,
+                    "motivo": "Meia pizza já pareada por outro override"
+                })
+                continue
+
+            paired_halves.append({
+                **_combinar_meias(h1, h2),
+                "half1_id": h1["id"],
+                "half2_id": h2["id"]
+            })
+            paired_set.add(h1_id)
+            paired_set.add(h2_id)
+
+        # Auto-parear restantes por tipo
+        def auto_pair(halves):
+            for i in range(0, len(halves), 2):
+                if i + 1 < len(halves):
+                    paired_halves.append(_combinar_meias(halves[i], halves[i + 1]))
+                else:
+                    unpaired_halves.append({**halves[i], "is_meio_a_meio": False})
+
+        otimizacao = None
+        if otimizar:
+            # Meias e sobras do mesmo tipo viram meio a meio; o que sobrar continua esperando
+            otimizacao = {}
+            sobras_restantes = []
+            for halves, leftovers in ((salgada_halves, salgada_leftovers), (doce_halves, doce_leftovers)):
+                meias = [h for h in halves if h["id"] not in paired_set]
+                pares, sozinhas, relatorio = otimizar_metades(meias, leftovers)
+                for h1, h2 in pares:
+                    paired_halves.append(_combinar_meias(h1, h2))
+                ids_meias = {h["id"] for h in meias}
+                for p in sozinhas:
+                    if p["id"] in ids_meias:
+                        unpaired_halves.append({**p, "is_meio_a_meio": False})
+                    else:
+                        sobras_restantes.append(p)
+                for chave, valor in relatorio.items():
+                    if chave == "otimo_comprovado":
+                        otimizacao[chave] = otimizacao.get(chave, True) and valor
+                    else:
+                        otimizacao[chave] = otimizacao.get(chave, 0) + valor
+            otimizacao["pizzas_economizadas"] = otimizacao["pizzas_base"] - otimizacao["pizzas_otimizado"]
+            salgada_leftovers, doce_leftovers = sobras_restantes, []
+        else:
+            auto_pair([h for h in salgada_halves if h["id"] not in paired_set])
+            auto_pair([h for h in doce_halves if h["id"] not in paired_set])
+
+        # Combinar todas as pizzas (mesma ordem do frontend); cópias, pois as
+        # partições em cache não podem receber vencedor/número
+        final_pizzas = [
+            dict(p) for p in (
+                salgada_complete + doce_complete +
+                paired_halves +
+                unpaired_halves +
+                salgada_leftovers + doce_leftovers
+            )
+        ]
+
+        ids_finais = {p["id"] for p in final_pizzas}
+        for pizza_id in sector_overrides:
+            if pizza_id not in ids_finais:
+                overrides_invalidos.append({
+                    "tipo": "sector",
+                    "pizza_id": pizza_id,
+                    "motivo": "Pizza não existe mais"
+                })
+
+        # Calcular winner (STI/SGS/TIE) e aplicar overrides
+        for pizza in final_pizzas:
+            sti = pizza["sti_count"]
+            sgs = pizza["sgs_count"]
+
+            winner = "TIE"
+            if sti > sgs:
+                winner = "STI"
+            elif sgs > sti:
+                winner = "SGS"
+
+            if pizza["id"] in sector_overrides:
+                winner = sector_overrides[pizza["id"]]
+
+            pizza["winner"] = winner
+            # Meio a meio é sempre pedida (no modo otimizado pode ter fatias vagas)
+            pizza["is_complete"] = pizza["slices_count"] == 8 or pizza["is_meio_a_meio"]
+
+        # FRONTEND: stiPizzas sort(b.lastUpdate - a.lastUpdate) = DECRESCENTE
+        # FRONTEND: sgsPizzas sort(a.lastUpdate - b.lastUpdate) = CRESCENTE
+        sti_pizzas = sorted(
+            [p for p in final_pizzas if p["winner"] == "STI"],
+            key=lambda p: p["last_update"],
+            reverse=True
+        )
+        sgs_pizzas = sorted(
+            [p for p in final_pizzas if p["winner"] == "SGS"],
+            key=lambda p: p["last_update"]
+        )
+
+        # Numerar (STI primeiro, depois SGS) - apenas completas
+        current_number = 1
+        for p in sti_pizzas + sgs_pizzas:
+            if p["is_complete"]:
+                p["number"] = current_number
+                current_number += 1
+
+        # Aplicar number_overrides (trocas de numeração do admin) — com prevenção de duplicatas
+        if number_overrides:
+            all_numbered = [p for p in sti_pizzas + sgs_pizzas if p.get("number")]
+            pizza_by_id = {p["id"]: p for p in all_numbered}
+            # Números são únicos antes e depois de cada troca
+            pizza_by_number = {p["number"]: p for p in all_numbered}
+
+            for pizza_id, desired_number in number_overrides.items():
+                pizza = pizza_by_id.get(pizza_id)
+                if not pizza:
+                    overrides_invalidos.append({
+                        "tipo": "number",
+                        "pizza_id": pizza_id,
+                        "motivo": "Pizza não existe mais" if pizza_id not in ids_finais else "Pizza sem número"
+                    })
+                    continue
+
+                current_number = pizza.get("number")
+                if current_number == desired_number:
+                    continue
+
+                conflicting = pizza_by_number.get(desired_number)
+                if conflicting and conflicting["id"] != pizza_id:
+                    # Troca: a pizza que tinha o número desejado recebe o número atual
+                    conflicting["number"] = current_number
+                    pizza_by_number[current_number] = conflicting
+                else:
+                    pizza_by_number.pop(current_number, None)
+                pizza["number"] = desired_number
+                pizza_by_number[desired_number] = pizza
+
+        # Mapear usuario_id -> item_id -> números de pizza (um número por pedaço)
+        numeros_por_usuario = {}
+        for pizza in sti_pizzas + sgs_pizzas:
+            num = pizza.get("number")
+            if not num:
+                continue
+            for segmento in pizza["segmentos"]:
+                por_item = numeros_por_usuario.setdefault(segmento["usuario_id"], {})
+                por_item.setdefault(segmento["item_id"], []).extend([num] * segmento["quantidade"])
+
+        resultado = {
+            "pizzas": [serializar_pizza(p) for p in final_pizzas],
+            "numeros_por_usuario": numeros_por_usuario,
+            "overrides_invalidos": overrides_invalidos
+        }
+        if otimizacao is not None:
+            resultado["otimizacao"] = otimizacao
+        return resultado
+
+
+def _combinar_meias(h1, h2):
+    return {
+        "id": f"combined-{h1['id']}-{h2['id']}",
+        "flavor_name": f"{h1['flavor_name']} / {h2['flavor_name']}",
+        "flavor_name1": h1["flavor_name"],
+        "flavor_name2": h2["flavor_name"],
+        "flavor_type1": h1["flavor_type"],
+        "flavor_type2": h2["flavor_type"],
+        "is_meio_a_meio": True,
+        # 4 + 4 no pareamento normal; menos quando o otimizador pareia sobras
+        "slices_count": h1["slices_count"] + h2["slices_count"],
+        "segmentos": h1["segmentos"] + h2["segmentos"],
+        "sti_count": h1["sti_count"] + h2["sti_count"],
+        "sgs_count": h1["sgs_count"] + h2["sgs_count"],
+        # Frontend usa: new Date(h1.lastUpdate) > new Date(h2.lastUpdate) ? h1.lastUpdate : h2.lastUpdate
+        "last_update": max(h1["last_update"], h2["last_update"])
+    }
+
+
+def serializar_pizza(pizza: dict) -> dict:
+    """Versão enxuta (JSON) da pizza: fatias agrupadas por item em sequência."""
+    fatias = []
+    for s in pizza["segmentos"]:
+        if fatias and fatias[-1]["item_id"] == s["item_id"]:
+            fatias[-1]["quantidade"] += s["quantidade"]
+        else:
+            fatias.append({"item_id": s["item_id"], "usuario_id": s["usuario_id"], "quantidade": s["quantidade"]})
+
+    last_update = pizza["last_update"]
+
+    serializada = {
+        "id": pizza["id"],
+        "flavor_name": pizza["flavor_name"],
+        "is_meio_a_meio": pizza["is_meio_a_meio"],
+        "slices_count": pizza["slices_count"],
+        "is_complete": pizza["is_complete"],
+        "winner": pizza["winner"],
+        "sti_count": pizza["sti_count"],
+        "sgs_count": pizza["sgs_count"],
+        "number": pizza.get("number"),
+        "last_update": last_update.isoformat() if hasattr(last_update, "isoformat") else last_update,
+        "fatias": fatias
+    }
+    for campo in ("flavor_type", "flavor_name1", "flavor_name2", "flavor_type1", "flavor_type2",
+                  "half1_id", "half2_id"):
+        if campo in pizza:
+            serializada[campo] = pizza[campo]
+    return serializada
@@ -0,0 +1,204 @@
+"""
+Otimizador opcional do pareamento de meias pizzas e sobras.
+
+No modo padrão (guloso) as meias de cada tipo são pareadas em ordem de
+popularidade (auto_pair) e as sobras (1 a 3 pedaços) ficam cada uma em uma
+pizza própria esperando completar — na prática, cada uma vira uma pizza extra
+pedida para cobrir os pedaços.
+
+No modo otimizado, meias e sobras do mesmo tipo são tratadas como "metades" que
+podem ser combinadas em meio a meio. A busca minimiza, nesta ordem:
+1. pizzas necessárias (todas as metades pareadas, no máximo uma sozinha);
+2. pizzas divididas entre setores (com pedaços de STI e de SGS);
+3. pedaços do setor perdedor nessas pizzas.
+
+A busca é um branch-and-bound limitado por número de nós explorados (e não por
+tempo de relógio), para que todas as instâncias cheguem ao mesmo resultado.
+O pareamento guloso é a solução inicial: se o limite estourar, fica a melhor
+solução encontrada até ali, nunca pior que a gulosa.
+"""
+
+LIMITE_NOS_PADRAO = 20000
+
+# Peso de uma pizza dividida: maior que qualquer contagem de pedaços do setor perdedor (≤ 4)
+_PESO_DIVIDIDA = 16
+
+
+def _custo(sti: int, sgs: int) -> int:
+    """Custo de uma pizza pelos pedaços de cada setor (0 = um setor só)."""
+    if sti > 0 and sgs > 0:
+        return _PESO_DIVIDIDA + min(sti, sgs)
+    return 0
+
+
+def pizza_dividida(sti: int, sgs: int) -> bool:
+    return sti > 0 and sgs > 0
+
+
+def parear_metades(metades, limite_nos: int = LIMITE_NOS_PADRAO):
+    """Escolhe o pareamento das metades de um tipo.
+
+    `metades`: lista de dicts com "sti_count" e "sgs_count" (ordem = ordem gulosa).
+    Retorna (pares [(i, j)], sozinha (índice ou None), nos_explorados, otimo_comprovado).
+
+    Metades com as mesmas contagens de setor são intercambiáveis, então a busca
+    trabalha sobre quantas metades restam de cada combinação (sti, sgs), que são
+    poucas (pedaços ≤ 4 por metade), e descarta estados já alcançados com custo
+    menor ou igual.
+    """
+    n = len(metades)
+
+    # Metades agrupadas por contagens (na ordem em que aparecem)
+    filas = {}
+    for indice, m in enumerate(metades):
+        filas.setdefault((m["sti_count"], m["sgs_count"]), []).append(indice)
+    tipos = list(filas)
+    t_total = len(tipos)
+
+    custo_par = [
+        [_custo(tipos[a][0] + tipos[b][0], tipos[a][1] + tipos[b][1]) for b in range(t_total)]
+        for a in range(t_total)
+    ]
+    custo_sozinha = [_custo(sti, sgs) for sti, sgs in tipos]
+    # Parceiros de cada tipo em ordem de custo (desempate pelo índice: determinístico)
+    candidatos = [
+        sorted(range(a, t_total), key=lambda b, a=a: (custo_par[a][b], b))
+        for a in range(t_total)
+    ]
+
+    def limite_inferior_dobrado(contagem, pode_sozinha):
+        """Cada metade paga ao menos metade do par mais barato ainda possível."""
+        total = 0
+        for a in range(t_total):
+            if not contagem[a]:
+                continue
+            minimo = 2 * custo_sozinha[a] if pode_sozinha else None
+            for b in range(t_total):
+                if contagem[b] > (1 if a == b else 0):
+                    if minimo is None or custo_par[a][b] < minimo:
+                        minimo = custo_par[a][b]
+            total += contagem[a] * (minimo or 0)
+        return total
+
+    # Solução inicial: pareamento guloso na ordem recebida (última sozinha se ímpar)
+    melhor_pares = [(i, i + 1) for i in range(0, n - 1, 2)]
+    melhor_sozinha = n - 1 if n % 2 else None
+    melhor_custo = sum(
+        _custo(metades[i]["sti_count"] + metades[j]["sti_count"],
+               metades[i]["sgs_count"] + metades[j]["sgs_count"])
+        for i, j in melhor_pares
+    )
+    if melhor_sozinha is not None:
+        melhor_custo += _custo(metades[melhor_sozinha]["sti_count"], metades[melhor_sozinha]["sgs_count"])
+    melhor_escolhas = None  # [(tipo_a, tipo_b | None)] da melhor solução encontrada pela busca
+
+    estado = {"nos": 0, "interrompido": False}
+    visitados = {}  # (contagem, pode_sozinha) -> menor custo com que o estado foi alcançado
+    escolhas = []
+
+    def buscar(contagem, custo, pode_sozinha):
+        nonlocal melhor_custo, melhor_escolhas
+
+        a = next((t for t in range(t_total) if contagem[t]), None)
+        if a is None:
+            if custo < melhor_custo:
+                melhor_custo = custo
+                melhor_escolhas = list(escolhas)
+            return
+
+        estado["nos"] += 1
+        if estado["nos"] > limite_nos:
+            estado["interrompido"] = True
+            return
+
+        chave = (contagem, pode_sozinha)
+        if visitados.get(chave, melhor_custo) <= custo:
+            return
+        visitados[chave] = custo
+
+        if 2 * custo + limite_inferior_dobrado(contagem, pode_sozinha) >= 2 * melhor_custo:
+            return
+
+        restante = list(contagem)
+        restante[a] -= 1
+        for b in candidatos[a]:
+            if not restante[b]:
+                continue
+            restante[b] -= 1
+            escolhas.append((a, b))
+            buscar(tuple(restante), custo + custo_par[a][b], pode_sozinha)
+            escolhas.pop()
+            restante[b] += 1
+            if estado["interrompido"]:
+                return
+
+        # Quantidade ímpar: uma metade (no máximo) fica sozinha
+        if pode_sozinha:
+            escolhas.append((a, None))
+            buscar(tuple(restante), custo + custo_sozinha[a], False)
+            escolhas.pop()
+
+    buscar(tuple(len(filas[t]) for t in tipos), 0, n % 2 == 1)
+
+    if melhor_escolhas is None:
+        return melhor_pares, melhor_sozinha, estado["nos"], not estado["interrompido"]
+
+    # Traduz as escolhas por tipo para índices, consumindo cada fila em ordem
+    posicao = [0] * t_total
+
+    def proxima(t):
+        indice = filas[tipos[t]][posicao[t]]
+        posicao[t] += 1
+        return indice
+
+    pares = []
+    sozinha = None
+    for a, b in melhor_escolhas:
+        if b is None:
+            sozinha = proxima(a)
+        else:
+            pares.append((proxima(a), proxima(b)))
+    pares.sort()
+    return pares, sozinha, estado["nos"], not estado["interrompido"]
+
+
+def otimizar_metades(meias, sobras, limite_nos: int = LIMITE_NOS_PADRAO):
+    """Pareia meias e sobras de um tipo, mantendo o guloso se a busca não for melhor.
+
+    Retorna (pares [(pizza, pizza)], sozinhas [pizza], relatorio).
+    No guloso as meias são pareadas em sequência e cada sobra fica sozinha.
+    """
+    metades = meias + sobras
+    pares, sozinha, nos, otimo = parear_metades(metades, limite_nos)
+
+    pares_base = [(meias[i], meias[i + 1]) for i in range(0, len(meias) - 1, 2)]
+    sozinhas_base = ([meias[-1]] if len(meias) % 2 else []) + list(sobras)
+
+    def avaliar(pares_, sozinhas_):
+        pizzas = [
+            (a["sti_count"] + b["sti_count"], a["sgs_count"] + b["sgs_count"]) for a, b in pares_
+        ] + [(p["sti_count"], p["sgs_count"]) for p in sozinhas_]
+        return (
+            len(pizzas),
+            sum(_custo(sti, sgs) for sti, sgs in pizzas),
+            sum(1 for sti, sgs in pizzas if pizza_dividida(sti, sgs))
+        )
+
+    pares_otim = [(metades[i], metades[j]) for i, j in pares]
+    sozinhas_otim = [metades[sozinha]] if sozinha is not None else []
+
+    base = avaliar(pares_base, sozinhas_base)
+    otim = avaliar(pares_otim, sozinhas_otim)
+    aplicado = otim[:2] < base[:2]
+    if not aplicado:
+        pares_otim, sozinhas_otim, otim = pares_base, sozinhas_base, base
+
+    relatorio = {
+        "pizzas_base": base[0],
+        "pizzas_otimizado": otim[0],
+        "divididas_base": base[2],
+        "divididas_otimizado": otim[2],
+        "nos_explorados": nos,
+        "otimo_comprovado": otimo
+    }
+    return pares_otim, sozinhas_otim, relatorio
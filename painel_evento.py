@@ -0,0 +1,243 @@
+"""
+Painel do dashboard do evento: uma consulta e uma entrada de cache por evento.
+
+O frontend carrega dashboard, oportunidades e agrupamento juntos. Os três saem
+do mesmo painel, montado a partir de uma única consulta (linha do evento com os
+totais + pedaços por sabor com preço e tipo, ver totais_evento) e da alocação
+do evento.
+
+O painel fica em cache por evento, com a chave da versão da alocação
+(versao_pedidos + pizza_configs.updated_at + catálogo do evento, ver
+alocacao_evento.montar_versao):
+- dentro de VALIDADE_SEGUNDOS o painel é servido sem consulta (as três
+  chamadas paralelas do frontend viram uma);
+- depois disso a consulta roda de novo, mas com a mesma chave nada é remontado;
+- escritas de pedidos nesta instância invalidam o cache na hora
+  (invalidar_painel), e as de sabores o de todos os eventos (invalidar_paineis);
+  as de outras instâncias aparecem em até VALIDADE_SEGUNDOS, porque preço e
+  ativo dos sabores lidos na consulta também entram na chave.
+"""
+import threading
+import time
+
+from fastapi.encoders import jsonable_encoder
+
+from database import execute_query
+from models import DashboardResponse, EstatisticasPizza
+from alocacao_evento import obter_alocacao_evento, montar_versao, CATALOGO_EVENTO_SQL
+
+VALIDADE_SEGUNDOS = 1.0
+
+# Evento + totais + sabores com pedidos (uma linha por sabor; sabor NULL se não houver nenhum)
+PAINEL_QUERY = f"""
+    SELECT e.id, e.data_evento, e.status, e.versao_pedidos,
+           e.total_participantes, e.total_pedidos, e.valor_total_pedidos,
+           pc.updated_at as config_atualizada_em, {CATALOGO_EVENTO_SQL} as catalogo,
+           sp.id as sabor_id, sp.nome as sabor_nome, sp.tipo as sabor_tipo,
+           sp.preco_pedaco, t.total_pedacos
+    FROM eventos e
+    LEFT JOIN pizza_configs pc ON pc.evento_id = e.id
+    LEFT JOIN evento_sabores_totais t ON t.evento_id = e.id AND t.total_pedacos > 0
+    LEFT JOIN sabores_pizza sp ON sp.id = t.sabor_id AND sp.ativo = 1
+    WHERE e.id = :evento_id
+    ORDER BY t.total_pedacos DESC NULLS LAST, sp.nome
+"""
+
+_lock = threading.Lock()
+# {evento_id: {"chave": str, "versao_pedidos": int, "painel": dict, "validado_em": float}}
+_cache = {}
+
+
+def _montar_dashboard(evento, sabores_results) -> DashboardResponse:
+    """DashboardResponse a partir da linha do evento e das linhas de sabores da PAINEL_QUERY."""
+    total_participantes = int(evento["TOTAL_PARTICIPANTES"]) if evento["TOTAL_PARTICIPANTES"] else 0
+    total_pedidos = int(evento["TOTAL_PEDIDOS"]) if evento["TOTAL_PEDIDOS"] else 0
+    valor_total = float(evento["VALOR_TOTAL_PEDIDOS"]) if evento["VALOR_TOTAL_PEDIDOS"] else 0.0
+    
+    estatisticas_sabores = []
+    for sabor in sabores_results:
+        total_pedacos = int(sabor["TOTAL_PEDACOS"])
+        pizzas_completas = total_pedacos // 8  # Cada pizza tem 8 pedaços
+        pedacos_restantes = total_pedacos % 8
+        preco_pedaco = float(sabor["PRECO_PEDACO"])
+        valor_total_sabor = total_pedacos * preco_pedaco
+        
+        estatisticas_sabores.append(
+            EstatisticasPizza(
+                sabor_id=sabor["SABOR_ID"],
+                sabor_nome=sabor["SABOR_NOME"],
+                sabor_tipo=sabor["SABOR_TIPO"],
+                total_pedacos=total_pedacos,
+                pizzas_completas=pizzas_completas,
+                pedacos_restantes=pedacos_restantes,
+                valor_total=valor_total_sabor
+            )
+        )
+    
+    return DashboardResponse(
+        evento_id=evento["ID"],
+        data_evento=evento["DATA_EVENTO"],
+        status=evento["STATUS"],
+        total_participantes=total_participantes,
+        total_pedidos=total_pedidos,
+        valor_total_evento=valor_total,
+        estatisticas_por_sabor=estatisticas_sabores
+    )
+
+
+def _montar_oportunidades(evento_id: int, sabores_results) -> dict:
+    """Sabores perto de fechar uma pizza inteira (mesmas linhas do dashboard)."""
+    oportunidades = []
+    
+    for sabor in sabores_results:
+        total_pedacos = int(sabor["TOTAL_PEDACOS"])
+        pedacos_restantes = total_pedacos % 8
+        
+        # CORRIGIDO: Ignorar meias completas (4 pedaços), pois elas devem ser combinadas em meio-a-meio
+        # Só mostra PEDAÇOS AVULSOS que realmente precisam completar (1-3 ou 5-7 pedaços)
+        if pedacos_restantes > 0 and pedacos_restantes != 4:
+            pedacos_para_completar = 8 - pedacos_restantes
+            
+            # Considerar oportunidade apenas se faltar 4 ou menos pedaços
+            # (pedaços_restantes 5, 6, 7 - faltam 3, 2, 1)
+            if pedacos_para_completar <= 4:
+                oportunidades.append({
+                    "sabor_id": sabor["SABOR_ID"],
+                    "sabor_nome": sabor["SABOR_NOME"],
+                    "sabor_tipo": sabor["SABOR_TIPO"],
+                    "total_pedacos_atual": total_pedacos,
+                    "pedacos_para_completar": pedacos_para_completar,
+                    "preco_por_pedaco": float(sabor["PRECO_PEDACO"]),
+                    "valor_para_completar": pedacos_para_completar * float(sabor["PRECO_PEDACO"]),
+                    "tipo": "inteira"  # Sempre "inteira" agora, pois meias já estão sendo combinadas
+                })
+    
+    # Ordenar por quantidade de pedaços necessários (menos pedaços primeiro)
+    oportunidades.sort(key=lambda x: x["pedacos_para_completar"])
+    
+    return {
+        "evento_id": evento_id,
+        "total_oportunidades": len(oportunidades),
+        "oportunidades": oportunidades,
+        "mensagem": "Aproveite para completar essas pizzas!" if oportunidades else "Nenhuma oportunidade disponível no momento"
+    }
+
+
+def _montar_agrupamento(evento_id: int, alocacao: dict) -> dict:
+    """Inteiras, meio a meio e pedaços avulsos a partir da alocação do evento."""
+    pizzas_inteiras = []
+    inteiras_por_sabor = {}
+    pizzas_meio_a_meio = []
+    pedacos_avulsos = []
+    
+    for pizza in alocacao["pizzas"]:
+        if pizza["is_meio_a_meio"]:
+            pizzas_meio_a_meio.append({
+                "tipo": "meio_a_meio",
+                "sabor1": pizza["flavor_name1"],
+                "sabor2": pizza["flavor_name2"],
+                "pedacos": pizza["slices_count"]
+            })
+        elif pizza["is_complete"]:
+            # Inteiras agrupadas por sabor (na ordem da alocação)
+            grupo = inteiras_por_sabor.get(pizza["flavor_name"])
+            if grupo is None:
+                grupo = {"tipo": "inteira", "sabor": pizza["flavor_name"], "quantidade": 0, "pedacos": 0}
+                inteiras_por_sabor[pizza["flavor_name"]] = grupo
+                pizzas_inteiras.append(grupo)
+            grupo["quantidade"] += 1
+            grupo["pedacos"] += 8
+        elif pizza["slices_count"] == 4:
+            # Meia que ficou sem par
+            pedacos_avulsos.append({
+                "sabor": pizza["flavor_name"],
+                "pedacos": 4,
+                "faltam": 4,
+                "tipo": "meia_esperando"
+            })
+        else:
+            pedacos_avulsos.append({
+                "sabor": pizza["flavor_name"],
+                "pedacos": pizza["slices_count"],
+                "faltam": 4 - pizza["slices_count"]
+            })
+    
+    total_pizzas_completas = sum(p["quantidade"] for p in pizzas_inteiras) + len(pizzas_meio_a_meio)
+    
+    return {
+        "evento_id": evento_id,
+        "total_pizzas_completas": total_pizzas_completas,
+        "pizzas_inteiras": pizzas_inteiras,
+        "pizzas_meio_a_meio": pizzas_meio_a_meio,
+        "pedacos_avulsos": pedacos_avulsos,
+        "resumo": f"{total_pizzas_completas} pizzas completas prontas para pedir!"
+    }
+
+
+def _montar(evento_id: int, linhas) -> dict:
+    evento = linhas[0]
+    sabores_results = [linha for linha in linhas if linha["SABOR_ID"] is not None]
+    alocacao = obter_alocacao_evento(evento_id)
+    return {
+        "dashboard": jsonable_encoder(_montar_dashboard(evento, sabores_results)),
+        "oportunidades": _montar_oportunidades(evento_id, sabores_results),
+        "agrupamento": _montar_agrupamento(evento_id, alocacao) if alocacao else None
+    }
+
+
+def obter_painel(evento_id: int, revalidar: bool = False):
+    """(versao_pedidos, painel) do evento, ou None se o evento não existe.
+
+    `revalidar` ignora a janela de validade (sempre consulta a versão).
+    """
+    agora = time.monotonic()
+    with _lock:
+        entrada = _cache.get(evento_id)
+    if entrada and not revalidar and agora - entrada["validado_em"] < VALIDADE_SEGUNDOS:
+        return entrada["versao_pedidos"], entrada["painel"]
+
+    linhas = execute_query(PAINEL_QUERY, {"evento_id": evento_id})
+    if not linhas:
+        with _lock:
+            _cache.pop(evento_id, None)
+        return None
+
+    evento = linhas[0]
+    chave = montar_versao(evento["VERSAO_PEDIDOS"], evento["CONFIG_ATUALIZADA_EM"], evento["CATALOGO"])
+    # Status/data do evento e preço/ativo dos sabores não mudam a versão da
+    # alocação: entram na chave também (linhas da própria PAINEL_QUERY)
+    sabores = [
+        (linha["SABOR_ID"], linha["SABOR_NOME"], linha["SABOR_TIPO"], str(linha["PRECO_PEDACO"]))
+        for linha in linhas if linha["SABOR_ID"] is not None
+    ]
+    chave = f"{chave}:{evento['STATUS']}:{evento['DATA_EVENTO']}:{sabores}"
+    if entrada and entrada["chave"] == chave:
+        painel = entrada["painel"]
+    else:
+        painel = _montar(evento_id, linhas)
+
+    with _lock:
+        _cache[evento_id] = {
+            "chave": chave,
+            "versao_pedidos": evento["VERSAO_PEDIDOS"],
+            "painel": painel,
+            "validado_em": agora
+        }
+    return evento["VERSAO_PEDIDOS"], painel
+
+
+def montar_painel(evento_id: int):
+    """Painel sempre conferido no banco (para o stream ao vivo, após uma mudança)."""
+    return obter_painel(evento_id, revalidar=True)
+
+
+def invalidar_painel(evento_id: int):
+    """Chamado após escritas de pedidos nesta instância."""
+    with _lock:
+        _cache.pop(evento_id, None)
+
+
+def invalidar_paineis():
+    """Chamado após escritas de sabores (preço, nome, ativo) nesta instância."""
+    with _lock:
+        _cache.clear()
@@ -0,0 +1,195 @@
+"""
+Relatórios de pagamento materializados por usuário (tabela relatorios_pagamento).
+
+Quando o admin libera os pagamentos de um evento, todos os participantes abrem o
+relatório ao mesmo tempo. Em vez de cada requisição montar pedido, itens e
+números de pizza, um job em background (disparado pelo toggle) gera o documento
+de todos os participantes em uma passada e o grava com a versão da alocação.
+
+O documento vale enquanto a versão da alocação do evento não muda. Uma edição
+de pedido pode renumerar pizzas de outros usuários, então o documento é
+regenerado na leitura (só para quem abrir) quando a versão não confere.
+Dados que mudam sem mexer na alocação (evento, status do pedido, nome do
+usuário) são sobrepostos na leitura.
+"""
+from fastapi.encoders import jsonable_encoder
+
+from database import execute_query, get_db_connection, parse_json_value
+from routes_pedidos import montar_pedido_response
+from alocacao_evento import (
+    obter_alocacao_evento, numeros_pizza_usuario, montar_versao, CATALOGO_EVENTO_SQL
+)
+
+REGRAS_PIZZADA = [
+    "AS PIZZAS DEVERÃO CHEGAR ENTRE 12:15 H E 12:45 H, SALVO ALGUM PROBLEMA DA FORNECEDORA",
+    "CADA UM DEVE PROVIDENCIAR SUA PRÓPRIA BEBIDA (NADA ALCOÓLICO, POR FAVOR)",
+    "SE QUISEREM, PODEM SE UTILIZAR DOS PRATOS PLÁSTICOS REUTILIZÁVEIS (AO FINAL DO EVENTO BASTA LAVAR E DEVOLVER NA PILHA)",
+    "TEMOS TAMBÉM TALHERES DESCARTÁVEIS, MAS ACONSELHO TRAZEREM SEUS PRÓPRIOS TALHERES DE METAL",
+    "PARA OS QUE PREFERIREM COMER SEM TALHERES, TEMOS ALGUMAS TAMPAS/CAIXAS JÁ CORTADAS PARA AUXILIÁ-LOS",
+    "AS PIZZAS FORAM NUMERADAS VISANDO A MELHOR LOCALIZAÇÃO, ENTÃO:",
+    "  O NÚMERO AO LADO ESQUERDO DO SEU NOME REFERE-SE AO NÚMERO DA PIZZA (LOCALIZAÇÃO)",
+    "  E O NÚMERO DO LADO DIREITO DO SABOR ESCOLHIDO É A QUANTIDADE DE PEDAÇOS QUE FOI SOLICITADO POR VOCÊ",
+    "A DISPOSIÇÃO DAS PIZZAS, NO ANDAR (LADO DA STI OU DA SGS), SEGUIU O CRITÉRIO DA QUANTIDADE DE PEDAÇOS DAS PESSOAS DO DEPARTAMENTO.",
+    "ASSIM QUE RETIRAR SEU RESPECTIVO PEDAÇO, RISQUE SEU NOME PARA QUE SAIBAMOS QUEM FALTA RETIRAR OS DEMAIS PEDAÇOS.",
+    "NÃO EXISTE PEDAÇO SEM DONO, ENTÃO RETIRE APENAS O SEU PEDAÇO."
+]
+
+NOME_RESPONSAVEL = "ROGERIO APARECIDO GOMES ARAUJO SANTOS"
+TAXA_ENTREGA = 1.00
+
+
+def _carregar_pedidos(evento_id: int, usuario_id: int = None):
+    """Pedidos do evento (ou só do usuário) com itens, uma linha por item."""
+    filtro_usuario = "AND p.usuario_id = :usuario_id" if usuario_id is not None else ""
+    query = f"""
+        SELECT p.id, p.evento_id, p.usuario_id, p.valor_total, p.valor_frete,
+               p.status, p.data_pedido, u.nome_completo, u.setor, u.setor_codigo,
+               ip.id as item_id, ip.sabor_id, sp.nome as sabor_nome,
+               ip.quantidade, ip.preco_unitario, ip.subtotal
+        FROM pedidos p
+        JOIN usuarios u ON p.usuario_id = u.id
+        LEFT JOIN itens_pedido ip ON ip.pedido_id = p.id
+        LEFT JOIN sabores_pizza sp ON ip.sabor_id = sp.id
+        WHERE p.evento_id = :evento_id {filtro_usuario}
+        ORDER BY p.id, ip.id
+    """
+    params = {"evento_id": evento_id}
+    if usuario_id is not None:
+        params["usuario_id"] = usuario_id
+    return execute_query(query, params)
+
+
+def _montar_documento(pedido_rows, alocacao) -> dict:
+    """Documento do relatório de um pedido (sem o evento, sobreposto na leitura)."""
+    p = pedido_rows[0]
+    itens_rows = [row for row in pedido_rows if row["ITEM_ID"]]
+    pedido = montar_pedido_response(
+        {
+            "id": p["ID"],
+            "evento_id": p["EVENTO_ID"],
+            "usuario_id": p["USUARIO_ID"],
+            "usuario_nome": p["NOME_COMPLETO"],
+            "usuario_setor": p["SETOR"],
+            "usuario_setor_codigo": p["SETOR_CODIGO"],
+            "valor_total": float(p["VALOR_TOTAL"]),
+            "valor_frete": float(p["VALOR_FRETE"]),
+            "status": p["STATUS"],
+            "data_pedido": p["DATA_PEDIDO"]
+        },
+        [
+            {
+                "sabor_id": row["SABOR_ID"],
+                "sabor_nome": row["SABOR_NOME"],
+                "quantidade": row["QUANTIDADE"],
+                "preco_unitario": float(row["PRECO_UNITARIO"]),
+                "subtotal": float(row["SUBTOTAL"])
+            }
+            for row in itens_rows
+        ],
+        [row["ITEM_ID"] for row in itens_rows]
+    )
+
+    # Adicionar pizza_numeros a cada item do pedido
+    numeros_pizza = numeros_pizza_usuario(alocacao, p["USUARIO_ID"])
+    pedido_dict = pedido.dict()
+    for item in pedido_dict["itens"]:
+        item["pizza_numeros"] = numeros_pizza.get(item["id"], [])
+
+    return jsonable_encoder({
+        "pedido": pedido_dict,
+        "regras": REGRAS_PIZZADA,
+        "nome_responsavel": NOME_RESPONSAVEL,
+        "taxa_entrega": TAXA_ENTREGA,
+        "qr_code_url": "/static/relatorios/qrcode.png",
+        "chef_esquerda_url": "/static/relatorios/lado_esquerdo.png",
+        "chef_direita_url": "/static/relatorios/lado_direito.png"
+    })
+
+
+def _salvar_documentos(evento_id: int, versao: str, documentos):
+    query = """
+        INSERT INTO relatorios_pagamento (evento_id, usuario_id, versao, documento, gerado_em)
+        VALUES (:evento_id, :usuario_id, :versao, :documento, CURRENT_TIMESTAMP)
+        ON CONFLICT (evento_id, usuario_id) DO UPDATE
+        SET versao = EXCLUDED.versao, documento = EXCLUDED.documento, gerado_em = EXCLUDED.gerado_em
+    """
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.executemany(query, [
+            {"evento_id": evento_id, "usuario_id": usuario_id, "versao": versao, "documento": documento}
+            for usuario_id, documento in documentos.items()
+        ])
+        conn.commit()
+        cursor.close()
+
+
+def gerar_documentos(evento_id: int, usuario_id: int = None) -> dict:
+    """Gera e grava os documentos do evento (ou de um usuário). Retorna {usuario_id: documento}."""
+    # Alocação antes dos pedidos: se um pedido mudar no meio, o documento fica com a
+    # versão antiga e é regenerado na próxima leitura (nunca o contrário)
+    alocacao = obter_alocacao_evento(evento_id)
+    if alocacao is None:
+        return {}
+
+    pedidos = {}
+    for row in _carregar_pedidos(evento_id, usuario_id):
+        pedidos.setdefault(row["ID"], []).append(row)
+
+    documentos = {
+        linhas[0]["USUARIO_ID"]: _montar_documento(linhas, alocacao)
+        for linhas in pedidos.values()
+    }
+    if documentos:
+        _salvar_documentos(evento_id, alocacao["versao"], documentos)
+    return documentos
+
+
+def gerar_relatorios_evento(evento_id: int):
+    """Job em background: gera o relatório de todos os participantes do evento."""
+    try:
+        documentos = gerar_documentos(evento_id)
+        print(f"[RELATORIOS] Evento {evento_id}: {len(documentos)} relatórios de pagamento gerados")
+    except Exception as e:
+        # Falha não é fatal: cada relatório é gerado na leitura se não estiver salvo
+        print(f"[RELATORIOS] Erro ao gerar relatórios do evento {evento_id} (ignorado): {e}")
+
+
+def obter_relatorio_usuario(evento_id: int, usuario_id: int):
+    """Relatório salvo do usuário, regenerado se a versão da alocação mudou.
+
+    Retorna (evento_row, documento): evento_row None se o evento não existe;
+    documento None se o usuário não tem pedido no evento. O chamador verifica
+    pagamento_liberado na linha do evento antes de usar o documento.
+    """
+    query = f"""
+        SELECT e.id, e.nome, e.data_evento, e.status, e.data_limite, e.data_criacao,
+               e.tipo, e.pagamento_liberado, e.versao_pedidos,
+               pc.updated_at as config_atualizada_em, {CATALOGO_EVENTO_SQL} as catalogo,
+               p.id as pedido_id, p.status as pedido_status,
+               u.nome_completo, u.setor, u.setor_codigo,
+               rp.versao as relatorio_versao, rp.documento
+        FROM eventos e
+        LEFT JOIN pizza_configs pc ON pc.evento_id = e.id
+        LEFT JOIN pedidos p ON p.evento_id = e.id AND p.usuario_id = :usuario_id
+        LEFT JOIN usuarios u ON u.id = p.usuario_id
+        LEFT JOIN relatorios_pagamento rp ON rp.evento_id = e.id AND rp.usuario_id = :usuario_id
+        WHERE e.id = :evento_id
+    """
+    row = execute_query(query, {"evento_id": evento_id, "usuario_id": usuario_id}, fetch_one=True)
+    if not row or not row["PAGAMENTO_LIBERADO"] or not row["PEDIDO_ID"]:
+        return row, None
+
+    versao = montar_versao(row["VERSAO_PEDIDOS"], row["CONFIG_ATUALIZADA_EM"], row["CATALOGO"])
+    if row["RELATORIO_VERSAO"] == versao and row["DOCUMENTO"] is not None:
+        documento = parse_json_value(row["DOCUMENTO"])
+    else:
+        documento = gerar_documentos(evento_id, usuario_id).get(usuario_id)
+        if documento is None:
+            return row, None
+
+    # Campos que mudam sem alterar a versão da alocação
+    documento["pedido"]["status"] = row["PEDIDO_STATUS"]
+    documento["pedido"]["usuario_nome"] = row["NOME_COMPLETO"]
+    documento["pedido"]["usuario_setor"] = row["SETOR"]
+    documento["pedido"]["usuario_setor_codigo"] = row["SETOR_CODIGO"]
+    return row, documento
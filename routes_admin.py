@@ -5,6 +5,8 @@ from datetime import datetime
 from auth import get_current_admin_user
 from database import execute_query, get_db_connection
 from models import UsuarioResponse
+from alocacao_evento import incrementar_versao_pedidos_usuario
+from setores import calcular_setor_codigo
 
 router = APIRouter(prefix="/admin", tags=["Administração e Auditoria"])
 
@@ -84,16 +86,20 @@ async def editar_usuario(
         cursor = conn.cursor()
         cursor.execute("""
             UPDATE usuarios 
-            SET setor = :setor, is_admin = :is_admin 
+            SET setor = :setor, setor_codigo = :setor_codigo, is_admin = :is_admin 
             WHERE id = :id
         """, {
             "setor": edit_data.setor,
+            "setor_codigo": calcular_setor_codigo(edit_data.setor),
             "is_admin": 1 if edit_data.is_admin else 0,
             "id": usuario_id
         })
         if cursor.rowcount == 0:
             conn.rollback()
             raise HTTPException(status_code=404, detail="Usuário não encontrado")
+        
+        # Setor entra no cálculo do lado (STI/SGS) das pizzas
+        incrementar_versao_pedidos_usuario(cursor, usuario_id)
             
         # Log audit
         cursor.execute("""
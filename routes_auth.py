@@ -18,6 +18,7 @@ from auth import (
     get_current_admin_user
 )
 from database import execute_query, get_db_connection
+from setores import calcular_setor_codigo
 from config import get_settings
 
 router = APIRouter(prefix="/auth", tags=["Autenticação"])
@@ -116,8 +117,8 @@ async def register(request: Request, user: UsuarioCreate):
     hashed_password = get_password_hash(user.senha)
     
     insert_query = """
-        INSERT INTO usuarios (nome_completo, email, senha_hash, setor, is_admin, ativo)
-        VALUES (:nome, :email, :senha, :setor, :admin, :ativo)
+        INSERT INTO usuarios (nome_completo, email, senha_hash, setor, setor_codigo, is_admin, ativo)
+        VALUES (:nome, :email, :senha, :setor, :setor_codigo, :admin, :ativo)
     """
     
     with get_db_connection() as conn:
@@ -129,6 +130,7 @@ async def register(request: Request, user: UsuarioCreate):
                 "email": user.email,
                 "senha": hashed_password,
                 "setor": user.setor,
+                "setor_codigo": calcular_setor_codigo(user.setor),
                 "admin": 0,
                 "ativo": 0  # Pendente - aguardando aprovação do admin
             }
@@ -1,10 +1,27 @@
 from fastapi import APIRouter, HTTPException, status, Depends
-from models import DashboardResponse, EstatisticasPizza
-from auth import get_current_user
-from database import execute_query
+from fastapi.responses import StreamingResponse
+from models import DashboardResponse
+from auth import get_current_user, get_current_admin_user
+from totais_evento import reconciliar_totais
+from painel_evento import obter_painel, montar_painel, invalidar_painel
+from dashboard_ao_vivo import abrir_painel, stream_painel
 
 router = APIRouter(prefix="/dashboard", tags=["Dashboard"])
 
+
+def _painel_ou_404(evento_id: int) -> dict:
+    """Painel do evento em cache (ver painel_evento): uma consulta serve os três endpoints."""
+    resultado = obter_painel(evento_id)
+    
+    if resultado is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Evento não encontrado"
+        )
+    
+    return resultado[1]
+
+
 @router.get("/evento/{evento_id}", response_model=DashboardResponse)
 async def obter_dashboard_evento(
     evento_id: int,
@@ -15,77 +32,7 @@ async def obter_dashboard_evento(
     Mostra agrupamento inteligente de pizzas
     """
     
-    # Buscar evento + estatísticas gerais em 1 query (merge de 2 queries)
-    combined_query = """
-        SELECT 
-            e.id, e.data_evento, e.status,
-            COUNT(DISTINCT p.usuario_id) as total_participantes,
-            COUNT(p.id) as total_pedidos,
-            COALESCE(SUM(p.valor_total + p.valor_frete), 0) as valor_total
-        FROM eventos e
-        LEFT JOIN pedidos p ON p.evento_id = e.id
-        WHERE e.id = :evento_id
-        GROUP BY e.id, e.data_evento, e.status
-    """
-    evento = execute_query(combined_query, {"evento_id": evento_id}, fetch_one=True)
-    
-    if not evento:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Evento não encontrado"
-        )
-    
-    total_participantes = int(evento["TOTAL_PARTICIPANTES"]) if evento["TOTAL_PARTICIPANTES"] else 0
-    total_pedidos = int(evento["TOTAL_PEDIDOS"]) if evento["TOTAL_PEDIDOS"] else 0
-    valor_total = float(evento["VALOR_TOTAL"]) if evento["VALOR_TOTAL"] else 0.0
-    
-    # Buscar estatísticas por sabor APENAS DESTE EVENTO (agrupamento inteligente)
-    sabores_query = """
-        SELECT 
-            sp.id as sabor_id,
-            sp.nome as sabor_nome,
-            COALESCE(SUM(ip.quantidade), 0) as total_pedacos,
-            sp.preco_pedaco
-        FROM sabores_pizza sp
-        INNER JOIN itens_pedido ip ON sp.id = ip.sabor_id
-        INNER JOIN pedidos p ON ip.pedido_id = p.id
-        WHERE sp.ativo = 1
-        AND p.evento_id = :evento_id
-        GROUP BY sp.id, sp.nome, sp.preco_pedaco
-        HAVING COALESCE(SUM(ip.quantidade), 0) > 0
-        ORDER BY total_pedacos DESC, sp.nome
-    """
-    
-    sabores_results = execute_query(sabores_query, {"evento_id": evento_id})
-    
-    estatisticas_sabores = []
-    for sabor in sabores_results:
-        total_pedacos = int(sabor["TOTAL_PEDACOS"])
-        pizzas_completas = total_pedacos // 8  # Cada pizza tem 8 pedaços
-        pedacos_restantes = total_pedacos % 8
-        preco_pedaco = float(sabor["PRECO_PEDACO"])
-        valor_total_sabor = total_pedacos * preco_pedaco
-        
-        estatisticas_sabores.append(
-            EstatisticasPizza(
-                sabor_id=sabor["SABOR_ID"],
-                sabor_nome=sabor["SABOR_NOME"],
-                total_pedacos=total_pedacos,
-                pizzas_completas=pizzas_completas,
-                pedacos_restantes=pedacos_restantes,
-                valor_total=valor_total_sabor
-            )
-        )
-    
-    return DashboardResponse(
-        evento_id=evento["ID"],
-        data_evento=evento["DATA_EVENTO"],
-        status=evento["STATUS"],
-        total_participantes=total_participantes,
-        total_pedidos=total_pedidos,
-        valor_total_evento=valor_total,
-        estatisticas_por_sabor=estatisticas_sabores
-    )
+    return _painel_ou_404(evento_id)["dashboard"]
 
 @router.get("/evento/{evento_id}/oportunidades")
 async def obter_oportunidades(
@@ -97,58 +44,18 @@ async def obter_oportunidades(
     Mostra sabores que estão próximos de fechar pizzas inteiras ou meias
     """
     
-    # Buscar estatísticas por sabor APENAS DESTE EVENTO
-    sabores_query = """
-        SELECT 
-            sp.id as sabor_id,
-            sp.nome as sabor_nome,
-            COALESCE(SUM(ip.quantidade), 0) as total_pedacos,
-            sp.preco_pedaco
-        FROM sabores_pizza sp
-        INNER JOIN itens_pedido ip ON sp.id = ip.sabor_id
-        INNER JOIN pedidos p ON ip.pedido_id = p.id
-        WHERE sp.ativo = 1
-        AND p.evento_id = :evento_id
-        GROUP BY sp.id, sp.nome, sp.preco_pedaco
-        HAVING COALESCE(SUM(ip.quantidade), 0) > 0
-        ORDER BY total_pedacos DESC
-    """
-    
-    sabores_results = execute_query(sabores_query, {"evento_id": evento_id})
+    resultado = obter_painel(evento_id)
     
-    oportunidades = []
+    if resultado is None:
+        # Evento inexistente: sem oportunidades (comportamento anterior)
+        return {
+            "evento_id": evento_id,
+            "total_oportunidades": 0,
+            "oportunidades": [],
+            "mensagem": "Nenhuma oportunidade disponível no momento"
+        }
     
-    for sabor in sabores_results:
-        total_pedacos = int(sabor["TOTAL_PEDACOS"])
-        pedacos_restantes = total_pedacos % 8
-        
-        # CORRIGIDO: Ignorar meias completas (4 pedaços), pois elas devem ser combinadas em meio-a-meio
-        # Só mostra PEDAÇOS AVULSOS que realmente precisam completar (1-3 ou 5-7 pedaços)
-        if pedacos_restantes > 0 and pedacos_restantes != 4:
-            pedacos_para_completar = 8 - pedacos_restantes
-            
-            # Considerar oportunidade apenas se faltar 4 ou menos pedaços
-            # (pedaços_restantes 5, 6, 7 - faltam 3, 2, 1)
-            if pedacos_para_completar <= 4:
-                oportunidades.append({
-                    "sabor_id": sabor["SABOR_ID"],
-                    "sabor_nome": sabor["SABOR_NOME"],
-                    "total_pedacos_atual": total_pedacos,
-                    "pedacos_para_completar": pedacos_para_completar,
-                    "preco_por_pedaco": float(sabor["PRECO_PEDACO"]),
-                    "valor_para_completar": pedacos_para_completar * float(sabor["PRECO_PEDACO"]),
-                    "tipo": "inteira"  # Sempre "inteira" agora, pois meias já estão sendo combinadas
-                })
-    
-    # Ordenar por quantidade de pedaços necessários (menos pedaços primeiro)
-    oportunidades.sort(key=lambda x: x["pedacos_para_completar"])
-    
-    return {
-        "evento_id": evento_id,
-        "total_oportunidades": len(oportunidades),
-        "oportunidades": oportunidades,
-        "mensagem": "Aproveite para completar essas pizzas!" if oportunidades else "Nenhuma oportunidade disponível no momento"
-    }
+    return resultado[1]["oportunidades"]
 
 @router.get("/evento/{evento_id}/agrupamento-inteligente")
 async def agrupar_pizzas_inteligente(
@@ -160,110 +67,63 @@ async def agrupar_pizzas_inteligente(
     - 8 pedaços = 1 pizza inteira
     - 4 pedaços = meia pizza (combina com outra meia)
     - Resto = pedaços avulsos esperando completar
-    """
     
-    # Buscar todos os sabores com pedidos APENAS DESTE EVENTO
-    # Buscar todos os sabores com pedidos APENAS DESTE EVENTO
-    query = """
-        SELECT 
-            sp.id as sabor_id,
-            sp.nome as sabor_nome,
-            sp.tipo as sabor_tipo,
-            COALESCE(SUM(ip.quantidade), 0) as total_pedacos
-        FROM sabores_pizza sp
-        INNER JOIN itens_pedido ip ON sp.id = ip.sabor_id
-        INNER JOIN pedidos p ON ip.pedido_id = p.id
-        WHERE sp.ativo = 1
-        AND p.evento_id = :evento_id
-        GROUP BY sp.id, sp.nome, sp.tipo
-        HAVING COALESCE(SUM(ip.quantidade), 0) > 0
-        ORDER BY total_pedacos DESC
+    Usa a mesma alocação do relatório de pagamento e do layout do admin
+    (ordem dos pedidos, overrides de pareamento), então todos enxergam as
+    mesmas pizzas.
     """
+    agrupamento = _painel_ou_404(evento_id)["agrupamento"]
     
-    sabores_results = execute_query(query, {"evento_id": evento_id})
+    if agrupamento is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Evento não encontrado"
+        )
     
-    def processar_lista_sabores(lista_sabores):
-        pizzas_inteiras = []
-        meias_pizzas = []
-        pedacos_avulsos = []
-        
-        for sabor in lista_sabores:
-            total = int(sabor["TOTAL_PEDACOS"])
-            nome = sabor["SABOR_NOME"]
-            
-            # Calcular inteiras
-            inteiras = total // 8
-            resto = total % 8
-            
-            if inteiras > 0:
-                pizzas_inteiras.append({
-                    "tipo": "inteira",
-                    "sabor": nome,
-                    "quantidade": inteiras,
-                    "pedacos": inteiras * 8
-                })
-            
-            # Calcular meias
-            meias = resto // 4
-            resto_final = resto % 4
-            
-            if meias > 0:
-                for _ in range(meias):
-                    meias_pizzas.append({
-                        "sabor": nome,
-                        "pedacos": 4
-                    })
-            
-            if resto_final > 0:
-                pedacos_avulsos.append({
-                    "sabor": nome,
-                    "pedacos": resto_final,
-                    "faltam": 4 - resto_final
-                })
-        
-        # Combinar meias pizzas
-        pizzas_meio_a_meio = []
-        i = 0
-        while i < len(meias_pizzas) - 1:
-            pizzas_meio_a_meio.append({
-                "tipo": "meio_a_meio",
-                "sabor1": meias_pizzas[i]["sabor"],
-                "sabor2": meias_pizzas[i+1]["sabor"],
-                "pedacos": 8
-            })
-            i += 2
-        
-        # Se sobrou uma meia sozinha
-        if len(meias_pizzas) % 2 == 1:
-            pedacos_avulsos.append({
-                "sabor": meias_pizzas[-1]["sabor"],
-                "pedacos": 4,
-                "faltam": 4,
-                "tipo": "meia_esperando"
-            })
-            
-        return pizzas_inteiras, pizzas_meio_a_meio, pedacos_avulsos
+    return agrupamento
 
-    # Separar sabores por tipo
-    sabores_salgados = [s for s in sabores_results if s.get("SABOR_TIPO", "SALGADA") != "DOCE"]
-    sabores_doces = [s for s in sabores_results if s.get("SABOR_TIPO") == "DOCE"]
+@router.get("/evento/{evento_id}/stream")
+async def stream_dashboard_evento(
+    evento_id: int,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Dashboard ao vivo via Server-Sent Events
     
-    # Processar cada grupo separadamente
-    inteiras_salg, meio_salg, avulsos_salg = processar_lista_sabores(sabores_salgados)
-    inteiras_doces, meio_doces, avulsos_doces = processar_lista_sabores(sabores_doces)
+    Envia um evento "snapshot" com dashboard, oportunidades e agrupamento, e
+    depois um evento "delta" a cada mudança nos pedidos (totais e sabores
+    alterados, pizzas novas, oportunidades novas/encerradas). O cálculo é feito
+    uma vez por mudança e compartilhado por todos os clientes do evento.
+    """
+    painel = await abrir_painel(evento_id, montar_painel)
     
-    # Combinar resultados
-    pizzas_inteiras = inteiras_salg + inteiras_doces
-    pizzas_meio_a_meio = meio_salg + meio_doces
-    pedacos_avulsos = avulsos_salg + avulsos_doces
+    if painel is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Evento não encontrado"
+        )
     
-    total_pizzas_completas = sum(p["quantidade"] for p in pizzas_inteiras) + len(pizzas_meio_a_meio)
+    return StreamingResponse(
+        stream_painel(painel),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/evento/{evento_id}/reconciliar-totais")
+async def reconciliar_totais_evento_admin(
+    evento_id: int,
+    current_user: dict = Depends(get_current_admin_user)
+):
+    """
+    Recalcula os totais do dashboard a partir dos pedidos (apenas admin)
+    Corrige desvios dos contadores mantidos pelas escritas de pedidos
+    """
+    corrigido = reconciliar_totais(evento_id) > 0
+    if corrigido:
+        invalidar_painel(evento_id)
     
     return {
         "evento_id": evento_id,
-        "total_pizzas_completas": total_pizzas_completas,
-        "pizzas_inteiras": pizzas_inteiras,
-        "pizzas_meio_a_meio": pizzas_meio_a_meio,
-        "pedacos_avulsos": pedacos_avulsos,
-        "resumo": f"{total_pizzas_completas} pizzas completas prontas para pedir!"
+        "corrigido": corrigido,
+        "message": "Totais corrigidos" if corrigido else "Totais já estavam corretos"
     }
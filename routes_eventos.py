@@ -1,9 +1,12 @@
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, status, Depends, BackgroundTasks
 from typing import List, Optional
 from datetime import datetime
 from models import EventoCreate, EventoCreateRequest, EventoUpdate, EventoResponse, ResumoEvento
 from auth import get_current_admin_user, get_current_user
 from database import execute_query, get_db_connection
+from eventos_ativos import listar_registro_eventos_ativos, invalidar_eventos_ativos
+from agendador import agendar_fechamento, cancelar_agendamento
+from relatorios_pagamento import gerar_relatorios_evento
 try:
     from zoneinfo import ZoneInfo
 except ImportError:
@@ -19,26 +22,6 @@ def get_now():
     """
     return datetime.now(ZoneInfo("America/Sao_Paulo")).replace(tzinfo=None)
 
-def verificar_e_fechar_eventos_expirados():
-    """
-    Verifica e fecha automaticamente eventos cuja data_limite já passou.
-    Retorna o número de eventos fechados.
-    """
-    query = """
-        UPDATE eventos
-        SET status = 'FECHADO'
-        WHERE status = 'ABERTO' AND data_limite < :current_time
-    """
-    
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute(query, {"current_time": get_now()})
-        rows_updated = cursor.rowcount
-        conn.commit()
-        cursor.close()
-    
-    return rows_updated
-
 def verificar_evento_aberto_existente(tipo='NORMAL'):
     """
     Verifica se já existe um evento aberto do tipo especificado.
@@ -108,32 +91,9 @@ async def listar_eventos_ativos(
 ):
     """Lista todos os eventos ativos (abertos) disponíveis para o usuário"""
     
-    # Fechar eventos expirados automaticamente
-    verificar_e_fechar_eventos_expirados()
-    
-    # Buscar eventos abertos
-    query = """
-        SELECT id, nome, data_evento, status, data_limite, data_criacao, tipo, pagamento_liberado
-        FROM eventos
-        WHERE status = 'ABERTO' AND data_limite > :current_time
-        ORDER BY data_evento ASC
-    """
-    
-    eventos = execute_query(query, {"current_time": get_now()})
-    
-    return [
-        EventoResponse(
-            id=evt["ID"],
-            nome=evt.get("NOME"),
-            data_evento=evt["DATA_EVENTO"],
-            status=evt["STATUS"],
-            data_limite=evt["DATA_LIMITE"],
-            data_criacao=evt.get("DATA_CRIACAO"),
-            tipo=evt.get("TIPO", "NORMAL"),
-            pagamento_liberado=bool(evt.get("PAGAMENTO_LIBERADO", 0))
-        )
-        for evt in eventos
-    ]
+    # Eventos abertos vêm do registro em memória (expiram na data_limite;
+    # o fechamento no banco é feito pelo agendador)
+    return [EventoResponse(**evt) for evt in listar_registro_eventos_ativos()]
 
 @router.get("/ativo", response_model=EventoResponse)
 async def obter_evento_ativo(
@@ -141,36 +101,16 @@ async def obter_evento_ativo(
 ):
     """Obtém o evento atualmente aberto para pedidos"""
     
-    # Fechar eventos expirados automaticamente
-    verificar_e_fechar_eventos_expirados()
-    
-    # Query com 'tipo'
-    query = """
-        SELECT id, data_evento, status, data_limite, data_criacao, tipo, pagamento_liberado
-        FROM eventos
-        WHERE status = 'ABERTO' 
-        AND data_limite > :current_time
-        ORDER BY data_evento ASC
-        FETCH FIRST 1 ROWS ONLY
-    """
-    
-    result = execute_query(query, {"current_time": get_now()}, fetch_one=True)
+    # Primeiro evento aberto (por data_evento) do registro em memória
+    eventos_ativos = listar_registro_eventos_ativos()
     
-    if not result:
+    if not eventos_ativos:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Não há evento ativo no momento"
         )
     
-    return EventoResponse(
-        id=result["ID"],
-        data_evento=result["DATA_EVENTO"],
-        status=result["STATUS"],
-        data_limite=result["DATA_LIMITE"],
-        data_criacao=result["DATA_CRIACAO"],
-        tipo=result["TIPO"],
-        pagamento_liberado=bool(result.get("PAGAMENTO_LIBERADO", 0))
-    )
+    return EventoResponse(**eventos_ativos[0])
 
 @router.get("/{evento_id}", response_model=EventoResponse)
 async def obter_evento(
@@ -278,6 +218,9 @@ async def criar_evento(
         result = cursor.fetchone()
         cursor.close()
     
+    invalidar_eventos_ativos()
+    agendar_fechamento(result[0], result[4], result[3])
+    
     return EventoResponse(
         id=result[0],
         nome=result[1],
@@ -293,12 +236,17 @@ async def criar_evento(
 async def atualizar_evento(
     evento_id: int,
     evento: EventoUpdate,
+    background_tasks: BackgroundTasks,
     current_user: dict = Depends(get_current_admin_user)
 ):
-    """Atualiza um evento (apenas admin)"""
+    """Atualiza um evento (apenas admin)
+    
+    Liberar o pagamento por aqui também gera os relatórios em background, como
+    no toggle-pagamento.
+    """
     
     # Verificar se evento existe e obter seus dados
-    check_query = "SELECT id FROM eventos WHERE id = :evento_id"
+    check_query = "SELECT id, pagamento_liberado FROM eventos WHERE id = :evento_id"
     existing = execute_query(check_query, {"evento_id": evento_id}, fetch_one=True)
     
     if not existing:
@@ -375,6 +323,12 @@ async def atualizar_evento(
         result = cursor.fetchone()
         cursor.close()
     
+    invalidar_eventos_ativos()
+    agendar_fechamento(result[0], result[3], result[2])
+    
+    if evento.pagamento_liberado and not existing["PAGAMENTO_LIBERADO"]:
+        background_tasks.add_task(gerar_relatorios_evento, evento_id)
+    
     return EventoResponse(
         id=result[0],
         data_evento=result[1],
@@ -475,15 +429,23 @@ async def deletar_evento(
         conn.commit()
         cursor.close()
     
+    invalidar_eventos_ativos()
+    cancelar_agendamento(evento_id)
+    
     return None
 
 
 @router.put("/{evento_id}/toggle-pagamento", response_model=EventoResponse)
 async def toggle_pagamento_evento(
     evento_id: int,
+    background_tasks: BackgroundTasks,
     current_user: dict = Depends(get_current_admin_user)
 ):
-    """Libera ou bloqueia pagamentos de um evento (apenas admin)"""
+    """Libera ou bloqueia pagamentos de um evento (apenas admin)
+    
+    Ao liberar, os relatórios de pagamento de todos os participantes são
+    gerados em background (ver relatorios_pagamento).
+    """
     
     # Buscar estado atual
     check_query = "SELECT pagamento_liberado FROM eventos WHERE id = :evento_id"
@@ -516,6 +478,11 @@ async def toggle_pagamento_evento(
         evt = cursor.fetchone()
         cursor.close()
     
+    invalidar_eventos_ativos()
+    
+    if novo_valor:
+        background_tasks.add_task(gerar_relatorios_evento, evento_id)
+    
     return EventoResponse(
         id=evt[0],
         data_evento=evt[1],
@@ -1,18 +1,30 @@
-from fastapi import APIRouter, HTTPException, status, Depends
-from typing import List
+from fastapi import APIRouter, HTTPException, status, Depends, Header
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
+from datetime import datetime
 from models import (
     PedidoCreate, PedidoResponse, PedidoUpdate,
     ItemPedidoResponse, DashboardResponse, EstatisticasPizza
 )
 from auth import get_current_user, get_current_admin_user
-from database import execute_query, get_db_connection
+from database import execute_query, get_db_connection, SAO_PAULO_TZ
 from routes_auth import compute_is_premium
+from catalogo_sabores import obter_catalogo, recarregar_catalogo_em_miss
+from eventos_ativos import buscar_evento_ativo, usuario_pode_participar, invalidar_eventos_ativos
+from agendador import fechar_vencidos_na_escrita
+from idempotencia import executar_idempotente
+from alocacao_evento import aplicar_delta_pedido
+from painel_evento import invalidar_painel
+from feed_pedidos import publicar_pedido, stream_feed
+from totais_evento import (
+    somar_pedacos_por_sabor, montar_upsert_sabores, registrar_novo_pedido, registrar_cancelamento
+)
 
 router = APIRouter(prefix="/pedidos", tags=["Pedidos"])
 
 
 def _validar_e_precificar_itens(itens):
-    """Valida e calcula preços de todos os itens em uma única query (evita N+1).
+    """Valida e calcula preços de todos os itens usando o catálogo em memória (sem query).
     
     Retorna (valor_total, itens_validados) ou levanta HTTPException.
     """
@@ -22,40 +34,32 @@ def _validar_e_precificar_itens(itens):
             detail="Pedido deve ter pelo menos 1 item"
         )
     
-    # Coletar IDs únicos
-    sabor_ids = list(set(item.sabor_id for item in itens))
-    
-    # Batch query: busca todos os sabores de uma vez
-    placeholders = ", ".join(f":sid{i}" for i in range(len(sabor_ids)))
-    params = {f"sid{i}": sid for i, sid in enumerate(sabor_ids)}
+    catalogo = obter_catalogo()
     
-    sabores_query = f"""
-        SELECT id, nome, preco_pedaco
-        FROM sabores_pizza
-        WHERE id IN ({placeholders}) AND ativo = 1
-    """
-    sabores_result = execute_query(sabores_query, params)
-    sabores_map = {s["ID"]: s for s in sabores_result}
+    # Sabor fora do cache pode ter sido criado por outra instância: recarrega uma vez
+    if any(item.sabor_id not in catalogo for item in itens):
+        catalogo = recarregar_catalogo_em_miss()
     
     # Validar e calcular
     valor_total = 0.0
     itens_validados = []
     
     for item in itens:
-        sabor = sabores_map.get(item.sabor_id)
-        if not sabor:
+        sabor = catalogo.get(item.sabor_id)
+        if not sabor or not sabor["ativo"]:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Sabor com ID {item.sabor_id} não encontrado ou inativo"
             )
         
-        preco_unitario = float(sabor["PRECO_PEDACO"])
+        preco_unitario = sabor["preco_pedaco"]
         subtotal = preco_unitario * item.quantidade
         valor_total += subtotal
         
         itens_validados.append({
             "sabor_id": item.sabor_id,
-            "sabor_nome": sabor["NOME"],
+            "sabor_nome": sabor["nome"],
+            "sabor_tipo": sabor["tipo"],
             "quantidade": item.quantidade,
             "preco_unitario": preco_unitario,
             "subtotal": subtotal
@@ -63,44 +67,371 @@ def _validar_e_precificar_itens(itens):
     
     return valor_total, itens_validados
 
+
+def _inserir_itens(cursor, pedido_id, itens_validados):
+    """Insere os itens validados do pedido e retorna os IDs gerados (na mesma ordem)."""
+    insert_item_query = """
+        INSERT INTO itens_pedido (pedido_id, sabor_id, quantidade, preco_unitario, subtotal)
+        VALUES (:pedido_id, :sabor_id, :quantidade, :preco_unitario, :subtotal)
+        RETURNING id
+    """
+    
+    item_ids = []
+    for item in itens_validados:
+        cursor.execute(
+            insert_item_query,
+            {
+                "pedido_id": pedido_id,
+                "sabor_id": item["sabor_id"],
+                "quantidade": item["quantidade"],
+                "preco_unitario": item["preco_unitario"],
+                "subtotal": item["subtotal"]
+            }
+        )
+        item_ids.append(cursor.fetchone()[0])
+    
+    return item_ids
+
+
+def _itens_para_alocacao(itens_validados, item_ids):
+    """Itens no formato esperado pelo motor de alocação de pizzas."""
+    return [
+        {
+            "item_id": item_id,
+            "sabor_id": item["sabor_id"],
+            "sabor_nome": item["sabor_nome"],
+            "sabor_tipo": item["sabor_tipo"],
+            "quantidade": item["quantidade"]
+        }
+        for item_id, item in zip(item_ids, itens_validados)
+    ]
+
+
+def montar_pedido_response(pedido: dict, itens_validados, item_ids) -> PedidoResponse:
+    """Monta o PedidoResponse com dados já em memória (linha RETURNING + itens validados).
+    
+    Evita reler pedido, itens e usuário via obter_pedido logo após uma escrita.
+    """
+    return PedidoResponse(
+        **pedido,
+        itens=[
+            ItemPedidoResponse(
+                id=item_id,
+                sabor_id=item["sabor_id"],
+                sabor_nome=item["sabor_nome"],
+                quantidade=item["quantidade"],
+                preco_unitario=item["preco_unitario"],
+                subtotal=item["subtotal"]
+            )
+            for item_id, item in zip(item_ids, itens_validados)
+        ]
+    )
+
+
+# Pedido + evento + usuário em uma query (os itens são relidos na transação da edição)
+EDICAO_CHECK_QUERY = """
+    SELECT p.id, p.usuario_id, p.evento_id, p.status, p.data_pedido,
+           e.status as evento_status, e.data_limite as evento_data_limite,
+           u.nome_completo, u.setor, u.setor_codigo
+    FROM pedidos p
+    JOIN eventos e ON p.evento_id = e.id
+    JOIN usuarios u ON p.usuario_id = u.id
+    WHERE p.id = :pedido_id
+"""
+
+
+def _publicar_mudanca(evento_id, versao_pedidos, tipo, pedido_id, pedido=None):
+    """Avisa os streams ao vivo (dashboard e feed do admin) de uma escrita já commitada."""
+    invalidar_painel(evento_id)
+    publicar_pedido(evento_id, tipo, pedido_id, versao_pedidos, pedido=pedido)
+
+
+def _evento_aberto(pedido) -> bool:
+    """Evento do pedido aberto e dentro da data_limite (linha com EVENTO_STATUS/EVENTO_DATA_LIMITE)."""
+    return (
+        pedido["EVENTO_STATUS"] == 'ABERTO'
+        and pedido["EVENTO_DATA_LIMITE"] > datetime.now(SAO_PAULO_TZ).replace(tzinfo=None)
+    )
+
+
+def _mesmo_valor(a, b) -> bool:
+    return round(float(a), 2) == round(float(b), 2)
+
+
+def _calcular_diff_itens(itens_atuais, itens_validados):
+    """Compara os itens gravados com os itens pedidos.
+
+    Itens do mesmo sabor são reaproveitados (primeiro os de quantidade e preço
+    idênticos, depois os demais, sempre em ordem de ID) para preservar IDs.
+
+    Retorna (item_ids, atualizar, inserir, remover):
+    - item_ids: ID final de cada item validado (None = será inserido)
+    - atualizar: [(item_id, item_validado)] com quantidade/preço alterados
+    - inserir: índices de itens_validados sem item gravado correspondente
+    - remover: IDs de itens gravados que não aparecem mais no pedido
+    """
+    disponiveis = {}
+    for atual in itens_atuais:
+        disponiveis.setdefault(atual["sabor_id"], []).append(atual)
+
+    item_ids = [None] * len(itens_validados)
+
+    # 1ª passada: itens idênticos (não geram escrita)
+    for i, item in enumerate(itens_validados):
+        candidatos = disponiveis.get(item["sabor_id"], [])
+        for pos, atual in enumerate(candidatos):
+            if (atual["quantidade"] == item["quantidade"]
+                    and _mesmo_valor(atual["preco_unitario"], item["preco_unitario"])):
+                item_ids[i] = candidatos.pop(pos)["id"]
+                break
+
+    # 2ª passada: mesmo sabor com quantidade/preço diferente vira UPDATE
+    atualizar = []
+    inserir = []
+    for i, item in enumerate(itens_validados):
+        if item_ids[i] is not None:
+            continue
+        candidatos = disponiveis.get(item["sabor_id"])
+        if candidatos:
+            item_ids[i] = candidatos.pop(0)["id"]
+            atualizar.append((item_ids[i], item))
+        else:
+            inserir.append(i)
+
+    remover = [atual["id"] for candidatos in disponiveis.values() for atual in candidatos]
+
+    return item_ids, atualizar, inserir, remover
+
+
+# Itens gravados do pedido, lidos dentro da transação da edição (trava o pedido)
+EDICAO_ITENS_QUERY = """
+    SELECT p.valor_total, p.valor_frete,
+           ip.id as item_id, ip.sabor_id, ip.quantidade, ip.preco_unitario
+    FROM pedidos p
+    LEFT JOIN itens_pedido ip ON ip.pedido_id = p.id
+    WHERE p.id = :pedido_id
+    ORDER BY ip.id
+    FOR UPDATE OF p
+"""
+
+
+def _travar_itens_pedido(cursor, evento_id, pedido_id):
+    """Trava evento e pedido (mesma ordem de criar/cancelar) e lê os itens gravados.
+
+    Retorna (valor_total, valor_frete, itens_atuais) ou None se o pedido não existe mais.
+    """
+    cursor.execute("SELECT id FROM eventos WHERE id = :evento_id FOR UPDATE", {"evento_id": evento_id})
+    cursor.execute(EDICAO_ITENS_QUERY, {"pedido_id": pedido_id})
+    linhas = cursor.fetchall()
+    if not linhas:
+        return None
+    itens_atuais = [
+        {"id": item_id, "sabor_id": sabor_id, "quantidade": quantidade, "preco_unitario": preco}
+        for _, _, item_id, sabor_id, quantidade, preco in linhas
+        if item_id is not None
+    ]
+    return linhas[0][0], linhas[0][1], itens_atuais
+
+
+def _montar_edicao(pedido_id, evento_id, gravado, itens_validados, valor_total, valor_frete):
+    """Statement da edição a partir dos itens gravados (resultado de _travar_itens_pedido).
+
+    Retorna (item_ids, statement, params, inserir); statement None se nada mudou.
+    """
+    valor_gravado, frete_gravado, itens_atuais = gravado
+    item_ids, atualizar, inserir, remover = _calcular_diff_itens(itens_atuais, itens_validados)
+
+    valores_iguais = (
+        _mesmo_valor(valor_gravado, valor_total)
+        and _mesmo_valor(frete_gravado, valor_frete)
+    )
+    if not (atualizar or inserir or remover) and valores_iguais:
+        return item_ids, None, None, inserir
+
+    params = {
+        "pedido_id": pedido_id,
+        "evento_id": evento_id,
+        "valor_total": valor_total,
+        "valor_frete": valor_frete
+    }
+    # Toda escrita em itens invalida a alocação de pizzas do evento (e mexe nos totais)
+    ctes = ["""versao_evento AS (
+            UPDATE eventos
+            SET versao_pedidos = versao_pedidos + 1,
+                valor_total_pedidos = valor_total_pedidos + CAST(:valor_total AS NUMERIC)
+                    + CAST(:valor_frete AS NUMERIC)
+                    - (SELECT valor_total + valor_frete FROM pedidos WHERE id = :pedido_id)
+            WHERE id = :evento_id
+            RETURNING versao_pedidos
+        )"""]
+
+    # Pedaços por sabor: novos menos gravados (referencia versao_evento para travar o evento antes)
+    deltas_sabores = somar_pedacos_por_sabor(itens_validados)
+    for sabor_id, quantidade in somar_pedacos_por_sabor(itens_atuais, -1).items():
+        deltas_sabores[sabor_id] = deltas_sabores.get(sabor_id, 0) + quantidade
+    upsert_sabores = montar_upsert_sabores(
+        deltas_sabores, params, "EXISTS (SELECT 1 FROM versao_evento)"
+    )
+    if upsert_sabores:
+        ctes.append(f"totais_sabores AS ({upsert_sabores})")
+
+    if remover:
+        placeholders = []
+        for n, item_id in enumerate(remover):
+            params[f"rem_{n}"] = item_id
+            placeholders.append(f":rem_{n}")
+        ctes.append(f"""removidos AS (
+            DELETE FROM itens_pedido
+            WHERE pedido_id = :pedido_id AND id IN ({', '.join(placeholders)})
+        )""")
+
+    if atualizar:
+        valores = []
+        for n, (item_id, item) in enumerate(atualizar):
+            params[f"upd_{n}_id"] = item_id
+            params[f"upd_{n}_qtd"] = item["quantidade"]
+            params[f"upd_{n}_preco"] = item["preco_unitario"]
+            params[f"upd_{n}_subtotal"] = item["subtotal"]
+            valores.append(
+                f"(CAST(:upd_{n}_id AS INTEGER), CAST(:upd_{n}_qtd AS INTEGER), "
+                f"CAST(:upd_{n}_preco AS NUMERIC), CAST(:upd_{n}_subtotal AS NUMERIC))"
+            )
+        ctes.append(f"""atualizados AS (
+            UPDATE itens_pedido ip
+            SET quantidade = v.quantidade, preco_unitario = v.preco_unitario, subtotal = v.subtotal
+            FROM (VALUES {', '.join(valores)}) AS v(id, quantidade, preco_unitario, subtotal)
+            WHERE ip.id = v.id AND ip.pedido_id = :pedido_id
+        )""")
+
+    atualizar_pedido = """
+        UPDATE pedidos SET valor_total = :valor_total, valor_frete = :valor_frete
+        WHERE id = :pedido_id
+    """
+
+    if inserir:
+        ctes.append(f"pedido_atualizado AS ({atualizar_pedido})")
+        valores = []
+        for n, i in enumerate(inserir):
+            item = itens_validados[i]
+            params[f"ins_{n}_sabor"] = item["sabor_id"]
+            params[f"ins_{n}_qtd"] = item["quantidade"]
+            params[f"ins_{n}_preco"] = item["preco_unitario"]
+            params[f"ins_{n}_subtotal"] = item["subtotal"]
+            valores.append(
+                f"(:pedido_id, :ins_{n}_sabor, :ins_{n}_qtd, :ins_{n}_preco, :ins_{n}_subtotal)"
+            )
+        principal = f"""
+            INSERT INTO itens_pedido (pedido_id, sabor_id, quantidade, preco_unitario, subtotal)
+            VALUES {', '.join(valores)}
+            RETURNING id, sabor_id, quantidade, (SELECT versao_pedidos FROM versao_evento)
+        """
+    else:
+        principal = atualizar_pedido + " RETURNING (SELECT versao_pedidos FROM versao_evento)"
+
+    statement = "WITH " + ",\n".join(ctes) + "\n" + principal
+    return item_ids, statement, params, inserir
+
+
+def _aplicar_edicao_pedido(pedido_id, pedido, itens_validados, valor_total, valor_frete):
+    """Aplica a edição de um pedido gravando apenas a diferença, em um único statement.
+
+    `pedido` é o resultado de EDICAO_CHECK_QUERY (dados do pedido para a alocação).
+    Os itens gravados são relidos na transação, com o pedido travado, para que
+    edições concorrentes do mesmo pedido não calculem a diferença sobre os mesmos
+    itens antigos. DELETE/UPDATE dos itens e o UPDATE do pedido vão como CTEs de
+    escrita e os INSERTs no statement principal (com RETURNING). Pedido sem
+    nenhuma alteração não gera escrita.
+    Retorna (item_ids, versao_pedidos): IDs finais dos itens, na ordem de
+    itens_validados, e a nova versão do evento (None se nada foi gravado).
+    """
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        gravado = _travar_itens_pedido(cursor, pedido["EVENTO_ID"], pedido_id)
+        if gravado is None:
+            conn.rollback()
+            cursor.close()
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Pedido não encontrado"
+            )
+
+        item_ids, statement, params, inserir = _montar_edicao(
+            pedido_id, pedido["EVENTO_ID"], gravado, itens_validados, valor_total, valor_frete
+        )
+        if statement is None:
+            conn.rollback()
+            cursor.close()
+            return item_ids, None
+
+        cursor.execute(statement, params)
+        linhas = cursor.fetchall()
+
+        # Nas duas formas a última coluna é a versão gerada pelo CTE versao_evento:
+        # sem linha ou sem versão, pedido/evento mudou desde a leitura
+        versao_pedidos = linhas[0][-1] if linhas else None
+        if versao_pedidos is None:
+            conn.rollback()
+            cursor.close()
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="O pedido foi alterado durante a edição, tente novamente"
+            )
+
+        if inserir:
+            # RETURNING não garante a ordem do VALUES: casa por (sabor, quantidade)
+            gerados = {}
+            for novo_id, sabor_id, quantidade, _ in linhas:
+                gerados.setdefault((sabor_id, quantidade), []).append(novo_id)
+            for i in inserir:
+                item = itens_validados[i]
+                item_ids[i] = gerados[(item["sabor_id"], item["quantidade"])].pop(0)
+
+        conn.commit()
+        cursor.close()
+
+    aplicar_delta_pedido(
+        pedido["EVENTO_ID"], versao_pedidos, pedido_id,
+        pedido["USUARIO_ID"], pedido["SETOR_CODIGO"], pedido["DATA_PEDIDO"],
+        _itens_para_alocacao(itens_validados, item_ids)
+    )
+
+    return item_ids, versao_pedidos
+
 @router.post("/", response_model=PedidoResponse, status_code=status.HTTP_201_CREATED)
 async def criar_pedido(
     pedido: PedidoCreate,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
-    """Cria um novo pedido para o usuário logado"""
+    """Cria um novo pedido para o usuário logado (aceita Idempotency-Key)"""
+    return await executar_idempotente(
+        idempotency_key,
+        current_user["id"],
+        "POST /pedidos/",
+        pedido.model_dump(mode="json"),
+        lambda: _criar_pedido(pedido, current_user)
+    )
+
+
+async def _criar_pedido(pedido: PedidoCreate, current_user: dict):
     
-    # Verificar se evento existe e está aberto
-    evento_query = """
-        SELECT id, status, data_limite, tipo
-        FROM eventos
-        WHERE id = :evento_id AND status = 'ABERTO'
-    """
-    evento = execute_query(evento_query, {"evento_id": pedido.evento_id}, fetch_one=True)
+    fechar_vencidos_na_escrita()
     
-    if not evento:
+    # Verificar se evento está aberto (registro em memória, expira na data_limite)
+    evento_ativo = buscar_evento_ativo(pedido.evento_id)
+    
+    if not evento_ativo:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Evento não encontrado ou não está aberto para pedidos"
         )
     
     # Verificar acesso se for evento relâmpago
-    tipo_evento = evento.get("TIPO", "NORMAL")
-    if tipo_evento == 'RELAMPAGO' and not current_user["is_admin"]:
-        access_query = """
-            SELECT 1 FROM evento_acessos 
-            WHERE evento_id = :evento_id AND usuario_id = :usuario_id
-        """
-        has_access = execute_query(
-            access_query, 
-            {"evento_id": pedido.evento_id, "usuario_id": current_user["id"]}, 
-            fetch_one=True
+    if not usuario_pode_participar(evento_ativo, current_user):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Você não tem permissão para participar deste evento relâmpago"
         )
-        if not has_access:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Você não tem permissão para participar deste evento relâmpago"
-            )
 
     # Verificar se usuário já tem pedido neste evento
     check_pedido = """
@@ -119,7 +450,7 @@ async def criar_pedido(
             detail="Você já tem um pedido neste evento. Edite ou cancele o pedido existente."
         )
     
-    # Buscar preços dos sabores e calcular total (batch - 1 query em vez de N)
+    # Validar sabores e calcular total (catálogo em memória, sem query)
     valor_total, itens_validados = _validar_e_precificar_itens(pedido.itens)
     
     valor_frete = 1.00
@@ -128,10 +459,27 @@ async def criar_pedido(
     with get_db_connection() as conn:
         cursor = conn.cursor()
         
-        # Inserir pedido
+        # Totais e versão do evento primeiro (trava o evento antes dos totais por sabor).
+        # O UPDATE confere status/data_limite: o banco decide, não o registro em memória
+        versao_pedidos = registrar_novo_pedido(
+            cursor, pedido.evento_id, current_user["id"], valor_total + valor_frete, itens_validados,
+            aberto_em=datetime.now(SAO_PAULO_TZ).replace(tzinfo=None)
+        )
+        if versao_pedidos is None:
+            conn.rollback()
+            cursor.close()
+            # Fechado/alterado/deletado em outra instância: o registro local está atrasado
+            invalidar_eventos_ativos()
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Evento não encontrado ou não está aberto para pedidos"
+            )
+        
+        # Inserir pedido (RETURNING evita o SELECT para descobrir o ID)
         insert_pedido_query = """
             INSERT INTO pedidos (evento_id, usuario_id, valor_total, valor_frete, status)
             VALUES (:evento_id, :usuario_id, :valor_total, :valor_frete, 'PENDENTE')
+            RETURNING id, status, data_pedido
         """
         cursor.execute(
             insert_pedido_query,
@@ -142,37 +490,40 @@ async def criar_pedido(
                 "valor_frete": valor_frete
             }
         )
-        
-        # Buscar ID do pedido criado
-        cursor.execute(
-            "SELECT id FROM pedidos WHERE evento_id = :evento_id AND usuario_id = :usuario_id",
-            {"evento_id": pedido.evento_id, "usuario_id": current_user["id"]}
-        )
-        pedido_id = cursor.fetchone()[0]
+        pedido_id, status_pedido, data_pedido = cursor.fetchone()
         
         # Inserir itens do pedido
-        insert_item_query = """
-            INSERT INTO itens_pedido (pedido_id, sabor_id, quantidade, preco_unitario, subtotal)
-            VALUES (:pedido_id, :sabor_id, :quantidade, :preco_unitario, :subtotal)
-        """
-        
-        for item in itens_validados:
-            cursor.execute(
-                insert_item_query,
-                {
-                    "pedido_id": pedido_id,
-                    "sabor_id": item["sabor_id"],
-                    "quantidade": item["quantidade"],
-                    "preco_unitario": item["preco_unitario"],
-                    "subtotal": item["subtotal"]
-                }
-            )
+        item_ids = _inserir_itens(cursor, pedido_id, itens_validados)
         
         conn.commit()
         cursor.close()
     
-    # Buscar pedido completo para retornar
-    return await obter_pedido(pedido_id, current_user)
+    aplicar_delta_pedido(
+        pedido.evento_id, versao_pedidos, pedido_id,
+        current_user["id"], current_user["setor_codigo"], data_pedido,
+        _itens_para_alocacao(itens_validados, item_ids)
+    )
+    
+    # Montar resposta com os dados já em memória (sem reler o pedido)
+    response = montar_pedido_response(
+        {
+            "id": pedido_id,
+            "evento_id": pedido.evento_id,
+            "usuario_id": current_user["id"],
+            "usuario_nome": current_user["nome_completo"],
+            "usuario_setor": current_user["setor"],
+            "usuario_setor_codigo": current_user["setor_codigo"],
+            "valor_total": valor_total,
+            "valor_frete": valor_frete,
+            "status": status_pedido,
+            "data_pedido": data_pedido
+        },
+        itens_validados,
+        item_ids
+    )
+    _publicar_mudanca(pedido.evento_id, versao_pedidos, "criado", pedido_id, response)
+    
+    return response
 
 @router.get("/meus-pedidos", response_model=List[PedidoResponse])
 async def listar_meus_pedidos(
@@ -183,7 +534,7 @@ async def listar_meus_pedidos(
     # Single JOIN query instead of N+1
     query = """
         SELECT p.id, p.evento_id, p.usuario_id, p.valor_total, p.valor_frete,
-               p.status, p.data_pedido, u.nome_completo, u.setor,
+               p.status, p.data_pedido, u.nome_completo, u.setor, u.setor_codigo,
                ip.id as item_id, ip.sabor_id, sp.nome as sabor_nome,
                ip.quantidade, ip.preco_unitario, ip.subtotal
         FROM pedidos p
@@ -219,6 +570,7 @@ async def listar_meus_pedidos(
             usuario_id=uid,
             usuario_nome=p["NOME_COMPLETO"],
             usuario_setor=p["SETOR"],
+            usuario_setor_codigo=p["SETOR_CODIGO"],
             is_premium=False,
             valor_total=float(p["VALOR_TOTAL"]),
             valor_frete=float(p["VALOR_FRETE"]),
@@ -444,7 +796,7 @@ async def obter_pedido(
     # Buscar pedido
     pedido_query = """
         SELECT p.id, p.evento_id, p.usuario_id, p.valor_total, p.valor_frete, 
-               p.status, p.data_pedido, u.nome_completo, u.setor
+               p.status, p.data_pedido, u.nome_completo, u.setor, u.setor_codigo
         FROM pedidos p
         JOIN usuarios u ON p.usuario_id = u.id
         WHERE p.id = :pedido_id
@@ -482,6 +834,7 @@ async def obter_pedido(
         usuario_id=pedido["USUARIO_ID"],
         usuario_nome=pedido["NOME_COMPLETO"],
         usuario_setor=pedido["SETOR"],
+        usuario_setor_codigo=pedido["SETOR_CODIGO"],
         valor_total=float(pedido["VALOR_TOTAL"]),
         valor_frete=float(pedido["VALOR_FRETE"]),
         status=pedido["STATUS"],
@@ -499,17 +852,13 @@ async def obter_pedido(
         ]
     )
 
-@router.get("/evento/{evento_id}/todos", response_model=List[PedidoResponse])
-async def listar_pedidos_evento(
-    evento_id: int,
-    current_user: dict = Depends(get_current_admin_user)
-):
-    """Lista todos os pedidos de um evento (apenas admin)"""
+def _carregar_pedidos_evento(evento_id: int) -> List[PedidoResponse]:
+    """Pedidos do evento (mais recentes primeiro), usados na listagem e no snapshot do feed"""
     
     # Single JOIN query instead of N+1 (was: 2 queries per pedido = 80+ queries for 40 pedidos)
     query = """
         SELECT p.id, p.evento_id, p.usuario_id, p.valor_total, p.valor_frete,
-               p.status, p.data_pedido, u.nome_completo, u.setor,
+               p.status, p.data_pedido, u.nome_completo, u.setor, u.setor_codigo,
                ip.id as item_id, ip.sabor_id, sp.nome as sabor_nome,
                ip.quantidade, ip.preco_unitario, ip.subtotal
         FROM pedidos p
@@ -545,6 +894,7 @@ async def listar_pedidos_evento(
             usuario_id=uid,
             usuario_nome=p["NOME_COMPLETO"],
             usuario_setor=p["SETOR"],
+            usuario_setor_codigo=p["SETOR_CODIGO"],
             is_premium=False,
             valor_total=float(p["VALOR_TOTAL"]),
             valor_frete=float(p["VALOR_FRETE"]),
@@ -565,6 +915,45 @@ async def listar_pedidos_evento(
     
     return pedidos
 
+@router.get("/evento/{evento_id}/todos", response_model=List[PedidoResponse])
+async def listar_pedidos_evento(
+    evento_id: int,
+    current_user: dict = Depends(get_current_admin_user)
+):
+    """Lista todos os pedidos de um evento (apenas admin)"""
+    return _carregar_pedidos_evento(evento_id)
+
+@router.get("/evento/{evento_id}/stream")
+async def stream_pedidos_evento(
+    evento_id: int,
+    current_user: dict = Depends(get_current_admin_user)
+):
+    """
+    Feed ao vivo dos pedidos do evento via Server-Sent Events (apenas admin)
+    
+    Envia um evento "snapshot" com todos os pedidos (mesmo formato de
+    /evento/{evento_id}/todos) e depois um evento por mudança: "criado" e
+    "editado" (com o pedido completo), "cancelado" e "status" (pedido_id e
+    novo status). Se o cliente ficar para trás, recebe um novo "snapshot".
+    """
+    evento = execute_query(
+        "SELECT id FROM eventos WHERE id = :evento_id",
+        {"evento_id": evento_id},
+        fetch_one=True
+    )
+    
+    if not evento:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Evento não encontrado"
+        )
+    
+    return StreamingResponse(
+        stream_feed(evento_id, _carregar_pedidos_evento),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.put("/{pedido_id}", response_model=PedidoResponse)
 async def atualizar_pedido(
     pedido_id: int,
@@ -574,7 +963,7 @@ async def atualizar_pedido(
     """Atualiza status de um pedido (apenas admin)"""
     
     # Verificar se pedido existe
-    check_query = "SELECT id FROM pedidos WHERE id = :pedido_id"
+    check_query = "SELECT id, evento_id FROM pedidos WHERE id = :pedido_id"
     existing = execute_query(check_query, {"pedido_id": pedido_id}, fetch_one=True)
     
     if not existing:
@@ -596,25 +985,34 @@ async def atualizar_pedido(
         commit=True
     )
     
+    # Status não mexe em itens/totais: só o feed do admin precisa saber
+    publicar_pedido(existing["EVENTO_ID"], "status", pedido_id, status=pedido_update.status)
+    
     return await obter_pedido(pedido_id, current_user)
 
 @router.put("/{pedido_id}/editar", response_model=PedidoResponse)
 async def editar_meu_pedido(
     pedido_id: int,
     pedido_novo: PedidoCreate,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
-    """Permite usuário editar seu próprio pedido"""
+    """Permite usuário editar seu próprio pedido (aceita Idempotency-Key)"""
+    return await executar_idempotente(
+        idempotency_key,
+        current_user["id"],
+        f"PUT /pedidos/{pedido_id}/editar",
+        pedido_novo.model_dump(mode="json"),
+        lambda: _editar_meu_pedido(pedido_id, pedido_novo, current_user)
+    )
+
+
+async def _editar_meu_pedido(pedido_id: int, pedido_novo: PedidoCreate, current_user: dict):
     
-    # Verificar se pedido existe e pertence ao usuário
-    check_query = """
-        SELECT p.id, p.usuario_id, e.status as evento_status
-        FROM pedidos p
-        JOIN eventos e ON p.evento_id = e.id
-        WHERE p.id = :pedido_id
-    """
+    fechar_vencidos_na_escrita()
     
-    pedido = execute_query(check_query, {"pedido_id": pedido_id}, fetch_one=True)
+    # Verificar se pedido existe e pertence ao usuário
+    pedido = execute_query(EDICAO_CHECK_QUERY, {"pedido_id": pedido_id}, fetch_one=True)
     
     if not pedido:
         raise HTTPException(
@@ -629,54 +1027,44 @@ async def editar_meu_pedido(
             detail="Você não tem permissão para editar este pedido"
         )
     
-    # Verificar se evento ainda está aberto
-    if pedido["EVENTO_STATUS"] != 'ABERTO':
+    # Verificar se evento ainda está aberto (data_limite vale antes do agendador fechar)
+    if not _evento_aberto(pedido):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Não é possível editar pedido de evento que não está mais aberto"
         )
     
     # Atualizar pedido IN-PLACE (preserva data_pedido original!)
-    # Buscar preços dos sabores e calcular total (batch - 1 query em vez de N)
+    # Validar sabores e calcular total (catálogo em memória, sem query)
     valor_total, itens_validados = _validar_e_precificar_itens(pedido_novo.itens)
     
     valor_frete = 1.00
     
-    # Deletar itens antigos e atualizar pedido (sem deletar o pedido!)
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        
-        # Deletar itens antigos
-        cursor.execute("DELETE FROM itens_pedido WHERE pedido_id = :pedido_id", {"pedido_id": pedido_id})
-        
-        # Atualizar valor do pedido (preserva data_pedido e ID original)
-        cursor.execute(
-            "UPDATE pedidos SET valor_total = :valor_total, valor_frete = :valor_frete WHERE id = :pedido_id",
-            {"valor_total": valor_total, "valor_frete": valor_frete, "pedido_id": pedido_id}
-        )
-        
-        # Inserir novos itens
-        insert_item_query = """
-            INSERT INTO itens_pedido (pedido_id, sabor_id, quantidade, preco_unitario, subtotal)
-            VALUES (:pedido_id, :sabor_id, :quantidade, :preco_unitario, :subtotal)
-        """
-        
-        for item in itens_validados:
-            cursor.execute(
-                insert_item_query,
-                {
-                    "pedido_id": pedido_id,
-                    "sabor_id": item["sabor_id"],
-                    "quantidade": item["quantidade"],
-                    "preco_unitario": item["preco_unitario"],
-                    "subtotal": item["subtotal"]
-                }
-            )
-        
-        conn.commit()
-        cursor.close()
+    # Gravar só a diferença (preserva data_pedido, ID do pedido e IDs dos itens mantidos)
+    item_ids, versao_pedidos = _aplicar_edicao_pedido(
+        pedido_id, pedido, itens_validados, valor_total, valor_frete
+    )
     
-    return await obter_pedido(pedido_id, current_user)
+    response = montar_pedido_response(
+        {
+            "id": pedido_id,
+            "evento_id": pedido["EVENTO_ID"],
+            "usuario_id": pedido["USUARIO_ID"],
+            "usuario_nome": pedido["NOME_COMPLETO"],
+            "usuario_setor": pedido["SETOR"],
+            "usuario_setor_codigo": pedido["SETOR_CODIGO"],
+            "valor_total": valor_total,
+            "valor_frete": valor_frete,
+            "status": pedido["STATUS"],
+            "data_pedido": pedido["DATA_PEDIDO"]
+        },
+        itens_validados,
+        item_ids
+    )
+    if versao_pedidos is not None:
+        _publicar_mudanca(pedido["EVENTO_ID"], versao_pedidos, "editado", pedido_id, response)
+    
+    return response
 
 @router.put("/{pedido_id}/admin-editar", response_model=PedidoResponse)
 async def admin_editar_pedido(
@@ -687,14 +1075,7 @@ async def admin_editar_pedido(
     """Permite ADMIN editar qualquer pedido (de qualquer usuário)"""
     
     # Verificar se pedido existe
-    check_query = """
-        SELECT p.id, p.usuario_id, e.status as evento_status, p.evento_id
-        FROM pedidos p
-        JOIN eventos e ON p.evento_id = e.id
-        WHERE p.id = :pedido_id
-    """
-    
-    pedido = execute_query(check_query, {"pedido_id": pedido_id}, fetch_one=True)
+    pedido = execute_query(EDICAO_CHECK_QUERY, {"pedido_id": pedido_id}, fetch_one=True)
     
     if not pedido:
         raise HTTPException(
@@ -707,46 +1088,36 @@ async def admin_editar_pedido(
     
     # Admin pode editar mesmo se evento estiver FECHADO
     
-    # Buscar preços dos sabores e calcular total (batch - 1 query em vez de N)
+    # Validar sabores e calcular total (catálogo em memória, sem query)
     valor_total, itens_validados = _validar_e_precificar_itens(pedido_novo.itens)
     
     valor_frete = 1.00
     
-    # Deletar itens antigos e atualizar pedido
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        
-        # Deletar itens antigos
-        cursor.execute("DELETE FROM itens_pedido WHERE pedido_id = :pedido_id", {"pedido_id": pedido_id})
-        
-        # Atualizar valor do pedido
-        cursor.execute(
-            "UPDATE pedidos SET valor_total = :valor_total, valor_frete = :valor_frete WHERE id = :pedido_id",
-            {"valor_total": valor_total, "valor_frete": valor_frete, "pedido_id": pedido_id}
-        )
-        
-        # Inserir novos itens
-        insert_item_query = """
-            INSERT INTO itens_pedido (pedido_id, sabor_id, quantidade, preco_unitario, subtotal)
-            VALUES (:pedido_id, :sabor_id, :quantidade, :preco_unitario, :subtotal)
-        """
-        
-        for item in itens_validados:
-            cursor.execute(
-                insert_item_query,
-                {
-                    "pedido_id": pedido_id,
-                    "sabor_id": item["sabor_id"],
-                    "quantidade": item["quantidade"],
-                    "preco_unitario": item["preco_unitario"],
-                    "subtotal": item["subtotal"]
-                }
-            )
-        
-        conn.commit()
-        cursor.close()
+    # Gravar só a diferença
+    item_ids, versao_pedidos = _aplicar_edicao_pedido(
+        pedido_id, pedido, itens_validados, valor_total, valor_frete
+    )
     
-    return await obter_pedido(pedido_id, current_user)
+    response = montar_pedido_response(
+        {
+            "id": pedido_id,
+            "evento_id": pedido["EVENTO_ID"],
+            "usuario_id": pedido["USUARIO_ID"],
+            "usuario_nome": pedido["NOME_COMPLETO"],
+            "usuario_setor": pedido["SETOR"],
+            "usuario_setor_codigo": pedido["SETOR_CODIGO"],
+            "valor_total": valor_total,
+            "valor_frete": valor_frete,
+            "status": pedido["STATUS"],
+            "data_pedido": pedido["DATA_PEDIDO"]
+        },
+        itens_validados,
+        item_ids
+    )
+    if versao_pedidos is not None:
+        _publicar_mudanca(pedido["EVENTO_ID"], versao_pedidos, "editado", pedido_id, response)
+    
+    return response
 
 @router.post("/admin-criar", response_model=PedidoResponse, status_code=status.HTTP_201_CREATED)
 async def admin_criar_pedido(
@@ -777,7 +1148,7 @@ async def admin_criar_pedido(
     
     # Verificar se usuário existe
     usuario_query = """
-        SELECT id, nome_completo FROM usuarios WHERE id = :usuario_id AND ativo = 1
+        SELECT id, nome_completo, setor, setor_codigo FROM usuarios WHERE id = :usuario_id AND ativo = 1
     """
     usuario = execute_query(usuario_query, {"usuario_id": usuario_id}, fetch_one=True)
     
@@ -804,7 +1175,7 @@ async def admin_criar_pedido(
             detail="Este usuário já tem um pedido neste evento"
         )
     
-    # Buscar preços dos sabores e calcular total (batch - 1 query em vez de N)
+    # Validar sabores e calcular total (catálogo em memória, sem query)
     valor_total, itens_validados = _validar_e_precificar_itens(pedido.itens)
     
     valor_frete = 1.00
@@ -813,10 +1184,16 @@ async def admin_criar_pedido(
     with get_db_connection() as conn:
         cursor = conn.cursor()
         
+        # Totais e versão do evento primeiro (trava o evento antes dos totais por sabor)
+        versao_pedidos = registrar_novo_pedido(
+            cursor, pedido.evento_id, usuario_id, valor_total + valor_frete, itens_validados
+        )
+        
         # Inserir pedido para o usuário especificado
         insert_pedido_query = """
             INSERT INTO pedidos (evento_id, usuario_id, valor_total, valor_frete, status)
             VALUES (:evento_id, :usuario_id, :valor_total, :valor_frete, 'PENDENTE')
+            RETURNING id, status, data_pedido
         """
         cursor.execute(
             insert_pedido_query,
@@ -827,37 +1204,40 @@ async def admin_criar_pedido(
                 "valor_frete": valor_frete
             }
         )
-        
-        # Buscar ID do pedido criado
-        cursor.execute(
-            "SELECT id FROM pedidos WHERE evento_id = :evento_id AND usuario_id = :usuario_id ORDER BY data_pedido DESC FETCH FIRST 1 ROWS ONLY",
-            {"evento_id": pedido.evento_id, "usuario_id": usuario_id}
-        )
-        pedido_id = cursor.fetchone()[0]
+        pedido_id, status_pedido, data_pedido = cursor.fetchone()
         
         # Inserir itens do pedido
-        insert_item_query = """
-            INSERT INTO itens_pedido (pedido_id, sabor_id, quantidade, preco_unitario, subtotal)
-            VALUES (:pedido_id, :sabor_id, :quantidade, :preco_unitario, :subtotal)
-        """
-        
-        for item in itens_validados:
-            cursor.execute(
-                insert_item_query,
-                {
-                    "pedido_id": pedido_id,
-                    "sabor_id": item["sabor_id"],
-                    "quantidade": item["quantidade"],
-                    "preco_unitario": item["preco_unitario"],
-                    "subtotal": item["subtotal"]
-                }
-            )
+        item_ids = _inserir_itens(cursor, pedido_id, itens_validados)
         
         conn.commit()
         cursor.close()
     
-    # Buscar pedido completo para retornar
-    return await obter_pedido(pedido_id, current_user)
+    aplicar_delta_pedido(
+        pedido.evento_id, versao_pedidos, pedido_id,
+        usuario_id, usuario["SETOR_CODIGO"], data_pedido,
+        _itens_para_alocacao(itens_validados, item_ids)
+    )
+    
+    # Montar resposta com os dados já em memória (sem reler o pedido)
+    response = montar_pedido_response(
+        {
+            "id": pedido_id,
+            "evento_id": pedido.evento_id,
+            "usuario_id": usuario_id,
+            "usuario_nome": usuario["NOME_COMPLETO"],
+            "usuario_setor": usuario["SETOR"],
+            "usuario_setor_codigo": usuario["SETOR_CODIGO"],
+            "valor_total": valor_total,
+            "valor_frete": valor_frete,
+            "status": status_pedido,
+            "data_pedido": data_pedido
+        },
+        itens_validados,
+        item_ids
+    )
+    _publicar_mudanca(pedido.evento_id, versao_pedidos, "criado", pedido_id, response)
+    
+    return response
 
 @router.delete("/{pedido_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def cancelar_pedido(
@@ -866,9 +1246,12 @@ async def cancelar_pedido(
 ):
     """Cancela um pedido (usuário pode cancelar apenas o próprio)"""
     
+    fechar_vencidos_na_escrita()
+    
     # Verificar se pedido existe e pertence ao usuário
     check_query = """
-        SELECT p.id, p.usuario_id, e.status as evento_status
+        SELECT p.id, p.usuario_id, e.status as evento_status,
+               e.data_limite as evento_data_limite
         FROM pedidos p
         JOIN eventos e ON p.evento_id = e.id
         WHERE p.id = :pedido_id
@@ -889,20 +1272,23 @@ async def cancelar_pedido(
             detail="Você não tem permissão para cancelar este pedido"
         )
     
-    # Verificar se evento ainda está aberto
-    if pedido["EVENTO_STATUS"] != 'ABERTO':
+    # Verificar se evento ainda está aberto (data_limite vale antes do agendador fechar)
+    if not _evento_aberto(pedido):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Não é possível cancelar pedido de evento que não está mais aberto"
         )
     
-    # Deletar pedido (cascade deleta os itens)
-    delete_query = "DELETE FROM pedidos WHERE id = :pedido_id"
-    
+    # Deletar pedido e itens, descontando dos totais do evento
     with get_db_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute(delete_query, {"pedido_id": pedido_id})
+        removido = registrar_cancelamento(cursor, pedido_id)
         conn.commit()
         cursor.close()
     
+    if removido:
+        evento_id, versao_pedidos = removido
+        aplicar_delta_pedido(evento_id, versao_pedidos, pedido_id)
+        _publicar_mudanca(evento_id, versao_pedidos, "cancelado", pedido_id)
+    
     return None
@@ -1,35 +1,169 @@
-from fastapi import APIRouter, HTTPException, status, Depends
-import json
-from typing import Dict, Optional
+from fastapi import APIRouter, HTTPException, status, Depends, Header
+from fastapi.responses import JSONResponse, Response
+from typing import Dict, List, Optional
 from pydantic import BaseModel
 from auth import get_current_admin_user
-from database import execute_query, get_db_connection
+from database import execute_query, get_db_connection, parse_json_value
+from alocacao_evento import (
+    versao_alocacao, obter_alocacao_evento, simular_alocacao, diferenca_alocacoes
+)
 
 router = APIRouter(prefix="/pizza-config", tags=["Pizza Config"])
 
 
-def parse_json_value(value):
-    if value is None:
-        return {}
-    if hasattr(value, "read"):
-        value = value.read()
-    if isinstance(value, dict):
-        return value
-    if isinstance(value, str) and value:
-        return json.loads(value)
-    return {}
-
 class PizzaConfigUpdate(BaseModel):
     """Configurações de pizza para um evento"""
     pairing_overrides: Dict[str, str] = {}  # { halfId1: halfId2 }
     sector_overrides: Dict[str, str] = {}   # { pizzaId: 'STI' | 'SGS' }
     number_overrides: Dict[str, int] = {}   # { pizzaId: assignedNumber }
+    # Pareia meias e sobras com o otimizador; None mantém o valor salvo
+    otimizar_alocacao: Optional[bool] = None
 
 class PizzaConfigResponse(BaseModel):
     evento_id: int
     pairing_overrides: Dict[str, str]
     sector_overrides: Dict[str, str]
     number_overrides: Dict[str, int]
+    otimizar_alocacao: bool = False
+    # Overrides ignorados na alocação persistida: [{ tipo, pizza_id, motivo }]
+    # (vazio enquanto ela não é recalculada; o layout traz a lista atual)
+    overrides_invalidos: List[Dict[str, str]] = []
+
+
+def _overrides_invalidos(evento_id: int):
+    """Overrides inválidos lidos da alocação persistida em pizza_alocacoes.
+
+    Não calcula a alocação: se a persistida não está na versão atual (ex.: logo
+    após salvar overrides), retorna []; o layout e a simulação trazem a lista calculada.
+    """
+    versao, row = versao_alocacao(evento_id)
+    if versao is None or row["VERSAO_PERSISTIDA"] != versao:
+        return []
+    salva = execute_query(
+        """
+        SELECT alocacao->'overrides_invalidos' as overrides_invalidos
+        FROM pizza_alocacoes
+        WHERE evento_id = :evento_id AND versao = :versao
+        """,
+        {"evento_id": evento_id, "versao": versao},
+        fetch_one=True
+    )
+    return (salva["OVERRIDES_INVALIDOS"] or []) if salva else []
+
+# Hash de id/nome/setor dos usuários com pedido no evento (parâmetro :evento_id)
+HASH_USUARIOS_EVENTO_SQL = """(
+    SELECT md5(string_agg(
+        u.id || ':' || u.nome_completo || ':' || u.setor || ':' || u.setor_codigo, ',' ORDER BY u.id
+    ))
+    FROM usuarios u
+    WHERE u.id IN (SELECT p.usuario_id FROM pedidos p WHERE p.evento_id = :evento_id)
+)"""
+
+def _etag_confere(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidatos = [c.strip() for c in if_none_match.split(",")]
+    return any(c == etag or c == f"W/{etag}" for c in candidatos)
+
+
+@router.get("/{evento_id}/layout")
+async def get_pizza_layout(
+    evento_id: int,
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match"),
+    current_user: dict = Depends(get_current_admin_user)
+):
+    """Layout completo das pizzas do evento calculado no servidor.
+    
+    Traz todas as pizzas (inteiras, meio a meio, meias sem par e sobras) com
+    fatias por usuário, setor vencedor e número, além dos overrides inválidos.
+    O ETag combina a versão da alocação com um hash dos nomes/setores dos usuários
+    (que não entram na versão), os dois lidos sem calcular a alocação: com
+    If-None-Match igual, responde 304 sem tocar no motor.
+    """
+    leitura = versao_alocacao(evento_id)
+    versao, _ = leitura
+    if versao is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Evento não encontrado"
+        )
+    
+    # Renomear um usuário não muda a alocação, mas muda o corpo: entra no ETag
+    hash_usuarios = execute_query(
+        f"SELECT {HASH_USUARIOS_EVENTO_SQL} as hash_usuarios",
+        {"evento_id": evento_id},
+        fetch_one=True
+    )["HASH_USUARIOS"]
+    etag = f'"{versao}:{hash_usuarios or "-"}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    
+    if _etag_confere(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    alocacao = obter_alocacao_evento(evento_id, leitura)
+    
+    # Nomes/setores dos usuários que aparecem nas fatias
+    usuarios_query = """
+        SELECT DISTINCT u.id, u.nome_completo, u.setor, u.setor_codigo
+        FROM pedidos p
+        JOIN usuarios u ON p.usuario_id = u.id
+        WHERE p.evento_id = :evento_id
+    """
+    usuarios = {
+        str(row["ID"]): {"nome": row["NOME_COMPLETO"], "setor": row["SETOR"], "setor_codigo": row["SETOR_CODIGO"]}
+        for row in execute_query(usuarios_query, {"evento_id": evento_id})
+    }
+    
+    return JSONResponse(
+        content={
+            "evento_id": evento_id,
+            "versao": alocacao["versao"],
+            "pizzas": alocacao["pizzas"],
+            "usuarios": usuarios,
+            "overrides_invalidos": alocacao.get("overrides_invalidos", []),
+            "otimizacao": alocacao.get("otimizacao")
+        },
+        headers=headers
+    )
+
+
+@router.post("/{evento_id}/simular")
+async def simular_pizza_config(
+    evento_id: int,
+    config: PizzaConfigUpdate,
+    current_user: dict = Depends(get_current_admin_user)
+):
+    """Simula overrides candidatos sem salvar nada.
+
+    Sem otimizar_alocacao no corpo, usa o modo salvo do evento. Retorna o layout resultante, a diferença para o layout atual (pizzas
+    adicionadas/removidas/alteradas) e os usuários cujos números de pizza mudariam.
+    Roda sobre o motor em memória do evento, sem gravar em pizza_configs nem
+    invalidar a alocação dos clientes.
+    """
+    atual, simulada = simular_alocacao(
+        evento_id,
+        config.pairing_overrides,
+        config.sector_overrides,
+        config.number_overrides,
+        config.otimizar_alocacao
+    )
+    if atual is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Evento não encontrado"
+        )
+
+    return {
+        "evento_id": evento_id,
+        "versao_base": atual["versao"],
+        "pizzas": simulada["pizzas"],
+        "overrides_invalidos": simulada["overrides_invalidos"],
+        "otimizacao": simulada.get("otimizacao"),
+        **diferenca_alocacoes(atual, simulada)
+    }
+
 
 @router.get("/{evento_id}", response_model=PizzaConfigResponse)
 async def get_pizza_config(
@@ -38,7 +172,7 @@ async def get_pizza_config(
 ):
     """Obtém as configurações de pizza de um evento"""
     query = """
-        SELECT pairing_overrides, sector_overrides, number_overrides
+        SELECT pairing_overrides, sector_overrides, number_overrides, otimizar_alocacao
         FROM pizza_configs
         WHERE evento_id = :evento_id
     """
@@ -46,6 +180,7 @@ async def get_pizza_config(
     pairing = {}
     sector = {}
     number = {}
+    otimizar = False
     
     # Read CLOB within connection context
     with get_db_connection() as conn:
@@ -57,6 +192,7 @@ async def get_pizza_config(
             pairing = parse_json_value(result[0])
             sector = parse_json_value(result[1])
             number = {k: int(v) for k, v in parse_json_value(result[2]).items()}
+            otimizar = bool(result[3])
         
         cursor.close()
     
@@ -64,7 +200,9 @@ async def get_pizza_config(
         evento_id=evento_id,
         pairing_overrides=pairing,
         sector_overrides=sector,
-        number_overrides=number
+        number_overrides=number,
+        otimizar_alocacao=otimizar,
+        overrides_invalidos=_overrides_invalidos(evento_id)
     )
 
 @router.put("/{evento_id}", response_model=PizzaConfigResponse)
@@ -88,28 +226,34 @@ async def save_pizza_config(
             # Update existing
             update_query = """
                 UPDATE pizza_configs 
-                SET pairing_overrides = :pairing, sector_overrides = :sector, number_overrides = :num_overrides
+                SET pairing_overrides = :pairing, sector_overrides = :sector, number_overrides = :num_overrides,
+                    otimizar_alocacao = COALESCE(CAST(:otimizar AS BOOLEAN), otimizar_alocacao)
                 WHERE evento_id = :evento_id
+                RETURNING otimizar_alocacao
             """
             cursor.execute(update_query, {
                 "evento_id": evento_id,
                 "pairing": config.pairing_overrides,
                 "sector": config.sector_overrides,
-                "num_overrides": config.number_overrides
+                "num_overrides": config.number_overrides,
+                "otimizar": config.otimizar_alocacao
             })
         else:
             # Insert new
             insert_query = """
-                INSERT INTO pizza_configs (evento_id, pairing_overrides, sector_overrides, number_overrides)
-                VALUES (:evento_id, :pairing, :sector, :num_overrides)
+                INSERT INTO pizza_configs (evento_id, pairing_overrides, sector_overrides, number_overrides, otimizar_alocacao)
+                VALUES (:evento_id, :pairing, :sector, :num_overrides, COALESCE(CAST(:otimizar AS BOOLEAN), FALSE))
+                RETURNING otimizar_alocacao
             """
             cursor.execute(insert_query, {
                 "evento_id": evento_id,
                 "pairing": config.pairing_overrides,
                 "sector": config.sector_overrides,
-                "num_overrides": config.number_overrides
+                "num_overrides": config.number_overrides,
+                "otimizar": config.otimizar_alocacao
             })
         
+        otimizar = bool(cursor.fetchone()[0])
         conn.commit()
         cursor.close()
     
@@ -117,5 +261,7 @@ async def save_pizza_config(
         evento_id=evento_id,
         pairing_overrides=config.pairing_overrides,
         sector_overrides=config.sector_overrides,
-        number_overrides=config.number_overrides
+        number_overrides=config.number_overrides,
+        otimizar_alocacao=otimizar,
+        overrides_invalidos=_overrides_invalidos(evento_id)
     )
@@ -3,6 +3,9 @@ from typing import List
 from models import SaborPizzaCreate, SaborPizzaUpdate, SaborPizzaResponse
 from auth import get_current_admin_user, get_current_user
 from database import execute_query, get_db_connection
+from catalogo_sabores import obter_catalogo, obter_sabor_catalogo, invalidar_catalogo
+from alocacao_evento import incrementar_versao_pedidos_sabor
+from painel_evento import invalidar_paineis
 
 router = APIRouter(prefix="/sabores", tags=["Sabores de Pizza"])
 
@@ -46,28 +49,13 @@ async def listar_sabores(
     apenas_ativos: bool = True,
     current_user: dict = Depends(get_current_user)
 ):
-    """Lista todos os sabores de pizza"""
-    
-    query = "SELECT id, nome, preco_pedaco, ativo, data_cadastro, tipo, descricao FROM sabores_pizza"
-    
-    if apenas_ativos:
-        query += " WHERE ativo = 1"
-    
-    query += " ORDER BY nome"
-    
-    results = execute_query(query)
+    """Lista todos os sabores de pizza (servido do catálogo em memória)"""
     
+    # Catálogo já vem ordenado por nome
     return [
-        SaborPizzaResponse(
-            id=row["ID"],
-            nome=row["NOME"],
-            preco_pedaco=float(row["PRECO_PEDACO"]),
-            ativo=bool(row["ATIVO"]),
-            data_cadastro=row["DATA_CADASTRO"],
-            tipo=row.get("TIPO", "SALGADA"),
-            descricao=row.get("DESCRICAO")
-        )
-        for row in results
+        SaborPizzaResponse(**sabor)
+        for sabor in obter_catalogo().values()
+        if sabor["ativo"] or not apenas_ativos
     ]
 
 @router.get("/{sabor_id}", response_model=SaborPizzaResponse)
@@ -75,31 +63,17 @@ async def obter_sabor(
     sabor_id: int,
     current_user: dict = Depends(get_current_user)
 ):
-    """Obtém um sabor específico"""
+    """Obtém um sabor específico (servido do catálogo em memória)"""
     
-    query = """
-        SELECT id, nome, preco_pedaco, ativo, data_cadastro, tipo, descricao
-        FROM sabores_pizza
-        WHERE id = :sabor_id
-    """
-    
-    result = execute_query(query, {"sabor_id": sabor_id}, fetch_one=True)
+    sabor = obter_sabor_catalogo(sabor_id)
     
-    if not result:
+    if not sabor:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Sabor não encontrado"
         )
     
-    return SaborPizzaResponse(
-        id=result["ID"],
-        nome=result["NOME"],
-        preco_pedaco=float(result["PRECO_PEDACO"]),
-        ativo=bool(result["ATIVO"]),
-        data_cadastro=result["DATA_CADASTRO"],
-        tipo=result.get("TIPO", "SALGADA"),
-        descricao=result.get("DESCRICAO")
-    )
+    return SaborPizzaResponse(**sabor)
 
 @router.post("/", response_model=SaborPizzaResponse, status_code=status.HTTP_201_CREATED)
 async def criar_sabor(
@@ -142,6 +116,8 @@ async def criar_sabor(
         result = cursor.fetchone()
         cursor.close()
     
+    invalidar_catalogo()
+    
     return SaborPizzaResponse(
         id=result[0],
         nome=result[1],
@@ -209,6 +185,9 @@ async def atualizar_sabor(
     with get_db_connection() as conn:
         cursor = conn.cursor()
         cursor.execute(update_query, params)
+        if sabor.nome is not None or sabor.tipo is not None:
+            # Nome e tipo entram na alocação de pizzas dos eventos com este sabor
+            incrementar_versao_pedidos_sabor(cursor, sabor_id)
         conn.commit()
         
         # Buscar sabor atualizado
@@ -221,6 +200,9 @@ async def atualizar_sabor(
         result = cursor.fetchone()
         cursor.close()
     
+    invalidar_catalogo()
+    invalidar_paineis()
+    
     return SaborPizzaResponse(
         id=result[0],
         nome=result[1],
@@ -253,4 +235,7 @@ async def deletar_sabor(
         conn.commit()
         cursor.close()
     
+    invalidar_catalogo()
+    invalidar_paineis()
+    
     return None
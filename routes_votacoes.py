@@ -1,5 +1,6 @@
-from fastapi import APIRouter, HTTPException, status, Depends
-from typing import List
+from fastapi import APIRouter, HTTPException, status, Depends, Header
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
 from datetime import datetime, timedelta
 from models import (
     VotacaoCreate, VotacaoUpdate, VotacaoResponse, VotacaoResultado,
@@ -8,6 +9,11 @@ from models import (
 )
 from auth import get_current_admin_user, get_current_user
 from database import execute_query, get_db_connection
+from idempotencia import executar_idempotente
+from status_votacoes import STATUS_EFETIVO_SQL, status_efetivo
+from agendador import fechar_vencidos_na_escrita
+from totais_votacao import reconciliar_votos
+from votacoes_ao_vivo import abrir_placar, stream_placar, publicar_mudanca_votacao
 
 # Timezone handling - Windows compatibility
 try:
@@ -28,20 +34,6 @@ def get_now():
         return datetime.utcnow() - timedelta(hours=3)
 
 
-def verificar_e_fechar_votacoes_expiradas():
-    """Fecha automaticamente votações cuja data_limite já passou."""
-    query = """
-        UPDATE votacoes
-        SET status = 'FECHADO'
-        WHERE status = 'ABERTO' AND data_limite < :current_time
-    """
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute(query, {"current_time": get_now()})
-        conn.commit()
-        cursor.close()
-
-
 # ============ ADMIN ENDPOINTS ============
 
 @router.post("/", response_model=VotacaoResponse, status_code=status.HTTP_201_CREATED)
@@ -118,13 +110,15 @@ async def criar_votacao(
         escolhas = cursor.fetchall()
         cursor.close()
     
+    publicar_mudanca_votacao(votacao_id)
+    
     return VotacaoResponse(
         id=row[0],
         titulo=row[1],
         data_abertura=row[2],
         data_limite=row[3],
         data_resultado_ate=row[4],
-        status=row[5],
+        status=status_efetivo(row[5], row[3], get_now()),
         criado_por=row[6],
         data_criacao=row[7],
         escolhas=[EscolhaResponse(id=e[0], texto=e[1], ordem=e[2]) for e in escolhas]
@@ -136,18 +130,17 @@ async def listar_todas_votacoes(
     current_user: dict = Depends(get_current_admin_user)
 ):
     """Lista todas as votações - histórico completo (apenas admin)"""
-    verificar_e_fechar_votacoes_expiradas()
     
-    # Single JOIN query instead of N+1
-    query = """
+    # Single JOIN query instead of N+1 (status efetivo pelas datas, sem UPDATE)
+    query = f"""
         SELECT v.id, v.titulo, v.data_abertura, v.data_limite, v.data_resultado_ate, 
-               v.status, v.criado_por, v.data_criacao,
+               {STATUS_EFETIVO_SQL} as status, v.criado_por, v.data_criacao,
                e.id as escolha_id, e.texto, e.ordem
         FROM votacoes v
         LEFT JOIN votacao_escolhas e ON e.votacao_id = v.id
         ORDER BY v.data_criacao DESC, e.ordem
     """
-    rows = execute_query(query)
+    rows = execute_query(query, {"now": get_now()})
     
     votacoes_map = {}
     for row in rows:
@@ -183,9 +176,9 @@ async def obter_detalhes_votacao(
     """Obtém detalhes completos da votação incluindo quem votou em quê (apenas admin)"""
     
     # Single query for votacao + escolhas + votantes
-    query = """
+    query = f"""
         SELECT v.id, v.titulo, v.data_abertura, v.data_limite, v.data_resultado_ate, 
-               v.status, v.criado_por, v.data_criacao,
+               {STATUS_EFETIVO_SQL} as status, v.criado_por, v.data_criacao,
                e.id as escolha_id, e.texto, e.ordem,
                vt.usuario_id, u.nome_completo, u.setor, vt.data_voto
         FROM votacoes v
@@ -195,7 +188,7 @@ async def obter_detalhes_votacao(
         WHERE v.id = :id
         ORDER BY e.ordem, vt.data_voto
     """
-    rows = execute_query(query, {"id": votacao_id})
+    rows = execute_query(query, {"id": votacao_id, "now": get_now()})
     
     if not rows:
         raise HTTPException(status_code=404, detail="Votação não encontrada")
@@ -300,13 +293,15 @@ async def atualizar_votacao(
         escolhas = cursor.fetchall()
         cursor.close()
     
+    publicar_mudanca_votacao(votacao_id)
+    
     return VotacaoResponse(
         id=row[0],
         titulo=row[1],
         data_abertura=row[2],
         data_limite=row[3],
         data_resultado_ate=row[4],
-        status=row[5],
+        status=status_efetivo(row[5], row[3], get_now()),
         criado_por=row[6],
         data_criacao=row[7],
         escolhas=[EscolhaResponse(id=e[0], texto=e[1], ordem=e[2]) for e in escolhas]
@@ -330,9 +325,36 @@ async def deletar_votacao(
         conn.commit()
         cursor.close()
     
+    publicar_mudanca_votacao(votacao_id)
+    
     return None
 
 
+@router.post("/{votacao_id}/reconciliar-votos")
+async def reconciliar_votos_votacao(
+    votacao_id: int,
+    current_user: dict = Depends(get_current_admin_user)
+):
+    """
+    Recalcula a contagem de votos por escolha a partir dos votos (apenas admin)
+    Corrige desvios dos contadores mantidos pelo endpoint de votar
+    """
+    existing = execute_query("SELECT id FROM votacoes WHERE id = :id", {"id": votacao_id}, fetch_one=True)
+    
+    if not existing:
+        raise HTTPException(status_code=404, detail="Votação não encontrada")
+    
+    corrigidas = reconciliar_votos(votacao_id)
+    if corrigidas:
+        publicar_mudanca_votacao(votacao_id)
+    
+    return {
+        "votacao_id": votacao_id,
+        "escolhas_corrigidas": corrigidas,
+        "message": "Contagem corrigida" if corrigidas else "Contagem já estava correta"
+    }
+
+
 # ============ USER ENDPOINTS ============
 
 @router.get("/ativas", response_model=List[VotacaoResultado])
@@ -340,25 +362,21 @@ async def listar_votacoes_ativas(
     current_user: dict = Depends(get_current_user)
 ):
     """Lista votações abertas para votação (usuário comum) - inclui status de voto"""
-    verificar_e_fechar_votacoes_expiradas()
     now = get_now()
     user_id = current_user["id"]
     
-    # Single JOIN query: votacoes + escolhas + vote counts + user vote
+    # Single JOIN query: votacoes + escolhas (contadores) + voto do usuário
     query = """
         SELECT v.id, v.titulo, v.data_abertura, v.data_limite, v.data_resultado_ate, 
                v.status, v.criado_por, v.data_criacao,
-               e.id as escolha_id, e.texto, e.ordem,
-               COUNT(vt.id) as votos,
-               MAX(CASE WHEN vt.usuario_id = :user_id THEN e.id END) as user_escolha_id
+               e.id as escolha_id, e.texto, e.ordem, e.total_votos as votos,
+               CASE WHEN vt.id IS NOT NULL THEN e.id END as user_escolha_id
         FROM votacoes v
         LEFT JOIN votacao_escolhas e ON e.votacao_id = v.id
-        LEFT JOIN votos vt ON vt.escolha_id = e.id
+        LEFT JOIN votos vt ON vt.escolha_id = e.id AND vt.usuario_id = :user_id
         WHERE v.status = 'ABERTO' 
         AND v.data_abertura <= :now 
         AND v.data_limite > :now
-        GROUP BY v.id, v.titulo, v.data_abertura, v.data_limite, v.data_resultado_ate,
-                 v.status, v.criado_por, v.data_criacao, e.id, e.texto, e.ordem
         ORDER BY v.data_criacao DESC, e.ordem
     """
     rows = execute_query(query, {"now": now, "user_id": user_id})
@@ -366,29 +384,46 @@ async def listar_votacoes_ativas(
     return _build_votacao_resultados_from_rows(rows, user_id, force_show=True)
 
 
+@router.get("/ativas/stream")
+async def stream_votacoes_ativas(
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Resultados ao vivo das votações abertas via Server-Sent Events
+    
+    Envia um evento "snapshot" com as votações abertas (votos e porcentagem por
+    escolha) e depois um evento "atualizacao" com as votações que mudaram e as
+    encerradas. Rajadas de votos viram uma atualização por intervalo, calculada
+    uma vez e compartilhada por todos os clientes.
+    """
+    placar = await abrir_placar()
+    
+    return StreamingResponse(
+        stream_placar(placar),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.get("/resultados-visiveis", response_model=List[VotacaoResultado])
 async def listar_resultados_visiveis(
     current_user: dict = Depends(get_current_user)
 ):
     """Lista votações encerradas cujos resultados ainda estão visíveis"""
-    verificar_e_fechar_votacoes_expiradas()
     now = get_now()
     user_id = current_user["id"]
     
-    # Single JOIN query
-    query = """
+    # Single JOIN query (ABERTO com data_limite vencida conta como FECHADO)
+    query = f"""
         SELECT v.id, v.titulo, v.data_abertura, v.data_limite, v.data_resultado_ate, 
-               v.status, v.criado_por, v.data_criacao,
-               e.id as escolha_id, e.texto, e.ordem,
-               COUNT(vt.id) as votos,
-               MAX(CASE WHEN vt.usuario_id = :user_id THEN e.id END) as user_escolha_id
+               {STATUS_EFETIVO_SQL} as status, v.criado_por, v.data_criacao,
+               e.id as escolha_id, e.texto, e.ordem, e.total_votos as votos,
+               CASE WHEN vt.id IS NOT NULL THEN e.id END as user_escolha_id
         FROM votacoes v
         LEFT JOIN votacao_escolhas e ON e.votacao_id = v.id
-        LEFT JOIN votos vt ON vt.escolha_id = e.id
-        WHERE (v.status = 'FECHADO' OR v.status = 'FINALIZADO')
+        LEFT JOIN votos vt ON vt.escolha_id = e.id AND vt.usuario_id = :user_id
+        WHERE {STATUS_EFETIVO_SQL} IN ('FECHADO', 'FINALIZADO')
         AND v.data_resultado_ate >= :now
-        GROUP BY v.id, v.titulo, v.data_abertura, v.data_limite, v.data_resultado_ate,
-                 v.status, v.criado_por, v.data_criacao, e.id, e.texto, e.ordem
         ORDER BY v.data_criacao DESC, e.ordem
     """
     rows = execute_query(query, {"now": now, "user_id": user_id})
@@ -402,14 +437,14 @@ async def obter_votacao(
     current_user: dict = Depends(get_current_user)
 ):
     """Obtém uma votação com resultados (se usuário já votou ou votação encerrada)"""
-    verificar_e_fechar_votacoes_expiradas()
     user_id = current_user["id"]
     
-    query = """
-        SELECT id, titulo, data_abertura, data_limite, data_resultado_ate, status, criado_por, data_criacao
-        FROM votacoes WHERE id = :id
+    query = f"""
+        SELECT v.id, v.titulo, v.data_abertura, v.data_limite, v.data_resultado_ate,
+               {STATUS_EFETIVO_SQL} as status, v.criado_por, v.data_criacao
+        FROM votacoes v WHERE v.id = :id
     """
-    votacao = execute_query(query, {"id": votacao_id}, fetch_one=True)
+    votacao = execute_query(query, {"id": votacao_id, "now": get_now()}, fetch_one=True)
     
     if not votacao:
         raise HTTPException(status_code=404, detail="Votação não encontrada")
@@ -436,18 +471,103 @@ async def obter_votacao(
 async def votar(
     votacao_id: int,
     voto: VotoCreate,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
-    """Registra o voto do usuário"""
-    verificar_e_fechar_votacoes_expiradas()
-    now = get_now()
-    user_id = current_user["id"]
-    
-    # Verificar se votação está aberta
-    votacao_query = """
-        SELECT id, status, data_abertura, data_limite FROM votacoes WHERE id = :id
-    """
-    votacao = execute_query(votacao_query, {"id": votacao_id}, fetch_one=True)
+    """Registra o voto do usuário (aceita Idempotency-Key)"""
+    return await executar_idempotente(
+        idempotency_key,
+        current_user["id"],
+        f"POST /votacoes/{votacao_id}/votar",
+        voto.model_dump(mode="json"),
+        lambda: _votar(votacao_id, voto, current_user)
+    )
+
+
+# Voto em um statement: valida votação/escolha, grava (insert ou troca de escolha),
+# atualiza os contadores e devolve as escolhas com a contagem já somada.
+# Sem linhas = votação fechada/inexistente ou escolha inválida.
+VOTAR_QUERY = f"""
+    WITH valida AS (
+        SELECT e.votacao_id
+        FROM votacao_escolhas e
+        JOIN votacoes v ON v.id = e.votacao_id
+        WHERE e.id = :escolha_id AND e.votacao_id = :votacao_id
+          AND v.status = 'ABERTO' AND v.data_abertura <= :now AND v.data_limite >= :now
+    ),
+    anterior AS (
+        -- FOR UPDATE espera um voto concorrente do mesmo usuário e lê a versão commitada
+        SELECT id, escolha_id FROM votos
+        WHERE votacao_id = :votacao_id AND usuario_id = :user_id
+        FOR UPDATE
+    ),
+    inserido AS (
+        -- Primeiro voto concorrente que perder a corrida não grava nada (sem linhas: _votar repete)
+        INSERT INTO votos (votacao_id, escolha_id, usuario_id)
+        SELECT votacao_id, :escolha_id, :user_id FROM valida
+        WHERE NOT EXISTS (SELECT 1 FROM anterior)
+        ON CONFLICT DO NOTHING
+        RETURNING escolha_id
+    ),
+    trocado AS (
+        UPDATE votos vt
+        SET escolha_id = :escolha_id, data_voto = CURRENT_TIMESTAMP
+        FROM anterior a, valida
+        WHERE vt.id = a.id
+        RETURNING vt.escolha_id
+    ),
+    voto AS (
+        SELECT escolha_id FROM inserido
+        UNION ALL
+        SELECT escolha_id FROM trocado
+    ),
+    travadas AS (
+        -- Trava as escolhas em ordem de id: trocas de voto cruzadas não entram em deadlock
+        SELECT e.id
+        FROM votacao_escolhas e, voto
+        WHERE e.id IN (voto.escolha_id, (SELECT escolha_id FROM anterior))
+          AND voto.escolha_id IS DISTINCT FROM (SELECT escolha_id FROM anterior)
+        ORDER BY e.id
+        FOR UPDATE OF e
+    ),
+    contadores AS (
+        UPDATE votacao_escolhas e
+        SET total_votos = e.total_votos + CASE WHEN e.id = voto.escolha_id THEN 1 ELSE -1 END
+        FROM voto, travadas t
+        WHERE e.id = t.id
+        RETURNING e.id, e.total_votos
+    )
+    SELECT v.id, v.titulo, v.data_abertura, v.data_limite, v.data_resultado_ate,
+           {STATUS_EFETIVO_SQL} as status,
+           e.id as escolha_id, e.texto, e.ordem,
+           COALESCE(c.total_votos, e.total_votos) as votos,
+           CASE WHEN e.id = voto.escolha_id THEN e.id END as user_escolha_id
+    FROM voto
+    JOIN votacoes v ON v.id = :votacao_id
+    JOIN votacao_escolhas e ON e.votacao_id = v.id
+    LEFT JOIN contadores c ON c.id = e.id
+    ORDER BY e.ordem
+"""
+
+VOTAR_COLUNAS = (
+    "ID", "TITULO", "DATA_ABERTURA", "DATA_LIMITE", "DATA_RESULTADO_ATE", "STATUS",
+    "ESCOLHA_ID", "TEXTO", "ORDEM", "VOTOS", "USER_ESCOLHA_ID"
+)
+
+
+def _recusar_voto(votacao_id: int, escolha_id: int, now):
+    """Explica por que VOTAR_QUERY não gravou o voto (só roda no caminho de erro)."""
+    votacao = execute_query(
+        """
+        SELECT v.status, v.data_abertura, v.data_limite,
+               EXISTS (
+                   SELECT 1 FROM votacao_escolhas e WHERE e.id = :escolha_id AND e.votacao_id = v.id
+               ) as escolha_valida
+        FROM votacoes v WHERE v.id = :id
+        """,
+        {"id": votacao_id, "escolha_id": escolha_id},
+        fetch_one=True
+    )
     
     if not votacao:
         raise HTTPException(status_code=404, detail="Votação não encontrada")
@@ -461,60 +581,42 @@ async def votar(
     if now > votacao["DATA_LIMITE"]:
         raise HTTPException(status_code=400, detail="Esta votação já encerrou")
     
-    # Verificar se escolha pertence a esta votação
-    escolha_query = "SELECT id FROM votacao_escolhas WHERE id = :escolha_id AND votacao_id = :votacao_id"
-    escolha = execute_query(escolha_query, {"escolha_id": voto.escolha_id, "votacao_id": votacao_id}, fetch_one=True)
-    
-    if not escolha:
+    if not votacao["ESCOLHA_VALIDA"]:
         raise HTTPException(status_code=400, detail="Escolha inválida para esta votação")
     
-    # Verificar se usuário já votou
-    voto_existente_query = """
-        SELECT v.id FROM votos v
-        JOIN votacao_escolhas e ON v.escolha_id = e.id
-        WHERE e.votacao_id = :votacao_id AND v.usuario_id = :user_id
-    """
-    voto_existente = execute_query(voto_existente_query, {"votacao_id": votacao_id, "user_id": user_id}, fetch_one=True)
+    raise HTTPException(status_code=409, detail="Não foi possível registrar o voto, tente novamente")
+
+
+async def _votar(votacao_id: int, voto: VotoCreate, current_user: dict):
+    fechar_vencidos_na_escrita()
+    now = get_now()
+    user_id = current_user["id"]
     
-    if voto_existente:
-        # Atualizar voto existente (usuário está alterando seu voto)
+    # Votar ou trocar o voto: um round trip (unicidade garantida por uk_voto_votacao).
+    # Sem linhas pode ser o primeiro voto de outra requisição do mesmo usuário
+    # commitado no meio: repete uma vez (novo snapshot, vira troca de voto)
+    rows = []
+    for _ in range(2):
         with get_db_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute(
-                "UPDATE votos SET escolha_id = :escolha_id, data_voto = CURRENT_TIMESTAMP WHERE id = :voto_id",
-                {"escolha_id": voto.escolha_id, "voto_id": voto_existente["ID"]}
-            )
-            conn.commit()
-            cursor.close()
-    else:
-        # Registrar novo voto
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "INSERT INTO votos (escolha_id, usuario_id) VALUES (:escolha_id, :user_id)",
-                {"escolha_id": voto.escolha_id, "user_id": user_id}
-            )
+            cursor.execute(VOTAR_QUERY, {
+                "votacao_id": votacao_id,
+                "escolha_id": voto.escolha_id,
+                "user_id": user_id,
+                "now": now
+            })
+            rows = [dict(zip(VOTAR_COLUNAS, row)) for row in cursor.fetchall()]
             conn.commit()
             cursor.close()
+        if rows:
+            break
     
-    # Retornar resultado completo
-    votacao_full = execute_query("""
-        SELECT id, titulo, data_abertura, data_limite, data_resultado_ate, status, criado_por, data_criacao
-        FROM votacoes WHERE id = :id
-    """, {"id": votacao_id}, fetch_one=True)
+    if not rows:
+        _recusar_voto(votacao_id, voto.escolha_id, now)
     
-    votacao_dict = {
-        "ID": votacao_full["ID"],
-        "TITULO": votacao_full["TITULO"],
-        "DATA_ABERTURA": votacao_full["DATA_ABERTURA"],
-        "DATA_LIMITE": votacao_full["DATA_LIMITE"],
-        "DATA_RESULTADO_ATE": votacao_full["DATA_RESULTADO_ATE"],
-        "STATUS": votacao_full["STATUS"],
-        "CRIADO_POR": votacao_full["CRIADO_POR"],
-        "DATA_CRIACAO": votacao_full["DATA_CRIACAO"]
-    }
+    publicar_mudanca_votacao(votacao_id)
     
-    return _build_votacao_resultado(votacao_dict, user_id, force_show=True)
+    return _build_votacao_resultados_from_rows(rows, user_id, force_show=True)[0]
 
 
 def _build_votacao_resultados_from_rows(rows, user_id: int, force_show: bool = False):
@@ -592,15 +694,13 @@ def _build_votacao_resultado(votacao_dict: dict, user_id: int, force_show: bool
     """Helper para construir VotacaoResultado com porcentagens (single votacao)"""
     votacao_id = votacao_dict["ID"]
     
-    # Single query for escolhas + vote counts + user vote
+    # Single query for escolhas (contadores) + user vote
     query = """
-        SELECT :votacao_id as id, e.id as escolha_id, e.texto, e.ordem,
-               COUNT(v.id) as votos,
-               MAX(CASE WHEN v.usuario_id = :user_id THEN e.id END) as user_escolha_id
+        SELECT :votacao_id as id, e.id as escolha_id, e.texto, e.ordem, e.total_votos as votos,
+               CASE WHEN v.id IS NOT NULL THEN e.id END as user_escolha_id
         FROM votacao_escolhas e
-        LEFT JOIN votos v ON e.id = v.escolha_id
+        LEFT JOIN votos v ON e.id = v.escolha_id AND v.usuario_id = :user_id
         WHERE e.votacao_id = :votacao_id
-        GROUP BY e.id, e.texto, e.ordem
         ORDER BY e.ordem
     """
     escolhas = execute_query(query, {"votacao_id": votacao_id, "user_id": user_id})
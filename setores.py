@@ -0,0 +1,57 @@
+"""
+Código normalizado do setor do usuário (usuarios.setor_codigo).
+
+usuarios.setor é texto livre ("STI - Suporte", "sgs/compras", ...). O lado do
+andar usado na alocação das pizzas é derivado dele uma vez, na escrita (cadastro
+e edição pelo admin), e guardado como bits: SETOR_STI, SETOR_SGS (ou os dois,
+ou nenhum). O mapeamento texto → código fica em Settings.SETOR_CODIGOS.
+"""
+from config import get_settings
+
+SETOR_STI = 1
+SETOR_SGS = 2
+
+
+def calcular_setor_codigo(setor, mapeamento=None) -> int:
+    """Bits do lado do andar para o texto do setor (0 = nenhum lado)."""
+    if mapeamento is None:
+        mapeamento = get_settings().SETOR_CODIGOS
+    setor_upper = (setor or "").upper()
+    codigo = 0
+    for trecho, bits in mapeamento.items():
+        if trecho.upper() in setor_upper:
+            codigo |= bits
+    return codigo
+
+
+def sincronizar_setor_codigos():
+    """Recalcula setor_codigo de todos os usuários (startup).
+
+    Preenche a coluna nova e acompanha mudanças no mapeamento; eventos com
+    pedidos de usuários que mudaram de código têm a alocação invalidada.
+    Retorna quantos usuários foram atualizados.
+    """
+    # Imports locais: este módulo é usado pelo motor de alocação, que não acessa o banco
+    from database import get_db_connection
+    from alocacao_evento import incrementar_versao_pedidos_usuario
+
+    mapeamento = get_settings().SETOR_CODIGOS
+    alterados = 0
+
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, setor, setor_codigo FROM usuarios")
+        for usuario_id, setor, codigo_atual in cursor.fetchall():
+            codigo = calcular_setor_codigo(setor, mapeamento)
+            if codigo == codigo_atual:
+                continue
+            cursor.execute(
+                "UPDATE usuarios SET setor_codigo = :codigo WHERE id = :id",
+                {"codigo": codigo, "id": usuario_id}
+            )
+            incrementar_versao_pedidos_usuario(cursor, usuario_id)
+            alterados += 1
+        conn.commit()
+        cursor.close()
+
+    return alterados
@@ -0,0 +1,44 @@
+"""
+Status efetivo das votações, calculado pelas datas na leitura.
+
+Uma votação ABERTA cuja data_limite já passou é tratada como FECHADA nas
+leituras (STATUS_EFETIVO_SQL), então os GETs de votação não escrevem no banco.
+O status gravado é acertado por fechar_votacoes_expiradas (chamado pela thread
+do agendador e, para ambientes serverless em que ela fica congelada, pelos
+caminhos de escrita via agendador.fechar_vencidos_na_escrita), só para manter o
+banco coerente para quem lê direto.
+"""
+from datetime import datetime
+
+from database import get_db_connection, SAO_PAULO_TZ
+
+# Expressão SQL do status efetivo (tabela votacoes com alias "v", parâmetro :now)
+STATUS_EFETIVO_SQL = (
+    "CASE WHEN v.status = 'ABERTO' AND v.data_limite < :now THEN 'FECHADO' ELSE v.status END"
+)
+
+
+def status_efetivo(status: str, data_limite, now) -> str:
+    """Mesma regra de STATUS_EFETIVO_SQL, para linhas já lidas."""
+    if status == 'ABERTO' and data_limite < now:
+        return 'FECHADO'
+    return status
+
+
+def fechar_votacoes_expiradas() -> int:
+    """Grava FECHADO nas votações ABERTAS cuja data_limite já passou. Retorna quantas."""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            UPDATE votacoes
+            SET status = 'FECHADO'
+            WHERE status = 'ABERTO' AND data_limite < :current_time
+            """,
+            {"current_time": datetime.now(SAO_PAULO_TZ).replace(tzinfo=None)}
+        )
+        fechadas = cursor.rowcount
+        conn.commit()
+        cursor.close()
+
+    return fechadas
@@ -6,6 +6,7 @@ create table usuarios (
     nome_completo varchar(200) not null,
     senha_hash varchar(255) not null,
     setor varchar(100) not null,
+    setor_codigo smallint not null default 0,
     is_admin boolean default false,
     ativo boolean default true,
     data_cadastro timestamptz default now(),
@@ -34,6 +35,10 @@ create table eventos (
     nome varchar(255),
     tipo varchar(20) default 'NORMAL',
     pagamento_liberado boolean default false,
+    versao_pedidos bigint not null default 0,
+    total_participantes integer not null default 0,
+    total_pedidos integer not null default 0,
+    valor_total_pedidos numeric(12, 2) not null default 0,
     constraint uk_evento_data unique (data_evento),
     constraint eventos_status_check check (status in ('ABERTO', 'FECHADO', 'FINALIZADO')),
     constraint eventos_tipo_check check (tipo in ('NORMAL', 'RELAMPAGO'))
@@ -72,7 +77,31 @@ create table pizza_configs (
     sector_overrides jsonb default '{}'::jsonb,
     created_at timestamptz default now(),
     updated_at timestamptz default now(),
-    number_overrides jsonb default '{}'::jsonb
+    number_overrides jsonb default '{}'::jsonb,
+    otimizar_alocacao boolean not null default false
+);
+
+create table pizza_alocacoes (
+    evento_id integer primary key references eventos(id) on delete cascade,
+    versao varchar(100) not null,
+    alocacao jsonb not null,
+    calculado_em timestamptz default now()
+);
+
+create table evento_sabores_totais (
+    evento_id integer not null references eventos(id) on delete cascade,
+    sabor_id integer not null references sabores_pizza(id) on delete cascade,
+    total_pedacos integer not null default 0,
+    primary key (evento_id, sabor_id)
+);
+
+create table relatorios_pagamento (
+    evento_id integer not null references eventos(id) on delete cascade,
+    usuario_id integer not null references usuarios(id) on delete cascade,
+    versao varchar(100) not null,
+    documento jsonb not null,
+    gerado_em timestamptz default now(),
+    primary key (evento_id, usuario_id)
 );
 
 create table codigos_reset_senha (
@@ -101,15 +130,18 @@ create table votacao_escolhas (
     votacao_id integer not null references votacoes(id) on delete cascade,
     texto varchar(200) not null,
     ordem integer not null,
+    total_votos integer not null default 0,
     constraint uk_escolha_ordem unique (votacao_id, ordem)
 );
 
 create table votos (
     id integer generated by default as identity primary key,
+    votacao_id integer not null references votacoes(id) on delete cascade,
     escolha_id integer not null references votacao_escolhas(id) on delete cascade,
     usuario_id integer not null references usuarios(id),
     data_voto timestamptz default now(),
-    constraint uk_voto_unico unique (escolha_id, usuario_id)
+    constraint uk_voto_unico unique (escolha_id, usuario_id),
+    constraint uk_voto_votacao unique (votacao_id, usuario_id)
 );
 
 create table feedbacks (
@@ -161,32 +193,3 @@ create trigger trg_pizza_configs_update
 before update on pizza_configs
 for each row
 execute function update_pizza_configs_timestamp();
-
-create or replace function check_voto_unico()
-returns trigger as $$
-declare
-    v_votacao_id integer;
-    v_count integer;
-begin
-    select votacao_id into v_votacao_id
-    from votacao_escolhas
-    where id = new.escolha_id;
-
-    select count(*) into v_count
-    from votos v
-    join votacao_escolhas e on v.escolha_id = e.id
-    where e.votacao_id = v_votacao_id
-      and v.usuario_id = new.usuario_id;
-
-    if v_count > 0 then
-        raise exception 'Usuario ja votou nesta votacao';
-    end if;
-
-    return new;
-end;
-$$ language plpgsql;
-
-create trigger trg_voto_unico_votacao
-before insert on votos
-for each row
-execute function check_voto_unico();
@@ -0,0 +1,627 @@
+"""
+Corpus de equivalência do motor de alocação de pizzas (motor_alocacao.py)
+
+Compara o MotorAlocacao com a implementação de referência (o algoritmo em lote
+original, pedaço a pedaço, igual ao AdminPizzaDashboard.jsx) em:
+- eventos aleatórios com overrides (válidos e inválidos), por seed
+- sequências aleatórias de inclusão, edição e cancelamento de pedidos (deltas)
+- casos fixos salvos em test_alocacao_golden.json
+
+E o modo otimizado (otimizador_alocacao.py): ótimo contra força bruta em
+instâncias pequenas e nunca pior que o guloso.
+
+Não precisa de banco. Rodar com:
+    python test_alocacao.py
+    python test_alocacao.py --regenerar-golden   (regrava o golden com a referência)
+Também roda via pytest (funções test_*).
+"""
+import json
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+from motor_alocacao import MotorAlocacao
+from otimizador_alocacao import parear_metades, _custo
+from setores import calcular_setor_codigo, SETOR_STI, SETOR_SGS
+
+GOLDEN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_alocacao_golden.json")
+SETORES = ["STI", "SGS", "sti - suporte", "SGS/Compras", "", None, "STI e SGS", "RH"]
+# Mapeamento padrão de Settings.SETOR_CODIGOS: a referência compara o texto do setor,
+# o motor recebe o código; a equivalência cobre também a normalização
+MAPEAMENTO_SETORES = {"STI": SETOR_STI, "SGS": SETOR_SGS}
+
+
+# ============================================
+# Implementação de referência (algoritmo em lote original)
+# ============================================
+
+def calcular_alocacao_referencia(todos_itens, pairing_overrides, sector_overrides, number_overrides):
+    """Algoritmo original, um dict por pedaço. Não otimizar: é a especificação."""
+    all_slices = []
+    for item in todos_itens:
+        for i in range(item["QUANTIDADE"]):
+            all_slices.append({
+                "item_id": item["ITEM_ID"],
+                "flavor_id": item["SABOR_ID"],
+                "flavor_name": item["SABOR_NOME"],
+                "flavor_type": item["SABOR_TIPO"] or "SALGADA",
+                "usuario_id": item["USUARIO_ID"],
+                "sector": item["USUARIO_SETOR"] or "",
+                "timestamp": item["DATA_PEDIDO"],
+            })
+
+    slices_by_flavor = {}
+    for slice_data in all_slices:
+        fid = slice_data["flavor_id"]
+        if fid not in slices_by_flavor:
+            slices_by_flavor[fid] = {
+                "id": fid,
+                "name": slice_data["flavor_name"],
+                "type": slice_data["flavor_type"],
+                "slices": []
+            }
+        slices_by_flavor[fid]["slices"].append(slice_data)
+
+    def process_flavor_group(flavors):
+        flavors.sort(key=lambda f: (-len(f["slices"]), f["id"]))
+        complete_pizzas, half_pizzas, leftovers = [], [], []
+        for flavor in flavors:
+            slices = flavor["slices"]
+            total = len(slices)
+            inteiras = total // 8
+            resto = total % 8
+            for i in range(inteiras):
+                pizza_slices = slices[i * 8:(i + 1) * 8]
+                complete_pizzas.append({
+                    "id": f"{flavor['id']}-inteira-{i}",
+                    "flavor_name": flavor["name"],
+                    "flavor_type": flavor["type"],
+                    "slices_count": 8,
+                    "slices": pizza_slices,
+                    "is_meio_a_meio": False,
+                    "last_update": pizza_slices[-1]["timestamp"]
+                })
+            meias = resto // 4
+            resto_final = resto % 4
+            base_idx = inteiras * 8
+            for i in range(meias):
+                start = base_idx + (i * 4)
+                pizza_slices = slices[start:start + 4]
+                half_pizzas.append({
+                    "id": f"{flavor['id']}-meia-{i}",
+                    "flavor_id": flavor["id"],
+                    "flavor_name": flavor["name"],
+                    "flavor_type": flavor["type"],
+                    "slices_count": 4,
+                    "slices": pizza_slices,
+                    "last_update": pizza_slices[-1]["timestamp"]
+                })
+            if resto_final > 0:
+                start = base_idx + (meias * 4)
+                pizza_slices = slices[start:start + resto_final]
+                leftovers.append({
+                    "id": f"{flavor['id']}-resto",
+                    "flavor_name": flavor["name"],
+                    "flavor_type": flavor["type"],
+                    "slices_count": resto_final,
+                    "slices": pizza_slices,
+                    "is_meio_a_meio": False,
+                    "last_update": pizza_slices[-1]["timestamp"]
+                })
+        return complete_pizzas, half_pizzas, leftovers
+
+    all_flavors = list(slices_by_flavor.values())
+    salgada_complete, salgada_halves, salgada_leftovers = process_flavor_group(
+        [f for f in all_flavors if f["type"] != "DOCE"])
+    doce_complete, doce_halves, doce_leftovers = process_flavor_group(
+        [f for f in all_flavors if f["type"] == "DOCE"])
+    all_halves = salgada_halves + doce_halves
+
+    def combinar(h1, h2):
+        return {
+            "id": f"combined-{h1['id']}-{h2['id']}",
+            "flavor_name": f"{h1['flavor_name']} / {h2['flavor_name']}",
+            "flavor_name1": h1["flavor_name"],
+            "flavor_name2": h2["flavor_name"],
+            "flavor_type1": h1["flavor_type"],
+            "flavor_type2": h2["flavor_type"],
+            "is_meio_a_meio": True,
+            "slices_count": 8,
+            "slices": h1["slices"] + h2["slices"],
+            "last_update": max(h1["last_update"], h2["last_update"])
+        }
+
+    paired_set = set()
+    paired_halves = []
+    unpaired_halves = []
+    for h1_id, h2_id in pairing_overrides.items():
+        h1 = next((h for h in all_halves if h["id"] == h1_id), None)
+        h2 = next((h for h in all_halves if h["id"] == h2_id), None)
+        if h1 and h2 and h1_id not in paired_set and h2_id not in paired_set:
+            paired_halves.append({**combinar(h1, h2), "half1_id": h1["id"], "half2_id": h2["id"]})
+            paired_set.add(h1_id)
+            paired_set.add(h2_id)
+
+    def auto_pair(halves):
+        for i in range(0, len(halves), 2):
+            if i + 1 < len(halves):
+                paired_halves.append(combinar(halves[i], halves[i + 1]))
+            else:
+                unpaired_halves.append({**halves[i], "is_meio_a_meio": False})
+
+    auto_pair([h for h in salgada_halves if h["id"] not in paired_set])
+    auto_pair([h for h in doce_halves if h["id"] not in paired_set])
+
+    final_pizzas = (
+        salgada_complete + doce_complete + paired_halves + unpaired_halves +
+        salgada_leftovers + doce_leftovers
+    )
+
+    for pizza in final_pizzas:
+        sti = sum(1 for s in pizza["slices"] if "STI" in (s.get("sector") or "").upper())
+        sgs = sum(1 for s in pizza["slices"] if "SGS" in (s.get("sector") or "").upper())
+        winner = "TIE"
+        if sti > sgs:
+            winner = "STI"
+        elif sgs > sti:
+            winner = "SGS"
+        if pizza["id"] in sector_overrides:
+            winner = sector_overrides[pizza["id"]]
+        pizza["sti_count"] = sti
+        pizza["sgs_count"] = sgs
+        pizza["winner"] = winner
+        pizza["is_complete"] = pizza["slices_count"] == 8
+
+    sti_pizzas = sorted([p for p in final_pizzas if p["winner"] == "STI"],
+                        key=lambda p: p["last_update"], reverse=True)
+    sgs_pizzas = sorted([p for p in final_pizzas if p["winner"] == "SGS"],
+                        key=lambda p: p["last_update"])
+
+    current_number = 1
+    for p in sti_pizzas:
+        if p["is_complete"]:
+            p["number"] = current_number
+            current_number += 1
+    for p in sgs_pizzas:
+        if p["is_complete"]:
+            p["number"] = current_number
+            current_number += 1
+
+    if number_overrides:
+        all_numbered = [p for p in sti_pizzas + sgs_pizzas if p.get("number")]
+        pizza_by_id = {p["id"]: p for p in all_numbered}
+        for pizza_id, desired_number in number_overrides.items():
+            pizza = pizza_by_id.get(pizza_id)
+            if not pizza:
+                continue
+            current_number = pizza.get("number")
+            if current_number == desired_number:
+                continue
+            conflicting = next((p for p in all_numbered
+                                if p["number"] == desired_number and p["id"] != pizza_id), None)
+            if conflicting:
+                conflicting["number"] = current_number
+            pizza["number"] = desired_number
+
+    numeros_por_usuario = {}
+    for pizza in sti_pizzas + sgs_pizzas:
+        num = pizza.get("number")
+        if not num:
+            continue
+        for s in pizza["slices"]:
+            numeros_por_usuario.setdefault(s["usuario_id"], {}).setdefault(s["item_id"], []).append(num)
+
+    return {
+        "pizzas": [_serializar_referencia(p) for p in final_pizzas],
+        "numeros_por_usuario": numeros_por_usuario
+    }
+
+
+def _serializar_referencia(pizza):
+    fatias = []
+    for s in pizza["slices"]:
+        if fatias and fatias[-1]["item_id"] == s["item_id"]:
+            fatias[-1]["quantidade"] += 1
+        else:
+            fatias.append({"item_id": s["item_id"], "usuario_id": s["usuario_id"], "quantidade": 1})
+    serializada = {
+        "id": pizza["id"],
+        "flavor_name": pizza["flavor_name"],
+        "is_meio_a_meio": pizza["is_meio_a_meio"],
+        "slices_count": pizza["slices_count"],
+        "is_complete": pizza["is_complete"],
+        "winner": pizza["winner"],
+        "sti_count": pizza["sti_count"],
+        "sgs_count": pizza["sgs_count"],
+        "number": pizza.get("number"),
+        "last_update": pizza["last_update"].isoformat(),
+        "fatias": fatias
+    }
+    for campo in ("flavor_type", "flavor_name1", "flavor_name2", "flavor_type1", "flavor_type2",
+                  "half1_id", "half2_id"):
+        if campo in pizza:
+            serializada[campo] = pizza[campo]
+    return serializada
+
+
+# ============================================
+# Geração de eventos aleatórios
+# ============================================
+
+class EventoAleatorio:
+    """Pedidos de um evento gerados por seed, com operações de delta."""
+
+    def __init__(self, rng, max_sabores=8, max_usuarios=12, max_pedacos=10):
+        self.rng = rng
+        self.max_pedacos = max_pedacos
+        n_sabores = rng.randint(1, max_sabores)
+        self.sabores = {
+            fid: {"nome": f"Sabor {fid}", "tipo": rng.choice(["SALGADA", "DOCE", None])}
+            for fid in range(1, n_sabores + 1)
+        }
+        self.usuarios = {
+            uid: rng.choice(SETORES) for uid in range(1, rng.randint(1, max_usuarios) + 1)
+        }
+        self.inicio = datetime(2026, 3, 1, 9, 0)
+        self.pedidos = {}
+        self._proximo_pedido = 1
+        self._proximo_item = 1
+
+    def _itens(self):
+        itens = []
+        for _ in range(self.rng.randint(1, 4)):
+            fid = self.rng.choice(list(self.sabores))
+            itens.append({
+                "item_id": self._proximo_item,
+                "sabor_id": fid,
+                "sabor_nome": self.sabores[fid]["nome"],
+                "sabor_tipo": self.sabores[fid]["tipo"],
+                "quantidade": self.rng.randint(1, self.max_pedacos)
+            })
+            self._proximo_item += 1
+        return itens
+
+    def criar(self):
+        pedido_id = self._proximo_pedido
+        self._proximo_pedido += 1
+        usuario_id = self.rng.choice(list(self.usuarios))
+        self.pedidos[pedido_id] = {
+            "usuario_id": usuario_id,
+            "setor": self.usuarios[usuario_id],
+            # Minutos repetidos de propósito: empates de data_pedido desempatam pelo ID
+            "data_pedido": self.inicio + timedelta(minutes=self.rng.randint(0, 60)),
+            "itens": self._itens()
+        }
+        return pedido_id
+
+    def editar(self):
+        pedido_id = self.rng.choice(list(self.pedidos))
+        self.pedidos[pedido_id]["itens"] = self._itens()
+        return pedido_id
+
+    def cancelar(self):
+        pedido_id = self.rng.choice(list(self.pedidos))
+        del self.pedidos[pedido_id]
+        return pedido_id
+
+    def linhas(self):
+        """Linhas no formato da query de itens do evento (ORDER BY data_pedido, pedido, item)."""
+        linhas = []
+        for pedido_id, pedido in self.pedidos.items():
+            for item in pedido["itens"]:
+                linhas.append({
+                    "ITEM_ID": item["item_id"],
+                    "SABOR_ID": item["sabor_id"],
+                    "SABOR_NOME": item["sabor_nome"],
+                    "SABOR_TIPO": item["sabor_tipo"],
+                    "QUANTIDADE": item["quantidade"],
+                    "PEDIDO_ID": pedido_id,
+                    "USUARIO_ID": pedido["usuario_id"],
+                    "DATA_PEDIDO": pedido["data_pedido"],
+                    "USUARIO_SETOR": pedido["setor"],
+                    "USUARIO_SETOR_CODIGO": calcular_setor_codigo(pedido["setor"], MAPEAMENTO_SETORES)
+                })
+        linhas.sort(key=lambda l: (l["DATA_PEDIDO"], l["PEDIDO_ID"], l["ITEM_ID"]))
+        return linhas
+
+    def overrides(self):
+        """Overrides aleatórios, incluindo IDs que não existem (devem ser ignorados)."""
+        rng = self.rng
+        fids = list(self.sabores) + [999]
+        meias = [f"{fid}-meia-0" for fid in fids]
+        pizzas = (
+            [f"{fid}-inteira-{i}" for fid in fids for i in range(3)] +
+            [f"{fid}-resto" for fid in fids] +
+            [f"combined-{a}-{b}" for a in meias for b in meias]
+        )
+        pairing = {rng.choice(meias): rng.choice(meias) for _ in range(rng.randint(0, 3))}
+        sector = {rng.choice(pizzas): rng.choice(["STI", "SGS"]) for _ in range(rng.randint(0, 4))}
+        number = {rng.choice(pizzas): rng.randint(1, 12) for _ in range(rng.randint(0, 4))}
+        return pairing, sector, number
+
+
+def _sem_relatorio(resultado):
+    return {k: v for k, v in resultado.items() if k != "overrides_invalidos"}
+
+
+# ============================================
+# Testes
+# ============================================
+
+def test_equivalencia_eventos_aleatorios():
+    for seed in range(300):
+        rng = random.Random(seed)
+        evento = EventoAleatorio(rng)
+        for _ in range(rng.randint(1, 25)):
+            evento.criar()
+        linhas = evento.linhas()
+        pairing, sector, number = evento.overrides()
+
+        esperado = calcular_alocacao_referencia(linhas, pairing, sector, number)
+        obtido = MotorAlocacao.a_partir_de_linhas(linhas).calcular(pairing, sector, number)
+
+        assert _sem_relatorio(obtido) == esperado, f"seed {seed}"
+
+
+def test_equivalencia_deltas():
+    for seed in range(200):
+        rng = random.Random(10_000 + seed)
+        evento = EventoAleatorio(rng)
+        motor = MotorAlocacao()
+
+        for passo in range(rng.randint(1, 40)):
+            sorteio = rng.random()
+            if sorteio < 0.6 or not evento.pedidos:
+                pedido_id = evento.criar()
+            elif sorteio < 0.85:
+                pedido_id = evento.editar()
+            else:
+                pedido_id = evento.cancelar()
+
+            if pedido_id in evento.pedidos:
+                pedido = evento.pedidos[pedido_id]
+                motor.aplicar_pedido(
+                    pedido_id, pedido["usuario_id"], calcular_setor_codigo(pedido["setor"], MAPEAMENTO_SETORES),
+                    pedido["data_pedido"], pedido["itens"]
+                )
+            else:
+                motor.remover_pedido(pedido_id)
+
+            pairing, sector, number = evento.overrides()
+            esperado = calcular_alocacao_referencia(evento.linhas(), pairing, sector, number)
+            obtido = motor.calcular(pairing, sector, number)
+
+            assert _sem_relatorio(obtido) == esperado, f"seed {seed}, passo {passo}"
+
+
+def test_reaplicar_pedido_idempotente():
+    rng = random.Random(7)
+    evento = EventoAleatorio(rng)
+    for _ in range(10):
+        evento.criar()
+    motor = MotorAlocacao.a_partir_de_linhas(evento.linhas())
+    antes = motor.calcular({}, {}, {})
+
+    for pedido_id, pedido in evento.pedidos.items():
+        motor.aplicar_pedido(
+            pedido_id, pedido["usuario_id"], calcular_setor_codigo(pedido["setor"], MAPEAMENTO_SETORES),
+            pedido["data_pedido"], pedido["itens"]
+        )
+
+    assert motor.calcular({}, {}, {}) == antes
+
+
+def test_overrides_invalidos():
+    motor = MotorAlocacao()
+    motor.aplicar_pedido(1, 1, SETOR_STI, datetime(2026, 3, 1, 9, 0), [
+        {"item_id": 1, "sabor_id": 1, "sabor_nome": "A", "sabor_tipo": None, "quantidade": 4},
+        {"item_id": 2, "sabor_id": 2, "sabor_nome": "B", "sabor_tipo": None, "quantidade": 4},
+        {"item_id": 3, "sabor_id": 3, "sabor_nome": "C", "sabor_tipo": None, "quantidade": 2},
+    ])
+
+    resultado = motor.calcular(
+        {"1-meia-0": "2-meia-0", "2-meia-0": "9-meia-0"},
+        {"3-resto": "SGS", "5-inteira-0": "STI"},
+        {"combined-1-meia-0-2-meia-0": 1, "3-resto": 2, "7-inteira-0": 3}
+    )
+
+    invalidos = {(o["tipo"], o["pizza_id"]) for o in resultado["overrides_invalidos"]}
+    assert invalidos == {
+        ("pairing", "9-meia-0"),
+        ("sector", "5-inteira-0"),
+        ("number", "3-resto"),
+        ("number", "7-inteira-0"),
+    }
+
+
+def _custo_total(metades, pares, sozinha):
+    custo = sum(
+        _custo(metades[i]["sti_count"] + metades[j]["sti_count"], metades[i]["sgs_count"] + metades[j]["sgs_count"])
+        for i, j in pares
+    )
+    if sozinha is not None:
+        custo += _custo(metades[sozinha]["sti_count"], metades[sozinha]["sgs_count"])
+    return custo
+
+
+def _melhor_custo_forca_bruta(metades):
+    n = len(metades)
+
+    def buscar(restantes, pode_sozinha):
+        if not restantes:
+            return 0
+        i, resto = restantes[0], restantes[1:]
+        melhor = None
+        for j in resto:
+            c = _custo_total(metades, [(i, j)], None) + buscar([k for k in resto if k != j], pode_sozinha)
+            melhor = c if melhor is None else min(melhor, c)
+        if pode_sozinha:
+            c = _custo_total(metades, [], i) + buscar(resto, False)
+            melhor = c if melhor is None else min(melhor, c)
+        return melhor
+
+    return buscar(list(range(n)), n % 2 == 1)
+
+
+def test_otimizador_otimo_em_instancias_pequenas():
+    rng = random.Random(123)
+    for _ in range(300):
+        metades = []
+        for _ in range(rng.randint(0, 9)):
+            pedacos = rng.randint(1, 4)
+            sti = rng.randint(0, pedacos)
+            metades.append({"sti_count": sti, "sgs_count": rng.randint(0, pedacos - sti)})
+
+        pares, sozinha, _, otimo = parear_metades(metades)
+
+        usadas = sorted([i for par in pares for i in par] + ([sozinha] if sozinha is not None else []))
+        assert usadas == list(range(len(metades)))
+        assert otimo
+        assert _custo_total(metades, pares, sozinha) == _melhor_custo_forca_bruta(metades)
+
+
+def test_otimizador_nunca_pior_que_guloso():
+    for seed in range(200):
+        rng = random.Random(20_000 + seed)
+        evento = EventoAleatorio(rng)
+        for _ in range(rng.randint(1, 25)):
+            evento.criar()
+        linhas = evento.linhas()
+        pairing, sector, number = evento.overrides()
+        motor = MotorAlocacao.a_partir_de_linhas(linhas)
+
+        guloso = motor.calcular(pairing, sector, number)
+        otimizado = motor.calcular(pairing, sector, number, otimizar=True)
+
+        # Os mesmos pedaços continuam alocados (só muda em que pizza ficam)
+        def pedacos_por_item(resultado):
+            pedacos = {}
+            for pizza in resultado["pizzas"]:
+                for fatia in pizza["fatias"]:
+                    pedacos[fatia["item_id"]] = pedacos.get(fatia["item_id"], 0) + fatia["quantidade"]
+            return pedacos
+
+        assert pedacos_por_item(otimizado) == pedacos_por_item(guloso), f"seed {seed}"
+
+        relatorio = otimizado["otimizacao"]
+        assert relatorio["pizzas_economizadas"] >= 0
+        assert len(guloso["pizzas"]) - len(otimizado["pizzas"]) == relatorio["pizzas_economizadas"], f"seed {seed}"
+        # O modo padrão não muda com o otimizador existindo
+        assert "otimizacao" not in guloso
+
+
+def test_otimizador_pareia_sobras():
+    motor = MotorAlocacao()
+    motor.aplicar_pedido(1, 1, SETOR_STI, datetime(2026, 3, 1, 9, 0), [
+        {"item_id": 1, "sabor_id": 1, "sabor_nome": "A", "sabor_tipo": None, "quantidade": 3},
+        {"item_id": 2, "sabor_id": 2, "sabor_nome": "B", "sabor_tipo": None, "quantidade": 3},
+    ])
+
+    guloso = motor.calcular({}, {}, {})
+    otimizado = motor.calcular({}, {}, {}, otimizar=True)
+
+    assert [p["id"] for p in guloso["pizzas"]] == ["1-resto", "2-resto"]
+    assert [p["id"] for p in otimizado["pizzas"]] == ["combined-1-resto-2-resto"]
+    pizza = otimizado["pizzas"][0]
+    assert pizza["is_meio_a_meio"] and pizza["slices_count"] == 6 and pizza["number"] == 1
+    assert otimizado["numeros_por_usuario"] == {1: {1: [1, 1, 1], 2: [1, 1, 1]}}
+    assert otimizado["otimizacao"]["pizzas_economizadas"] == 1
+
+
+# ============================================
+# Golden file
+# ============================================
+
+def _casos_golden():
+    casos = []
+    for seed in range(30):
+        rng = random.Random(50_000 + seed)
+        evento = EventoAleatorio(rng, max_sabores=6, max_usuarios=8)
+        for _ in range(rng.randint(1, 12)):
+            evento.criar()
+        pairing, sector, number = evento.overrides()
+        casos.append({
+            "seed": 50_000 + seed,
+            # O código do setor é derivado na leitura (_linhas_do_caso)
+            "linhas": [
+                {**{k: v for k, v in l.items() if k != "USUARIO_SETOR_CODIGO"},
+                 "DATA_PEDIDO": l["DATA_PEDIDO"].isoformat()}
+                for l in evento.linhas()
+            ],
+            "pairing_overrides": pairing,
+            "sector_overrides": sector,
+            "number_overrides": number
+        })
+    return casos
+
+
+def _linhas_do_caso(caso):
+    return [
+        {
+            **l,
+            "DATA_PEDIDO": datetime.fromisoformat(l["DATA_PEDIDO"]),
+            "USUARIO_SETOR_CODIGO": calcular_setor_codigo(l["USUARIO_SETOR"], MAPEAMENTO_SETORES)
+        }
+        for l in caso["linhas"]
+    ]
+
+
+def _normalizar_json(resultado):
+    """Mesma forma que o resultado terá depois de ida e volta por JSON."""
+    return json.loads(json.dumps(resultado))
+
+
+def regenerar_golden():
+    casos = _casos_golden()
+    for caso in casos:
+        caso["esperado"] = _normalizar_json(calcular_alocacao_referencia(
+            _linhas_do_caso(caso),
+            caso["pairing_overrides"],
+            caso["sector_overrides"],
+            caso["number_overrides"]
+        ))
+    with open(GOLDEN_PATH, "w", encoding="utf-8") as f:
+        # Um caso por linha: diffs do golden ficam legíveis por caso
+        f.write("[\n")
+        f.write(",\n".join(json.dumps(caso, ensure_ascii=False, sort_keys=True) for caso in casos))
+        f.write("\n]\n")
+    print(f"Golden regravado: {len(casos)} casos em {GOLDEN_PATH}")
+
+
+def test_golden():
+    with open(GOLDEN_PATH, encoding="utf-8") as f:
+        casos = json.load(f)
+
+    assert casos
+    for caso in casos:
+        obtido = MotorAlocacao.a_partir_de_linhas(_linhas_do_caso(caso)).calcular(
+            caso["pairing_overrides"], caso["sector_overrides"], caso["number_overrides"]
+        )
+        assert _normalizar_json(_sem_relatorio(obtido)) == caso["esperado"], f"seed {caso['seed']}"
+
+
+if __name__ == "__main__":
+    if "--regenerar-golden" in sys.argv:
+        regenerar_golden()
+        sys.exit(0)
+
+    testes = [
+        test_equivalencia_eventos_aleatorios,
+        test_equivalencia_deltas,
+        test_reaplicar_pedido_idempotente,
+        test_overrides_invalidos,
+        test_otimizador_otimo_em_instancias_pequenas,
+        test_otimizador_nunca_pior_que_guloso,
+        test_otimizador_pareia_sobras,
+        test_golden,
+    ]
+    falhas = 0
+    for teste in testes:
+        try:
+            teste()
+            print(f"✅ {teste.__name__}")
+        except AssertionError as e:
+            falhas += 1
+            print(f"❌ {teste.__name__}: {e}")
+    sys.exit(1 if falhas else 0)
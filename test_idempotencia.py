@@ -0,0 +1,199 @@
+"""
+Testes do store de Idempotency-Key (idempotencia.py)
+
+Cobre o reenvio (mesma resposta sem executar de novo), conflito de payload,
+chave em execução, liberação da chave em erro, expiração pelo TTL e o limite de
+IDEMPOTENCIA_MAX_CHAVES (que só descarta respostas concluídas, nunca as em execução).
+
+Não precisa de banco. O relógio (time.monotonic) é substituído por um fake.
+Rodar com:
+    python test_idempotencia.py
+Também roda via pytest (funções test_*).
+"""
+import asyncio
+import sys
+
+from fastapi import HTTPException
+
+import idempotencia
+from idempotencia import executar_idempotente
+
+
+class _Relogio:
+    """Substitui o módulo time dentro de idempotencia (só monotonic é usado)."""
+
+    def __init__(self):
+        self.agora = 1000.0
+
+    def monotonic(self):
+        return self.agora
+
+
+class _Ambiente:
+    """Store limpo, relógio fake e limite de chaves opcional; restaura tudo na saída."""
+
+    def __init__(self, max_chaves=None):
+        self.max_chaves = max_chaves
+        self.relogio = _Relogio()
+
+    def __enter__(self):
+        self._time = idempotencia.time
+        self._max = idempotencia.IDEMPOTENCIA_MAX_CHAVES
+        idempotencia.time = self.relogio
+        if self.max_chaves is not None:
+            idempotencia.IDEMPOTENCIA_MAX_CHAVES = self.max_chaves
+        idempotencia._store.clear()
+        return self
+
+    def __exit__(self, *args):
+        idempotencia.time = self._time
+        idempotencia.IDEMPOTENCIA_MAX_CHAVES = self._max
+        idempotencia._store.clear()
+
+
+def _contador():
+    """Corrotina de execução que conta as chamadas e responde com o número da chamada."""
+    chamadas = []
+
+    async def executar():
+        chamadas.append(1)
+        return {"execucao": len(chamadas)}
+
+    return executar, chamadas
+
+
+def _rodar(chave, executar, payload=None, usuario_id=1, escopo="pedido"):
+    return asyncio.run(
+        executar_idempotente(chave, usuario_id, escopo, payload or {"x": 1}, executar)
+    )
+
+
+def test_reenvio_devolve_resposta_guardada():
+    with _Ambiente():
+        executar, chamadas = _contador()
+        primeira = _rodar("k1", executar)
+        segunda = _rodar("k1", executar)
+        assert primeira == segunda == {"execucao": 1}
+        assert len(chamadas) == 1
+
+        # Sem chave, outro escopo ou outro usuário: executa de novo
+        _rodar(None, executar)
+        _rodar("k1", executar, escopo="voto")
+        _rodar("k1", executar, usuario_id=2)
+        assert len(chamadas) == 4
+
+
+def test_payload_diferente_e_422():
+    with _Ambiente():
+        executar, _ = _contador()
+        _rodar("k1", executar, payload={"x": 1})
+        try:
+            _rodar("k1", executar, payload={"x": 2})
+            assert False, "esperava 422"
+        except HTTPException as e:
+            assert e.status_code == 422
+
+
+def test_chave_em_execucao_e_409():
+    with _Ambiente():
+        status_reenvio = []
+
+        async def executar():
+            # Reenvio chegando enquanto a primeira execução ainda roda
+            try:
+                await executar_idempotente("k1", 1, "pedido", {"x": 1}, executar)
+            except HTTPException as e:
+                status_reenvio.append(e.status_code)
+            return {"ok": True}
+
+        assert _rodar("k1", executar) == {"ok": True}
+        assert status_reenvio == [409]
+
+
+def test_erro_libera_chave():
+    with _Ambiente():
+        async def falhar():
+            raise HTTPException(status_code=400, detail="erro")
+
+        try:
+            _rodar("k1", falhar)
+            assert False, "esperava 400"
+        except HTTPException as e:
+            assert e.status_code == 400
+
+        executar, chamadas = _contador()
+        assert _rodar("k1", executar) == {"execucao": 1}
+        assert len(chamadas) == 1
+
+
+def test_expiracao_pelo_ttl():
+    with _Ambiente() as ambiente:
+        executar, chamadas = _contador()
+        _rodar("k1", executar)
+
+        ambiente.relogio.agora += idempotencia.IDEMPOTENCIA_TTL_SEGUNDOS - 1
+        assert _rodar("k1", executar) == {"execucao": 1}
+
+        ambiente.relogio.agora += 1
+        assert _rodar("k1", executar) == {"execucao": 2}
+        assert len(chamadas) == 2
+
+
+def test_limite_descarta_as_mais_antigas():
+    with _Ambiente(max_chaves=3):
+        executar, chamadas = _contador()
+        for n in range(5):
+            _rodar(f"k{n}", executar)
+        # A limpeza roda na reserva: a 5ª chave ainda conta enquanto é reservada
+        assert len(idempotencia._store) <= 4
+
+        _rodar("k4", executar)
+        assert len(chamadas) == 5
+        _rodar("k0", executar)
+        assert len(chamadas) == 6
+
+
+def test_limite_nunca_descarta_chave_em_execucao():
+    with _Ambiente(max_chaves=2):
+        outras, _ = _contador()
+        reenvios = []
+
+        async def executar_lento():
+            # Enquanto k0 executa, outras chaves estouram o limite várias vezes
+            for n in range(1, 6):
+                await executar_idempotente(f"k{n}", 1, "pedido", {"x": 1}, outras)
+            assert "k0" in [chave for _, _, chave in idempotencia._store]
+            try:
+                await executar_idempotente("k0", 1, "pedido", {"x": 1}, executar_lento)
+            except HTTPException as e:
+                reenvios.append(e.status_code)
+            return {"lenta": True}
+
+        assert _rodar("k0", executar_lento) == {"lenta": True}
+        assert reenvios == [409]
+
+        # A resposta da execução longa ficou guardada para o próximo reenvio
+        executar, chamadas = _contador()
+        assert _rodar("k0", executar) == {"lenta": True}
+        assert chamadas == []
+
+
+if __name__ == "__main__":
+    testes = [
+        test_reenvio_devolve_resposta_guardada,
+        test_payload_diferente_e_422,
+        test_chave_em_execucao_e_409,
+        test_erro_libera_chave,
+        test_expiracao_pelo_ttl,
+        test_limite_descarta_as_mais_antigas,
+        test_limite_nunca_descarta_chave_em_execucao,
+    ]
+    falhas = 0
+    for teste in testes:
+        try:
+            teste()
+            print(f"✅ {teste.__name__}")
+        except AssertionError as e:
+            falhas += 1
+            print(f"❌ {teste.__name__}: {e}")
+    sys.exit(1 if falhas else 0)
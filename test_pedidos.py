@@ -0,0 +1,183 @@
+"""
+Testes da edição de pedidos por diferença (routes_pedidos.py)
+
+Cobre _calcular_diff_itens (quais itens gravados são mantidos, atualizados,
+inseridos ou removidos) e _montar_edicao (o statement único da edição, ou
+nenhum quando nada mudou), incluindo a comparação de valores com _mesmo_valor.
+
+Não precisa de banco (o statement é só montado). Rodar com:
+    python test_pedidos.py
+Também roda via pytest (funções test_*).
+"""
+import os
+import sys
+from decimal import Decimal
+
+# config.Settings exige as variáveis no import; nenhuma conexão é aberta
+os.environ.setdefault("DATABASE_URL", "postgresql://localhost/teste")
+os.environ.setdefault("SECRET_KEY", "teste")
+
+from routes_pedidos import _calcular_diff_itens, _montar_edicao, _mesmo_valor
+
+
+def _gravado(item_id, sabor_id, quantidade, preco="5.00"):
+    """Item como lido por _travar_itens_pedido (preço NUMERIC do banco)."""
+    return {"id": item_id, "sabor_id": sabor_id, "quantidade": quantidade,
+            "preco_unitario": Decimal(preco)}
+
+
+def _pedido(sabor_id, quantidade, preco=5.0):
+    """Item como sai de _validar_e_precificar_itens."""
+    return {"sabor_id": sabor_id, "quantidade": quantidade,
+            "preco_unitario": preco, "subtotal": round(preco * quantidade, 2)}
+
+
+def _deltas_sabores(params):
+    """{sabor_id: delta} enviados ao upsert de evento_sabores_totais."""
+    return {
+        params[nome]: params[nome[:-len("_sabor")] + "_delta"]
+        for nome in params if nome.startswith("tot_") and nome.endswith("_sabor")
+    }
+
+
+def test_sem_alteracao():
+    atuais = [_gravado(10, 1, 4), _gravado(11, 2, 2)]
+    novos = [_pedido(1, 4), _pedido(2, 2)]
+
+    item_ids, atualizar, inserir, remover = _calcular_diff_itens(atuais, novos)
+    assert (item_ids, atualizar, inserir, remover) == ([10, 11], [], [], [])
+
+    item_ids, statement, params, inserir = _montar_edicao(
+        1, 7, (Decimal("30.00"), Decimal("0.00"), atuais), novos, 30.0, 0.0
+    )
+    assert item_ids == [10, 11]
+    assert statement is None and params is None and inserir == []
+
+
+def test_diff_vazio():
+    assert _calcular_diff_itens([], []) == ([], [], [], [])
+
+    _, statement, _, _ = _montar_edicao(1, 7, (Decimal("0"), Decimal("0"), []), [], 0, 0)
+    assert statement is None
+
+
+def test_quantidade_alterada():
+    atuais = [_gravado(10, 1, 4), _gravado(11, 2, 2)]
+    novos = [_pedido(1, 6), _pedido(2, 2)]
+
+    item_ids, atualizar, inserir, remover = _calcular_diff_itens(atuais, novos)
+    assert item_ids == [10, 11]
+    assert atualizar == [(10, novos[0])]
+    assert inserir == [] and remover == []
+
+    _, statement, params, inserir = _montar_edicao(
+        1, 7, (Decimal("30.00"), Decimal("0.00"), atuais), novos, 40.0, 0.0
+    )
+    assert "versao_evento AS" in statement and "atualizados AS" in statement
+    assert "removidos AS" not in statement and "INSERT INTO itens_pedido" not in statement
+    assert (params["upd_0_id"], params["upd_0_qtd"]) == (10, 6)
+    # +2 pedaços do sabor 1 nos totais
+    assert _deltas_sabores(params) == {1: 2}
+
+
+def test_sabor_removido():
+    atuais = [_gravado(10, 1, 4), _gravado(11, 2, 2)]
+    novos = [_pedido(1, 4)]
+
+    item_ids, atualizar, inserir, remover = _calcular_diff_itens(atuais, novos)
+    assert (item_ids, atualizar, inserir, remover) == ([10], [], [], [11])
+
+    _, statement, params, inserir = _montar_edicao(
+        1, 7, (Decimal("30.00"), Decimal("0.00"), atuais), novos, 20.0, 0.0
+    )
+    assert "removidos AS" in statement and params["rem_0"] == 11
+    assert _deltas_sabores(params) == {2: -2}
+    assert inserir == []
+
+
+def test_sabor_adicionado():
+    atuais = [_gravado(10, 1, 4)]
+    novos = [_pedido(1, 4), _pedido(3, 1)]
+
+    item_ids, atualizar, inserir, remover = _calcular_diff_itens(atuais, novos)
+    assert (item_ids, atualizar, inserir, remover) == ([10, None], [], [1], [])
+
+    _, statement, params, inserir = _montar_edicao(
+        1, 7, (Decimal("20.00"), Decimal("0.00"), atuais), novos, 25.0, 0.0
+    )
+    # INSERT no statement principal, UPDATE do pedido como CTE
+    assert "pedido_atualizado AS" in statement
+    assert "INSERT INTO itens_pedido" in statement and "RETURNING id, sabor_id, quantidade" in statement
+    assert (params["ins_0_sabor"], params["ins_0_qtd"]) == (3, 1)
+    assert _deltas_sabores(params) == {3: 1}
+    assert inserir == [1]
+
+
+def test_reaproveita_item_identico_antes():
+    # Dois itens do mesmo sabor: o de quantidade igual é mantido, o outro é atualizado
+    atuais = [_gravado(10, 1, 2), _gravado(11, 1, 4)]
+    novos = [_pedido(1, 4), _pedido(1, 3)]
+
+    item_ids, atualizar, inserir, remover = _calcular_diff_itens(atuais, novos)
+    assert item_ids == [11, 10]
+    assert atualizar == [(10, novos[1])]
+    assert inserir == [] and remover == []
+
+
+def test_arredondamento_de_preco():
+    assert _mesmo_valor(Decimal("5.00"), 5.0)
+    assert _mesmo_valor(Decimal("5.00"), 4.999)
+    assert not _mesmo_valor(Decimal("5.00"), 5.01)
+
+    # Preço gravado como NUMERIC(10,2) e recalculado em float: não é alteração
+    atuais = [_gravado(10, 1, 3, "3.33")]
+    novos = [_pedido(1, 3, 10 / 3)]
+    assert _calcular_diff_itens(atuais, novos) == ([10], [], [], [])
+    _, statement, _, _ = _montar_edicao(
+        1, 7, (Decimal("10.00"), Decimal("0.00"), atuais), novos, 9.999, 0.0
+    )
+    assert statement is None
+
+    # Preço realmente diferente vira UPDATE, sem delta de pedaços
+    novos = [_pedido(1, 3, 3.5)]
+    _, atualizar, _, _ = _calcular_diff_itens(atuais, novos)
+    assert atualizar == [(10, novos[0])]
+    _, statement, params, _ = _montar_edicao(
+        1, 7, (Decimal("10.00"), Decimal("0.00"), atuais), novos, 10.5, 0.0
+    )
+    assert "atualizados AS" in statement and "totais_sabores AS" not in statement
+
+
+def test_so_valor_alterado():
+    # Itens iguais, frete diferente: grava só o pedido (e a versão do evento)
+    atuais = [_gravado(10, 1, 4)]
+    novos = [_pedido(1, 4)]
+    _, statement, params, inserir = _montar_edicao(
+        1, 7, (Decimal("20.00"), Decimal("0.00"), atuais), novos, 20.0, 2.5
+    )
+    assert statement is not None and inserir == []
+    assert "UPDATE pedidos SET" in statement
+    assert "atualizados AS" not in statement and "removidos AS" not in statement
+    assert params["valor_frete"] == 2.5
+
+
+if __name__ == "__main__":
+    testes = [
+        test_sem_alteracao,
+        test_diff_vazio,
+        test_quantidade_alterada,
+        test_sabor_removido,
+        test_sabor_adicionado,
+        test_reaproveita_item_identico_antes,
+        test_arredondamento_de_preco,
+        test_so_valor_alterado,
+    ]
+    falhas = 0
+    for teste in testes:
+        try:
+            teste()
+            print(f"✅ {teste.__name__}")
+        except AssertionError as e:
+            falhas += 1
+            print(f"❌ {teste.__name__}: {e}")
+    sys.exit(1 if falhas else 0)
@@ -0,0 +1,155 @@
+"""
+Testes da leitura do relatório de pagamento materializado (relatorios_pagamento.py)
+
+obter_relatorio_usuario serve o documento salvo enquanto a versão da alocação
+(versao_pedidos, updated_at da config e catálogo) não muda, e o regenera na
+leitura quando ela muda (ex.: uma edição de pedido). Status do pedido e
+nome/setor do usuário são sobrepostos sem regenerar.
+
+Não precisa de banco: a linha lida e o gerador são substituídos por fakes
+que guardam o "documento salvo" em memória. Rodar com:
+    python test_relatorios.py
+Também roda via pytest (funções test_*).
+"""
+import copy
+import os
+import sys
+from datetime import datetime
+
+# config.Settings exige as variáveis no import; nenhuma conexão é aberta
+os.environ.setdefault("DATABASE_URL", "postgresql://localhost/teste")
+os.environ.setdefault("SECRET_KEY", "teste")
+
+import relatorios_pagamento
+from alocacao_evento import montar_versao
+
+
+class _Banco:
+    """Estado do evento + relatório salvo; substitui execute_query e gerar_documentos."""
+
+    def __init__(self):
+        self.versao_pedidos = 3
+        self.config_atualizada_em = datetime(2026, 1, 1, 12, 0)
+        self.catalogo = "abc"
+        self.pedido_status = "PENDENTE"
+        self.nome = "Ana"
+        self.relatorio_versao = None
+        self.documento = None
+        self.geracoes = 0
+
+    def versao(self):
+        return montar_versao(self.versao_pedidos, self.config_atualizada_em, self.catalogo)
+
+    def execute_query(self, query, params=None, fetch_one=False, **kwargs):
+        assert fetch_one
+        return {
+            "ID": params["evento_id"], "NOME": "Pizzada", "PAGAMENTO_LIBERADO": True,
+            "VERSAO_PEDIDOS": self.versao_pedidos,
+            "CONFIG_ATUALIZADA_EM": self.config_atualizada_em,
+            "CATALOGO": self.catalogo,
+            "PEDIDO_ID": 10, "PEDIDO_STATUS": self.pedido_status,
+            "NOME_COMPLETO": self.nome, "SETOR": "STI", "SETOR_CODIGO": 1,
+            "RELATORIO_VERSAO": self.relatorio_versao,
+            # jsonb volta como dict novo a cada leitura
+            "DOCUMENTO": copy.deepcopy(self.documento),
+        }
+
+    def gerar_documentos(self, evento_id, usuario_id=None):
+        self.geracoes += 1
+        documento = {
+            "pedido": {"id": 10, "status": self.pedido_status, "usuario_nome": self.nome,
+                       "itens": [{"id": 1, "pizza_numeros": [self.versao_pedidos]}]},
+            "geracao": self.geracoes,
+        }
+        self.relatorio_versao = self.versao()
+        self.documento = copy.deepcopy(documento)
+        return {usuario_id: documento}
+
+
+class _Ambiente:
+    def __enter__(self):
+        self.banco = _Banco()
+        self._originais = (relatorios_pagamento.execute_query, relatorios_pagamento.gerar_documentos)
+        relatorios_pagamento.execute_query = self.banco.execute_query
+        relatorios_pagamento.gerar_documentos = self.banco.gerar_documentos
+        return self.banco
+
+    def __exit__(self, *args):
+        relatorios_pagamento.execute_query, relatorios_pagamento.gerar_documentos = self._originais
+
+
+def _ler():
+    return relatorios_pagamento.obter_relatorio_usuario(1, 7)[1]
+
+
+def test_documento_salvo_servido_sem_regenerar():
+    with _Ambiente() as banco:
+        primeiro = _ler()
+        assert banco.geracoes == 1
+
+        salvo = copy.deepcopy(banco.documento)
+        segundo = _ler()
+        assert banco.geracoes == 1
+        assert segundo["geracao"] == 1
+        # Igual ao salvo, a menos dos campos sobrepostos na leitura (aqui sem mudança)
+        for campo in ("status", "usuario_nome"):
+            assert segundo["pedido"][campo] == salvo["pedido"][campo]
+        assert segundo["pedido"]["itens"] == salvo["pedido"]["itens"]
+        assert segundo["pedido"]["usuario_setor"] == "STI"
+        assert segundo["pedido"]["usuario_setor_codigo"] == 1
+        assert primeiro["pedido"]["itens"] == segundo["pedido"]["itens"]
+
+
+def test_regenerado_depois_de_edicao():
+    with _Ambiente() as banco:
+        _ler()
+        # Edição de pedido no evento: versao_pedidos muda, números podem mudar
+        banco.versao_pedidos += 1
+        documento = _ler()
+        assert banco.geracoes == 2
+        assert documento["geracao"] == 2
+        assert documento["pedido"]["itens"][0]["pizza_numeros"] == [4]
+
+        # A versão regenerada foi gravada: a próxima leitura usa o salvo
+        _ler()
+        assert banco.geracoes == 2
+
+
+def test_regenerado_quando_config_ou_catalogo_mudam():
+    with _Ambiente() as banco:
+        _ler()
+        banco.config_atualizada_em = datetime(2026, 1, 2, 8, 30)
+        _ler()
+        assert banco.geracoes == 2
+        banco.catalogo = "def"
+        _ler()
+        assert banco.geracoes == 3
+
+
+def test_status_e_nome_sobrepostos_sem_regenerar():
+    with _Ambiente() as banco:
+        _ler()
+        banco.pedido_status = "PAGO"
+        banco.nome = "Ana Maria"
+        documento = _ler()
+        assert banco.geracoes == 1
+        assert documento["pedido"]["status"] == "PAGO"
+        assert documento["pedido"]["usuario_nome"] == "Ana Maria"
+
+
+if __name__ == "__main__":
+    testes = [
+        test_documento_salvo_servido_sem_regenerar,
+        test_regenerado_depois_de_edicao,
+        test_regenerado_quando_config_ou_catalogo_mudam,
+        test_status_e_nome_sobrepostos_sem_regenerar,
+    ]
+    falhas = 0
+    for teste in testes:
+        try:
+            teste()
+            print(f"✅ {teste.__name__}")
+        except AssertionError as e:
+            falhas += 1
+            print(f"❌ {teste.__name__}: {e}")
+    sys.exit(1 if falhas else 0)
@@ -0,0 +1,267 @@
+"""
+Totais do evento mantidos incrementalmente para o dashboard.
+
+- evento_sabores_totais: pedaços por sabor em cada evento
+- eventos.total_participantes / total_pedidos / valor_total_pedidos
+
+As escritas de pedidos (criar, editar, cancelar) atualizam os totais na mesma
+transação, com o mesmo UPDATE em eventos que incrementa versao_pedidos. O
+dashboard lê algumas dezenas de linhas pré-agregadas em vez de somar
+itens_pedido a cada polling.
+
+Ordem dos locks: toda escrita atualiza a linha do evento antes de
+evento_sabores_totais, e a reconciliação também trava o evento primeiro.
+
+reconciliar_totais recalcula tudo a partir de pedidos/itens_pedido e corrige
+eventuais desvios (escritas fora da API, pedidos duplicados por corrida, etc.).
+No startup só roda para os eventos abertos ou ainda sem totais; os demais são
+reparados sob demanda (POST /dashboard/evento/{id}/reconciliar-totais).
+"""
+from database import get_db_connection
+
+
+def somar_pedacos_por_sabor(itens, sinal: int = 1) -> dict:
+    """{sabor_id: pedaços} de uma lista de itens (dicts com sabor_id e quantidade)."""
+    deltas = {}
+    for item in itens:
+        deltas[item["sabor_id"]] = deltas.get(item["sabor_id"], 0) + sinal * item["quantidade"]
+    return deltas
+
+
+def montar_upsert_sabores(deltas: dict, params: dict, condicao: str = "") -> str:
+    """SQL que soma `deltas` ({sabor_id: pedaços}) em evento_sabores_totais.
+
+    Usa :evento_id e acrescenta os parâmetros em `params`. `condicao` permite
+    amarrar o statement a um CTE (ex.: só depois de travar o evento).
+    Retorna "" se não há delta diferente de zero.
+    """
+    valores = []
+    for n, (sabor_id, delta) in enumerate(sorted(deltas.items())):
+        if not delta:
+            continue
+        params[f"tot_{n}_sabor"] = sabor_id
+        params[f"tot_{n}_delta"] = delta
+        valores.append(f"(CAST(:tot_{n}_sabor AS INTEGER), CAST(:tot_{n}_delta AS INTEGER))")
+    if not valores:
+        return ""
+    filtro = f"WHERE {condicao}" if condicao else ""
+    return f"""
+        INSERT INTO evento_sabores_totais (evento_id, sabor_id, total_pedacos)
+        SELECT :evento_id, v.sabor_id, v.delta
+        FROM (VALUES {', '.join(valores)}) AS v(sabor_id, delta)
+        {filtro}
+        ON CONFLICT (evento_id, sabor_id) DO UPDATE
+        SET total_pedacos = evento_sabores_totais.total_pedacos + EXCLUDED.total_pedacos
+    """
+
+
+def registrar_novo_pedido(cursor, evento_id: int, usuario_id: int, valor: float, itens,
+                          aberto_em=None) -> int:
+    """Totais de um pedido novo (chamar antes do INSERT do pedido, na mesma transação).
+
+    Incrementa versao_pedidos e retorna a nova versão, como incrementar_versao_pedidos.
+    Com `aberto_em` (agora, naive de São Paulo) o UPDATE só acontece se o evento
+    estiver ABERTO e dentro da data_limite nesse instante: retorna None caso
+    contrário, e o banco é quem decide (o registro em memória pode estar atrasado).
+    """
+    condicao_aberto = (
+        "AND status = 'ABERTO' AND data_limite >= :aberto_em" if aberto_em is not None else ""
+    )
+    params = {"evento_id": evento_id, "usuario_id": usuario_id, "valor": valor}
+    if aberto_em is not None:
+        params["aberto_em"] = aberto_em
+    cursor.execute(
+        f"""
+        UPDATE eventos
+        SET versao_pedidos = versao_pedidos + 1,
+            total_pedidos = total_pedidos + 1,
+            total_participantes = total_participantes + CASE
+                WHEN EXISTS (
+                    SELECT 1 FROM pedidos WHERE evento_id = :evento_id AND usuario_id = :usuario_id
+                ) THEN 0 ELSE 1 END,
+            valor_total_pedidos = valor_total_pedidos + :valor
+        WHERE id = :evento_id {condicao_aberto}
+        RETURNING versao_pedidos
+        """,
+        params
+    )
+    row = cursor.fetchone()
+    if row is None:
+        return None
+
+    params = {"evento_id": evento_id}
+    upsert = montar_upsert_sabores(somar_pedacos_por_sabor(itens), params)
+    if upsert:
+        cursor.execute(upsert, params)
+    return row[0]
+
+
+def registrar_cancelamento(cursor, pedido_id: int):
+    """Remove um pedido (itens vão junto) e o desconta dos totais.
+
+    O desconto sai do DELETE ... RETURNING: com dois cancelamentos simultâneos,
+    só o que de fato removeu a linha desconta.
+    Retorna (evento_id, versao_pedidos) ou None se o pedido não existe mais.
+    """
+    # Trava o evento antes de pedidos/totais (mesma ordem das outras escritas)
+    cursor.execute(
+        """
+        SELECT e.id FROM eventos e
+        JOIN pedidos p ON p.evento_id = e.id
+        WHERE p.id = :pedido_id
+        FOR UPDATE OF e
+        """,
+        {"pedido_id": pedido_id}
+    )
+    evento = cursor.fetchone()
+    if not evento:
+        return None
+
+    # Com o evento travado, um cancelamento concorrente que chegou antes já
+    # commitou: o DELETE não encontra a linha e nada é descontado
+    cursor.execute(
+        """
+        WITH pedido AS (
+            DELETE FROM pedidos WHERE id = :pedido_id AND evento_id = :evento_id
+            RETURNING id, evento_id, usuario_id, valor_total + valor_frete AS valor
+        ),
+        itens_removidos AS (
+            DELETE FROM itens_pedido WHERE pedido_id IN (SELECT id FROM pedido)
+            RETURNING sabor_id, quantidade
+        ),
+        sabores AS (
+            UPDATE evento_sabores_totais t
+            SET total_pedacos = t.total_pedacos - r.quantidade
+            FROM (
+                SELECT sabor_id, SUM(quantidade) AS quantidade
+                FROM itens_removidos
+                GROUP BY sabor_id
+            ) r
+            WHERE t.evento_id = :evento_id AND t.sabor_id = r.sabor_id
+        )
+        UPDATE eventos e
+        SET versao_pedidos = e.versao_pedidos + 1,
+            total_pedidos = e.total_pedidos - 1,
+            total_participantes = e.total_participantes - CASE
+                WHEN EXISTS (
+                    SELECT 1 FROM pedidos o
+                    WHERE o.evento_id = p.evento_id AND o.usuario_id = p.usuario_id AND o.id <> p.id
+                ) THEN 0 ELSE 1 END,
+            valor_total_pedidos = e.valor_total_pedidos - p.valor
+        FROM pedido p
+        WHERE e.id = p.evento_id
+        RETURNING e.id, e.versao_pedidos
+        """,
+        {"pedido_id": pedido_id, "evento_id": evento[0]}
+    )
+    removido = cursor.fetchone()
+    if not removido:
+        return None
+    return removido[0], removido[1]
+
+
+def reconciliar_totais(evento_id: int = None, somente_pendentes: bool = False) -> int:
+    """Recalcula os totais a partir de pedidos/itens_pedido (um evento ou todos).
+
+    `somente_pendentes` (startup) limita aos eventos ABERTOS e aos que têm pedidos
+    com totais ainda zerados (colunas recém-criadas), sem travar o histórico
+    inteiro; eventos fechados são reparados pelo endpoint de admin.
+    Retorna quantos eventos tinham totais divergentes.
+    """
+    if evento_id is not None:
+        filtro = "WHERE e.id = :evento_id"
+    elif somente_pendentes:
+        filtro = """WHERE e.status = 'ABERTO'
+               OR (e.total_pedidos = 0 AND EXISTS (SELECT 1 FROM pedidos p WHERE p.evento_id = e.id))"""
+    else:
+        filtro = ""
+    params = {"evento_id": evento_id} if evento_id is not None else {}
+
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+
+        # Trava os eventos antes dos totais por sabor (mesma ordem das escritas)
+        cursor.execute(f"SELECT e.id FROM eventos e {filtro} ORDER BY e.id FOR UPDATE", params)
+        eventos = [row[0] for row in cursor.fetchall()]
+        if not eventos:
+            conn.rollback()
+            cursor.close()
+            return 0
+
+        # Daqui em diante só os eventos travados
+        params = {"eventos": eventos}
+
+        cursor.execute(
+            """
+            WITH reais AS (
+                SELECT e.id,
+                       COUNT(DISTINCT p.usuario_id) AS participantes,
+                       COUNT(p.id) AS pedidos,
+                       COALESCE(SUM(p.valor_total + p.valor_frete), 0) AS valor
+                FROM eventos e
+                LEFT JOIN pedidos p ON p.evento_id = e.id
+                WHERE e.id = ANY(:eventos)
+                GROUP BY e.id
+            )
+            UPDATE eventos e
+            SET total_participantes = r.participantes,
+                total_pedidos = r.pedidos,
+                valor_total_pedidos = r.valor
+            FROM reais r
+            WHERE e.id = r.id
+              AND (e.total_participantes <> r.participantes
+                   OR e.total_pedidos <> r.pedidos
+                   OR e.valor_total_pedidos <> r.valor)
+            RETURNING e.id
+            """,
+            params
+        )
+        divergentes = {row[0] for row in cursor.fetchall()}
+
+        cursor.execute(
+            """
+            WITH reais AS (
+                SELECT p.evento_id, ip.sabor_id, SUM(ip.quantidade) AS total_pedacos
+                FROM pedidos p
+                JOIN itens_pedido ip ON ip.pedido_id = p.id
+                WHERE p.evento_id = ANY(:eventos)
+                GROUP BY p.evento_id, ip.sabor_id
+            ),
+            sobrando AS (
+                DELETE FROM evento_sabores_totais t
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM reais r WHERE r.evento_id = t.evento_id AND r.sabor_id = t.sabor_id
+                ) AND t.evento_id = ANY(:eventos)
+                RETURNING t.evento_id, t.total_pedacos
+            ),
+            gravados AS (
+                INSERT INTO evento_sabores_totais (evento_id, sabor_id, total_pedacos)
+                SELECT r.evento_id, r.sabor_id, r.total_pedacos FROM reais r
+                ON CONFLICT (evento_id, sabor_id) DO UPDATE
+                SET total_pedacos = EXCLUDED.total_pedacos
+                WHERE evento_sabores_totais.total_pedacos <> EXCLUDED.total_pedacos
+                RETURNING evento_sabores_totais.evento_id
+            )
+            -- Linhas zeradas (sabor removido de todos os pedidos) saem sem contar como desvio
+            SELECT evento_id FROM sobrando WHERE total_pedacos <> 0
+            UNION SELECT evento_id FROM gravados
+            """,
+            params
+        )
+        divergentes.update(row[0] for row in cursor.fetchall())
+
+        conn.commit()
+        cursor.close()
+
+    return len(divergentes)
+
+
+def reconciliar_totais_evento(evento_id: int):
+    """Job em background/startup: reconciliação que não derruba quem chamou."""
+    try:
+        divergentes = reconciliar_totais(evento_id)
+        if divergentes:
+            print(f"[TOTAIS] {divergentes} evento(s) com totais corrigidos")
+    except Exception as e:
+        print(f"[TOTAIS] Erro ao reconciliar totais (ignorado): {e}")
+
@@ -0,0 +1,43 @@
+"""
+Contagem de votos por escolha mantida incrementalmente (votacao_escolhas.total_votos).
+
+O statement de votar (routes_votacoes.VOTAR_QUERY) atualiza o contador junto
+com o insert/troca da linha em votos, então os resultados saem das escolhas (no
+máximo 4 linhas por votação) em vez de um COUNT ... GROUP BY sobre votos a cada
+leitura.
+
+reconciliar_votos recalcula os contadores a partir de votos e corrige eventuais
+desvios (escritas fora da API, restauração de backup, etc.).
+"""
+from database import get_db_connection
+
+
+def reconciliar_votos(votacao_id: int = None) -> int:
+    """Recalcula total_votos a partir de votos (uma votação ou todas).
+
+    Retorna quantas escolhas tinham contador divergente.
+    """
+    filtro = "AND e.votacao_id = :votacao_id" if votacao_id is not None else ""
+    params = {"votacao_id": votacao_id} if votacao_id is not None else {}
+
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"""
+            UPDATE votacao_escolhas e
+            SET total_votos = r.total
+            FROM (
+                SELECT e2.id, COUNT(vt.id) AS total
+                FROM votacao_escolhas e2
+                LEFT JOIN votos vt ON vt.escolha_id = e2.id
+                GROUP BY e2.id
+            ) r
+            WHERE e.id = r.id AND e.total_votos <> r.total {filtro}
+            """,
+            params
+        )
+        divergentes = cursor.rowcount
+        conn.commit()
+        cursor.close()
+
+    return divergentes
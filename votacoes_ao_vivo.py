@@ -0,0 +1,105 @@
+"""
+Resultados ao vivo das votações abertas (Server-Sent Events).
+
+Um placar compartilhado nesta instância (barramento.Difusor no tópico
+"votacoes"): a cada rajada de votos espera INTERVALO_DIFUSAO segundos,
+recalcula o placar uma vez (contadores de votacao_escolhas, sem COUNT sobre
+votos) e difunde só as votações que mudaram para todos os clientes.
+
+Votos registrados em outra instância não passam pelo barramento desta: sem
+mensagens, o placar é recalculado a cada INTERVALO_VERIFICACAO segundos
+(uma consulta por instância, não por cliente). Isso também tira do placar as
+votações que passaram da data_limite.
+"""
+from datetime import datetime
+
+import barramento
+from database import execute_query, SAO_PAULO_TZ
+
+INTERVALO_VERIFICACAO = 10
+# Uma difusão por intervalo, por maior que seja a rajada de votos
+INTERVALO_DIFUSAO = 1.0
+
+PLACAR_QUERY = """
+    SELECT v.id, v.titulo, v.data_limite,
+           e.id as escolha_id, e.texto, e.ordem, e.total_votos as votos
+    FROM votacoes v
+    JOIN votacao_escolhas e ON e.votacao_id = v.id
+    WHERE v.status = 'ABERTO'
+    AND v.data_abertura <= :now
+    AND v.data_limite > :now
+    ORDER BY v.data_criacao DESC, e.ordem
+"""
+
+def montar_placar() -> dict:
+    """{votacao_id: resultado} das votações abertas, com contagem e porcentagem por escolha."""
+    now = datetime.now(SAO_PAULO_TZ).replace(tzinfo=None)
+    rows = execute_query(PLACAR_QUERY, {"now": now})
+
+    votacoes = {}
+    for row in rows:
+        votacao = votacoes.setdefault(row["ID"], {
+            "id": row["ID"],
+            "titulo": row["TITULO"],
+            "data_limite": row["DATA_LIMITE"].isoformat(),
+            "total_votos": 0,
+            "escolhas": []
+        })
+        votacao["escolhas"].append({
+            "id": row["ESCOLHA_ID"],
+            "texto": row["TEXTO"],
+            "ordem": row["ORDEM"],
+            "votos": row["VOTOS"]
+        })
+        votacao["total_votos"] += row["VOTOS"]
+
+    for votacao in votacoes.values():
+        total = votacao["total_votos"]
+        for escolha in votacao["escolhas"]:
+            escolha["porcentagem"] = round(escolha["votos"] / total * 100, 1) if total > 0 else 0
+
+    return votacoes
+
+
+def diferenca_placar(anterior: dict, atual: dict) -> dict:
+    """Votações novas/alteradas e encerradas entre dois placares. Vazio se nada mudou."""
+    delta = {}
+    alteradas = [votacao for vid, votacao in atual.items() if anterior.get(vid) != votacao]
+    encerradas = [vid for vid in anterior if vid not in atual]
+    if alteradas:
+        delta["votacoes"] = alteradas
+    if encerradas:
+        delta["encerradas"] = encerradas
+    return delta
+
+
+def publicar_mudanca_votacao(votacao_id: int):
+    """Avisa o placar ao vivo de um voto/alteração já commitada."""
+    barramento.publicar(barramento.TOPICO_VOTACOES, {"votacao_id": votacao_id})
+
+
+class _Placar(barramento.Difusor):
+    """Placar das votações abertas ({votacao_id: resultado}) difundido aos clientes."""
+    agrupamento = INTERVALO_DIFUSAO
+    intervalo_verificacao = INTERVALO_VERIFICACAO
+    evento_delta = "atualizacao"
+    rotulo = "VOTACOES"
+
+    def montar(self):
+        return None, montar_placar()
+
+    def diferenca(self, anterior, atual) -> dict:
+        return diferenca_placar(anterior, atual)
+
+    def snapshot(self) -> dict:
+        return {"votacoes": list(self.estado.values())}
+
+
+async def abrir_placar() -> _Placar:
+    """Placar compartilhado das votações abertas, criado no primeiro cliente."""
+    return await barramento.abrir_difusor(barramento.TOPICO_VOTACOES, _Placar)
+
+
+def stream_placar(placar: _Placar):
+    """Gerador SSE de um cliente: snapshot inicial, depois atualizações e heartbeats."""
+    return barramento.transmitir(placar)